@@ -74,7 +74,7 @@ class Configuration:
         return nbh
 
 
-def find_data_files(file_ext='json'):
+def find_data_files(file_ext=None):
     """
     This function finds the path and the available database data files.
 
@@ -83,7 +83,8 @@ def find_data_files(file_ext='json'):
     file_ext : str (optional)
         This argument is the string of the file extension to be searched for.
         Given that this database contains only json files, it defaults to
-        'json'.
+        the json file extensions that can be read: 'json', 'json.gz' and
+        'json.xz'.
 
     Returns
     -------
@@ -102,6 +103,12 @@ def find_data_files(file_ext='json'):
     # get the path to the current file
     path_to_database = os.path.dirname(os.path.abspath(__file__)) + slash
     # get a list of files from current path with file_ext of json
-    available_data_files = General.fileio.list_directory_files(
-        path_to_database, file_ext=file_ext)
+    if file_ext is None:
+        file_exts = list(General.fileio.JSON_OPENERS.keys())
+    else:
+        file_exts = [file_ext]
+    available_data_files = []
+    for _file_ext in file_exts:
+        available_data_files += General.fileio.list_directory_files(
+            path_to_database, file_ext=_file_ext)
     return path_to_database, available_data_files
@@ -1,2 +1,5 @@
 from . import platform_specific
 from . import fileio
+from . import binaryio
+from . import jsonindex
+from . import sqliteio
@@ -0,0 +1,334 @@
+"""
+**binaryio.py**
+
+A binary library format that can be opened with a memory map.
+
+The json library files must be decoded in their entirety before a single field
+can be read. The binary format stores every float64 value of a library (the
+g-functions, ln(t/ts) values and borehole coordinates) in one contiguous data
+region, and a json header holds the key index into that region. Opening a
+binary library only reads the header; the values of a field are sliced out of
+the memory map when the field is requested.
+
+The layout of a binary library file is:
+
+    +--------+---------+---------------+---------------+-------------+--------+
+    | b'GFDB'| version | header offset | header length | data region | header |
+    | 4 B    | uint32  | uint64        | uint64        | float64 ... | json   |
+    +--------+---------+---------------+---------------+-------------+--------+
+
+The header is written last so that a library can be written one entry at a
+time. A library built from a json library records the stamp of its source
+(see :func:`gFunctionDatabase.General.fileio.source_stamp`) in the header.
+
+A field can also hold the piecewise polynomial coefficients of its
+interpolants by height (see
+:func:`gFunctionDatabase.Management.application.field_coefficients`), which are
+stored in the data region beside the g-functions so that the interpolants do
+not need to be fit when the field is used.
+"""
+
+import collections.abc
+import json
+import os
+import struct
+
+import numpy as np
+
+from . import fileio
+
+
+MAGIC = b'GFDB'
+VERSION = 1
+# magic, version, header offset and header length (little endian)
+PREFIX = struct.Struct('<4sIQQ')
+DTYPE = np.dtype('<f8')
+# the arrays of the interpolation coefficients of a field
+COEFFICIENTS = ['H', 'breakpoints', 'g', 'r_b', 'D']
+
+
+class BinaryLibraryWriter:
+    """
+    Write a library to the binary format one entry at a time.
+
+    Parameters
+    ----------
+    file_path: str
+        Path to where the binary library is going to be written. The file is
+        written to a temporary path and moved into place when closed.
+    source: dict (optional)
+        The stamp of the library file the binary library is built from, see
+        :func:`gFunctionDatabase.General.fileio.source_stamp`
+
+    Examples
+    ---------
+    >>> import gFunctionDatabase as gfdb
+    >>> with gfdb.General.binaryio.BinaryLibraryWriter('L.gfdb') as writer:
+    ...     writer.add('3_3', {'bore_locations': [[0., 0.]], 'g': {},
+    ...                        'logtime': []})
+    """
+    def __init__(self, file_path: str, source: dict = None):
+        self.file_path = file_path
+        self.source = source
+        self._tmp_path = file_path + '.tmp'
+        self._f = open(self._tmp_path, 'wb')
+        self._f.write(PREFIX.pack(MAGIC, VERSION, 0, 0))
+        self._count = 0  # the number of float64 values written
+        self.entries = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._f.close()
+            os.remove(self._tmp_path)
+
+    def _write(self, values) -> list:
+        array = np.ascontiguousarray(values, dtype=DTYPE)
+        self._f.write(array.tobytes())
+        offset = self._count
+        self._count += array.size
+        return [offset] + list(array.shape)
+
+    def add(self, primary_key: str, content: dict, secondary_key: str = None,
+            coefficients: dict = None):
+        """
+        Add the contents of a field to the library.
+
+        Parameters
+        ----------
+        primary_key: str
+            The N_M key of the field
+        content: dict
+            A dictionary in the output format of cpgfunction, with the keys
+            'bore_locations', 'g' and 'logtime'
+        secondary_key: str (optional)
+            The secondary key of a two level configuration
+        coefficients: dict (optional)
+            The interpolation coefficients of the field, as returned by
+            :func:`gFunctionDatabase.Management.application.field_coefficients`
+
+        Returns
+        -------
+        None
+        """
+        g_keys = list(content['g'].keys())
+        record = {'g_keys': g_keys}
+        if len(g_keys) > 0:
+            record['g'] = self._write([content['g'][k] for k in g_keys])
+        else:
+            record['g'] = [self._count, 0, 0]
+        record['logtime'] = self._write(content['logtime'])
+        record['bore_locations'] = \
+            self._write(np.reshape(content['bore_locations'], (-1, 2)))
+        if coefficients is not None:
+            record['coefficients'] = {'kind': coefficients['kind']}
+            for name in COEFFICIENTS:
+                if name in coefficients:
+                    record['coefficients'][name] = \
+                        self._write(coefficients[name])
+
+        if secondary_key is None:
+            self.entries[primary_key] = record
+        else:
+            self.entries.setdefault(primary_key, {})[secondary_key] = record
+
+    def close(self):
+        """
+        Write the header and move the library into place.
+        """
+        header = json.dumps({'entries': self.entries,
+                             'source': self.source}).encode('utf-8')
+        header_offset = self._f.tell()
+        self._f.write(header)
+        self._f.seek(0)
+        self._f.write(PREFIX.pack(MAGIC, VERSION, header_offset, len(header)))
+        self._f.close()
+        os.replace(self._tmp_path, self.file_path)
+
+
+class BinaryLibrary(collections.abc.Mapping):
+    """
+    A read only view of a binary library. The object behaves like the
+    dictionary returned by :func:`gFunctionDatabase.General.fileio.js_r`, but
+    the values of a field are only read from the memory map when the field is
+    accessed.
+
+    Parameters
+    ----------
+    file_path: str
+        The path to the binary library file
+    arrays: bool (optional)
+        If True, the fields are returned in the array format of
+        :func:`gFunctionDatabase.General.fileio.field_arrays`, with the arrays
+        being views of the memory map rather than python lists.
+
+    Attributes
+    ----------
+    source: dict
+        The stamp of the library file the binary library was built from, None
+        if it was not recorded
+    """
+    def __init__(self, file_path: str, arrays: bool = False):
+        self.file_path = file_path
+        self.arrays = arrays
+        with open(file_path, 'rb') as f:
+            magic, version, header_offset, header_length = \
+                PREFIX.unpack(f.read(PREFIX.size))
+            if magic != MAGIC:
+                raise ValueError('The file is not a binary g-function library.')
+            if version != VERSION:
+                raise ValueError('The binary library version {} is not '
+                                 'supported.'.format(version))
+            f.seek(header_offset)
+            header = json.loads(f.read(header_length).decode('utf-8'))
+        self.entries: dict = header['entries']
+        self.source: dict = header.get('source')
+        n_values = (header_offset - PREFIX.size) // DTYPE.itemsize
+        if n_values > 0:
+            self.values = np.memmap(file_path, dtype=DTYPE, mode='r',
+                                    offset=PREFIX.size, shape=(n_values,))
+        else:
+            self.values = np.zeros(0, dtype=DTYPE)
+
+    def __getitem__(self, key):
+        entry = self.entries[key]
+        if 'g_keys' in entry:
+            return self.read_record(entry)
+        return _SecondaryLevel(self, entry)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def slice(self, location: list) -> np.ndarray:
+        """
+        Return a view of the memory map given an [offset, *shape] location
+        stored in the header.
+        """
+        offset, shape = location[0], location[1:]
+        size = int(np.prod(shape))
+        return self.values[offset:offset + size].reshape(shape)
+
+    def read_record(self, record: dict) -> dict:
+        """
+        Read the contents of one field into the cpgfunction output format, or
+        the array format if the library was opened with arrays=True.
+        """
+        if self.arrays:
+            field = fileio.field_arrays(record['g_keys'],
+                                        self.slice(record['g']),
+                                        self.slice(record['logtime']),
+                                        self.slice(record['bore_locations']))
+        else:
+            g_values = self.slice(record['g']).tolist()
+            bore_locations = self.slice(record['bore_locations']).tolist()
+            field = {'bore_locations': bore_locations,
+                     'g': dict(zip(record['g_keys'], g_values)),
+                     'logtime': self.slice(record['logtime']).tolist()}
+        if 'coefficients' in record:
+            field['coefficients'] = self.read_coefficients(
+                record['coefficients'])
+        return field
+
+    def read_coefficients(self, record: dict) -> dict:
+        """
+        Read the interpolation coefficients of a field, as arrays or lists
+        following the format of the field.
+        """
+        coefficients = {'kind': record['kind']}
+        for name in COEFFICIENTS:
+            if name in record:
+                values = self.slice(record[name])
+                coefficients[name] = values if self.arrays else values.tolist()
+        return coefficients
+
+
+class _SecondaryLevel(collections.abc.Mapping):
+    # The secondary keys of a two level configuration
+    def __init__(self, library: BinaryLibrary, entries: dict):
+        self.library = library
+        self.entries = entries
+
+    def __getitem__(self, key):
+        return self.library.read_record(self.entries[key])
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+
+def bin_dump(d: dict, file_path: str, coefficients=None,
+             source: dict = None) -> None:
+    """
+    Dump a library dictionary to a binary library file.
+
+    Parameters
+    ----------
+    d: dict
+        A library, as is returned by
+        :func:`gFunctionDatabase.General.fileio.js_r`
+    file_path: str
+        Path to where the binary library is going to be written
+    coefficients: callable (optional)
+        A function that computes the interpolation coefficients of a field,
+        such as
+        :func:`gFunctionDatabase.Management.application.field_coefficients`.
+        If given, the coefficients are stored with each field.
+    source: dict (optional)
+        The stamp of the library file d is read from, see
+        :func:`gFunctionDatabase.General.fileio.source_stamp`
+
+    Returns
+    -------
+    None
+    """
+    def add(primary_key, content, secondary_key=None):
+        writer.add(primary_key, content, secondary_key=secondary_key,
+                   coefficients=None if coefficients is None
+                   else coefficients(content))
+
+    with BinaryLibraryWriter(file_path, source=source) as writer:
+        for primary_key in d:
+            content = d[primary_key]
+            if 'g' in content:
+                add(primary_key, content)
+            else:
+                for secondary_key in content:
+                    add(primary_key, content[secondary_key],
+                        secondary_key=secondary_key)
+
+
+def bin_r(file_path: str, arrays: bool = False) -> BinaryLibrary:
+    """
+    Open a binary library file.
+
+    Parameters
+    ----------
+    file_path: str
+        the path to the binary library file
+    arrays: bool (optional)
+        If True, the fields are returned in the array format of
+        :func:`gFunctionDatabase.General.fileio.field_arrays`
+
+    Returns
+    -------
+    library: BinaryLibrary
+        A mapping that behaves like the library dictionary
+    """
+    if not os.path.isfile(file_path):
+        raise ValueError('The file does not exist.')
+    return BinaryLibrary(file_path, arrays=arrays)
@@ -7,12 +7,22 @@
 A module for handling data entering (input) or leaving (output).
 """
 
+import gzip
+import hashlib
 import json
+import lzma
 import os
+import numpy as np
 import pandas as pd
 from . import platform_specific
 
 
+# The json file extensions that can be read by js_r, and the function that
+# opens each of them in binary mode. The compressed files are decompressed as
+# they are read by the decoder.
+JSON_OPENERS = {'json': open, 'json.gz': gzip.open, 'json.xz': lzma.open}
+
+
 def path_exists(path_to_file: str):
     if os.path.isfile(path_to_file):
         return True
@@ -20,30 +30,174 @@ def path_exists(path_to_file: str):
         return False
 
 
+def json_extension(file_path: str):
+    """
+    Determine the json file extension of a file path.
+
+    Parameters
+    ----------
+    file_path: str
+        the path to a file
+
+    Returns
+    -------
+    file_ext: str
+        json, json.gz or json.xz, or None if the file is not a json file
+    """
+    for file_ext in JSON_OPENERS:
+        if file_path.endswith('.' + file_ext):
+            return file_ext
+    return None
+
+
 def js_r(file_path: str) -> dict:
     """
-    Read a .json file into a dictionary
+    Read a .json file into a dictionary. A .json.gz or .json.xz file is
+    decompressed as it is read by the decoder.
 
     Parameters
     ----------
     file_path: str
-        the path to the .json file
+        the path to the .json, .json.gz or .json.xz file
     Returns
     -------
     the .json file in dictionary format
     """
     if not path_exists(file_path):
         raise ValueError('The file does not exist.')
-    file_split_period_ = file_path.split('.')
-    if file_split_period_[-1] != 'json':
-        raise ValueError('The supplied file extension is not a .json.')
-    with open(file_path) as f_in:
+    file_ext = json_extension(file_path)
+    if file_ext is None:
+        raise ValueError('The supplied file extension is not a .json, '
+                         '.json.gz or .json.xz.')
+    with JSON_OPENERS[file_ext](file_path, 'rb') as f_in:
         return json.load(f_in)
 
 
+def split_g_key(g_key: str) -> tuple:
+    """
+    Split a g-function key, B_H_r_b or B_H_r_b_D, into floats. The burial
+    depth D is None for the keys that do not contain it.
+
+    Parameters
+    ----------
+    g_key: str
+        A key of the g-function dictionary of a field, i.e. '5._96._0.075'
+
+    Returns
+    -------
+    (B, H, r_b, D): tuple
+        The spacing, height, borehole radius and burial depth
+    """
+    key_split = g_key.split('_')
+    B, H, r_b = [float(k) for k in key_split[:3]]
+    D = float(key_split[3]) if len(key_split) > 3 else None
+    return B, H, r_b, D
+
+
+def field_arrays(g_keys: list, g, logtime, bore_locations) -> dict:
+    """
+    Create the array format of a field, in which the g-functions of a field
+    are one float64 array sorted by height.
+
+    Parameters
+    ----------
+    g_keys: list
+        The keys of the g-function dictionary of the field
+    g: array_like
+        The g-function values with the shape (len(g_keys), n_times)
+    logtime: array_like
+        The ln(t/ts) values
+    bore_locations: array_like
+        The (x, y) coordinates of the boreholes
+
+    Returns
+    -------
+    field: dict
+        A dictionary with the following keys
+
+        B: float
+            The B spacing of the field
+        g_keys: list
+            The g-function keys sorted by height
+        H, r_b, D: np.ndarray
+            Parallel arrays of the height, borehole radius and burial depth
+            of each g-function (D is nan if it is not in the g-function key)
+        g: np.ndarray
+            The g-functions with the shape (n_heights, n_times)
+        logtime: np.ndarray
+            The ln(t/ts) values with the shape (n_times,)
+        bore_locations: np.ndarray
+            The (x, y) coordinates with the shape (nbh, 2)
+    """
+    n_times = np.size(logtime)
+    g = np.asarray(g, dtype=np.float64).reshape(len(g_keys), n_times)
+    keys = [split_g_key(k) for k in g_keys]
+    order = sorted(range(len(keys)), key=lambda i: keys[i][1])
+    if order != list(range(len(keys))):
+        g = g[order]
+        keys = [keys[i] for i in order]
+        g_keys = [g_keys[i] for i in order]
+    B = keys[0][0] if len(keys) > 0 else None
+    keys = np.array([k[:3] + (np.nan if k[3] is None else k[3],)
+                     for k in keys], dtype=np.float64).reshape(-1, 4)
+    return {'B': B, 'g_keys': list(g_keys),
+            'H': keys[:, 1], 'r_b': keys[:, 2], 'D': keys[:, 3], 'g': g,
+            'logtime': np.asarray(logtime, dtype=np.float64),
+            'bore_locations': np.asarray(
+                bore_locations, dtype=np.float64).reshape(-1, 2)}
+
+
+def content_to_arrays(content: dict) -> dict:
+    """
+    Convert a field in the output format of cpgfunction into the array format
+    of :func:`field_arrays`.
+    """
+    g_keys = list(content['g'].keys())
+    return field_arrays(g_keys, [content['g'][k] for k in g_keys],
+                        content['logtime'], content['bore_locations'])
+
+
+def field_object_hook(obj: dict):
+    """
+    An object hook for the json decoder that converts each field into the
+    array format of :func:`field_arrays`. The decoder calls the hook as each
+    json object is decoded, so the lists of a field are converted (and
+    released) one field at a time.
+    """
+    if 'g' in obj and 'logtime' in obj and 'bore_locations' in obj:
+        return content_to_arrays(obj)
+    return obj
+
+
+def js_r_arrays(file_path: str) -> dict:
+    """
+    Read a .json library into a dictionary, where each field is in the array
+    format of :func:`field_arrays`. Each field is converted as soon as it is
+    decoded, so the python floats of only one field exist at a time.
+
+    Parameters
+    ----------
+    file_path: str
+        the path to the .json, .json.gz or .json.xz library
+
+    Returns
+    -------
+    the library in dictionary format, with fields in the array format
+    """
+    if not path_exists(file_path):
+        raise ValueError('The file does not exist.')
+    file_ext = json_extension(file_path)
+    if file_ext is None:
+        raise ValueError('The supplied file extension is not a .json, '
+                         '.json.gz or .json.xz.')
+    with JSON_OPENERS[file_ext](file_path, 'rb') as f_in:
+        return json.load(f_in, object_hook=field_object_hook)
+
+
 def js_dump(d: dict, file_path: str) -> None:
     """
-    Dump a dictionary to a json file.
+    Dump a dictionary to a json file. If the file path ends in .json.gz or
+    .json.xz, the file is compressed as it is written.
 
     Parameters
     ----------
@@ -57,10 +211,90 @@ def js_dump(d: dict, file_path: str) -> None:
     None
     """
     # https://stackoverflow.com/a/26057360/11637415
-    with open(file_path, 'w') as fp:
+    opener = JSON_OPENERS.get(json_extension(file_path), open)
+    with opener(file_path, 'wt') as fp:
         json.dump(d, fp)
 
 
+def file_sha256(file_path: str) -> str:
+    """
+    Compute the sha256 checksum of a file, reading it in blocks.
+
+    Parameters
+    ----------
+    file_path: str
+        The path to the file
+
+    Returns
+    -------
+    checksum: str
+        The hexadecimal sha256 digest of the file
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def source_stamp(file_path: str) -> dict:
+    """
+    Identify the version of a library file that a derived file (a binary
+    library, a byte offset index) is built from. A derived file is only used
+    when its stamp matches the library file exactly, as a package upgrade can
+    install a library file with an older modification time than the derived
+    file.
+
+    Parameters
+    ----------
+    file_path: str
+        The path to the library file
+
+    Returns
+    -------
+    stamp: dict
+        The absolute 'path', the 'size' and the modification time
+        'mtime_ns' of the file
+    """
+    stat = os.stat(file_path)
+    return {'path': os.path.abspath(file_path), 'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns}
+
+
+def js_stream_dump(library, file_path: str) -> None:
+    """
+    Dump a library to a json file one entry at a time, so that a lazy library
+    (such as :class:`gFunctionDatabase.General.jsonindex.IndexedJsonLibrary`)
+    is never held in memory in its entirety. The file is compressed if the
+    file path ends in .json.gz or .json.xz.
+
+    Parameters
+    ----------
+    library: dict
+        The library, or a mapping that behaves like the library
+    file_path: str
+        Path to where the library is going to be dumped
+
+    Returns
+    -------
+    None
+    """
+    opener = JSON_OPENERS.get(json_extension(file_path), open)
+    tmp_path = file_path + '.tmp'
+    with opener(tmp_path, 'wt') as fp:
+        fp.write('{')
+        for i, key in enumerate(library):
+            content = library[key]
+            if not isinstance(content, dict):
+                # the secondary level of a lazy library
+                content = {_key: content[_key] for _key in content}
+            if i > 0:
+                fp.write(', ')
+            fp.write(json.dumps(key) + ': ' + json.dumps(content))
+        fp.write('}')
+    os.replace(tmp_path, file_path)
+
+
 def create_dir_if_not(path_to_folder: str):
     """
     Create a directory if it does not exist.
@@ -212,14 +446,13 @@ def list_directory_files(path_to_dir, file_ext=None):
     files = [f for f in directory_contents if os.path.isfile(
         path_to_dir + slash + f)]
 
-    # search for a specific file extension
+    # search for a specific file extension, which may contain more than one
+    # part (i.e. json.gz)
     if file_ext is not None:
         from copy import deepcopy
         files_tmp = []
         for i in range(len(files)):
-            file = files[i].split('.')
-            current_file_ext = file[-1]
-            if current_file_ext == file_ext:
+            if files[i].endswith('.' + file_ext):
                 files_tmp.append(files[i])
         files = deepcopy(files_tmp)
 
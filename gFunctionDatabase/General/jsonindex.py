@@ -0,0 +1,204 @@
+"""
+**jsonindex.py**
+
+A byte offset index for reading single entries out of a json library.
+
+The json library files are dictionaries keyed by N_M, and the two level
+configurations contain a second dictionary keyed by the secondary value. The
+index maps each primary key (and each secondary key) to the byte range of its
+value in the file, so that one entry can be read by seeking to that range and
+decoding only those bytes. The index is stored in a sidecar file, and
+records the stamp of the json library it was built from (see
+:func:`gFunctionDatabase.General.fileio.source_stamp`).
+"""
+
+import collections.abc
+import json
+import os
+import re
+
+from . import fileio
+
+
+WHITESPACE = re.compile(r'\s*')
+
+
+def _skip(s: str, idx: int) -> int:
+    return WHITESPACE.match(s, idx).end()
+
+
+def _expect(s: str, idx: int, character: str) -> int:
+    if s[idx] != character:
+        raise ValueError('Expected "{}" at character {} of the json library, '
+                         'found "{}".'.format(character, idx, s[idx]))
+    return idx + 1
+
+
+def _scan_object(s: str, idx: int, decoder: json.JSONDecoder, depth: int):
+    """
+    Scan the json object that starts at idx. The values of the object are
+    either decoded (depth == 1) or scanned one level deeper (depth == 2).
+
+    Returns
+    -------
+    (ranges, secondary, end): tuple
+        The character range of the value of each key, the ranges of the next
+        level for depth == 2 and the index after the closing brace.
+    """
+    ranges = {}
+    secondary = {}
+    idx = _skip(s, _expect(s, idx, '{'))
+    if s[idx] == '}':
+        return ranges, secondary, idx + 1
+    while True:
+        key, idx = decoder.raw_decode(s, idx)
+        idx = _skip(s, _expect(s, _skip(s, idx), ':'))
+        start = idx
+        if depth == 1:
+            _, idx = decoder.raw_decode(s, idx)
+        else:
+            secondary[key], _, idx = _scan_object(s, idx, decoder, depth - 1)
+        ranges[key] = [start, idx]
+        idx = _skip(s, idx)
+        if s[idx] == '}':
+            return ranges, secondary, idx + 1
+        idx = _skip(s, _expect(s, idx, ','))
+
+
+def js_index(file_path: str, levels: int) -> dict:
+    """
+    Build the byte offset index of a json library.
+
+    Parameters
+    ----------
+    file_path: str
+        the path to the .json library
+    levels: int
+        The number of json levels in the library, 1 or 2
+
+    Returns
+    -------
+    index: dict
+        A dictionary with the size of the json file, the stamp of the json
+        file ('source'), the byte range of every primary key ('entries') and,
+        for two level libraries, the byte range of every secondary key
+        ('secondary').
+    """
+    # stamped before the file is read, so a file modified while it is read
+    # does not match its index
+    source = fileio.source_stamp(file_path)
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    s = raw.decode('utf-8')
+    decoder = json.JSONDecoder()
+    ranges, secondary, _ = _scan_object(s, _skip(s, 0), decoder, levels)
+
+    if len(s) != len(raw):
+        # the offsets are in characters, convert them into bytes
+        def to_bytes(r):
+            return [len(s[:r[0]].encode('utf-8')),
+                    len(s[:r[1]].encode('utf-8'))]
+        ranges = {k: to_bytes(r) for k, r in ranges.items()}
+        secondary = {k: {_k: to_bytes(r) for _k, r in v.items()}
+                     for k, v in secondary.items()}
+
+    index = {'source_size': len(raw), 'source': source, 'levels': levels,
+             'entries': ranges}
+    if levels == 2:
+        index['secondary'] = secondary
+    return index
+
+
+def idx_dump(index: dict, file_path: str) -> None:
+    """
+    Dump an index to its sidecar file. The index is written to a temporary
+    path and moved into place, so a partially written index is never read.
+    """
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'w') as fp:
+        json.dump(index, fp)
+    os.replace(tmp_path, file_path)
+
+
+def idx_r(file_path: str) -> dict:
+    """
+    Read an index from its sidecar file.
+    """
+    with open(file_path) as f_in:
+        return json.load(f_in)
+
+
+def read_range(file_path: str, byte_range: list, arrays: bool = False):
+    """
+    Decode the json value stored in a byte range of a file. If arrays is True,
+    the fields are decoded into the array format of
+    :func:`gFunctionDatabase.General.fileio.field_arrays`.
+    """
+    start, stop = byte_range
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        raw = f.read(stop - start)
+    if arrays:
+        return json.loads(raw, object_hook=fileio.field_object_hook)
+    return json.loads(raw)
+
+
+class IndexedJsonLibrary(collections.abc.Mapping):
+    """
+    A read only view of a json library that decodes an entry only when it is
+    accessed. The object behaves like the dictionary returned by
+    :func:`gFunctionDatabase.General.fileio.js_r`.
+
+    Parameters
+    ----------
+    file_path: str
+        the path to the .json library
+    index: dict
+        The index of the library returned by :func:`js_index`
+    arrays: bool (optional)
+        If True, the fields are returned in the array format of
+        :func:`gFunctionDatabase.General.fileio.field_arrays`
+    """
+    def __init__(self, file_path: str, index: dict, arrays: bool = False):
+        if os.path.getsize(file_path) != index['source_size']:
+            raise ValueError('The index does not belong to the json library.')
+        self.file_path = file_path
+        self.index = index
+        self.entries: dict = index['entries']
+        self.secondary: dict = index.get('secondary', {})
+        self.arrays = arrays
+
+    def __getitem__(self, key):
+        if key in self.secondary:
+            return _SecondaryLevel(self.file_path, self.secondary[key],
+                                   self.arrays)
+        return read_range(self.file_path, self.entries[key], self.arrays)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+
+class _SecondaryLevel(collections.abc.Mapping):
+    # The secondary keys of a two level configuration
+    def __init__(self, file_path: str, entries: dict, arrays: bool):
+        self.file_path = file_path
+        self.entries = entries
+        self.arrays = arrays
+
+    def __getitem__(self, key):
+        return read_range(self.file_path, self.entries[key], self.arrays)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
@@ -0,0 +1,324 @@
+"""
+**sqliteio.py**
+
+A SQLite database of g-functions built from the json libraries, using only the
+standard library sqlite3 module.
+
+The database holds every configuration in three tables:
+
+    sources: the data file each configuration was ingested from
+    fields: one row per field (configuration, N, M, secondary key, nbh), with
+        the ln(t/ts) values and borehole coordinates as packed float64 blobs
+    heights: one row per g-function curve of a field (B, H, r_b, D), with the
+        g-function values as a packed float64 blob
+
+The fields are indexed on configuration, N, M and nbh, so queries across all of
+the configurations (i.e. every field with 60 to 80 boreholes) do not require
+loading any of the libraries into memory.
+"""
+
+import collections.abc
+import os
+import sqlite3
+
+import numpy as np
+
+from . import fileio
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    configuration TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fields (
+    id INTEGER PRIMARY KEY,
+    configuration TEXT NOT NULL,
+    key TEXT NOT NULL,
+    secondary_key TEXT,
+    N INTEGER NOT NULL,
+    M INTEGER NOT NULL,
+    nbh INTEGER NOT NULL,
+    logtime BLOB NOT NULL,
+    bore_locations BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS heights (
+    id INTEGER PRIMARY KEY,
+    field_id INTEGER NOT NULL REFERENCES fields (id),
+    g_key TEXT NOT NULL,
+    B REAL NOT NULL,
+    H REAL NOT NULL,
+    r_b REAL NOT NULL,
+    D REAL,
+    g BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fields_configuration_N_M
+    ON fields (configuration, N, M);
+CREATE INDEX IF NOT EXISTS fields_N_M ON fields (N, M);
+CREATE INDEX IF NOT EXISTS fields_nbh ON fields (nbh);
+CREATE INDEX IF NOT EXISTS heights_field_id ON heights (field_id);
+"""
+
+
+def pack(values) -> bytes:
+    """
+    Pack a list of floats (or a list of coordinates) into a float64 blob.
+    """
+    return np.asarray(values, dtype='<f8').tobytes()
+
+
+def unpack(blob: bytes, columns: int = None) -> list:
+    """
+    Unpack a float64 blob into a list (of lists if columns is given).
+    """
+    values = np.frombuffer(blob, dtype='<f8')
+    if columns is not None:
+        values = values.reshape(-1, columns)
+    return values.tolist()
+
+
+class SQLiteDatabase:
+    """
+    A SQLite database of g-function libraries.
+
+    Parameters
+    ----------
+    file_path: str
+        The path to the SQLite database file, which is created if it does not
+        exist.
+    """
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.connection = sqlite3.connect(file_path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def up_to_date(self, configuration: str, path_to_file: str) -> bool:
+        """
+        Check that a configuration has been ingested from the current version
+        of its data file.
+        """
+        row = self.connection.execute(
+            'SELECT path, mtime_ns, size FROM sources WHERE configuration = ?',
+            (configuration,)).fetchone()
+        stat = os.stat(path_to_file)
+        return row == (path_to_file, stat.st_mtime_ns, stat.st_size)
+
+    def ingest(self, configuration: str, library, path_to_file: str):
+        """
+        Ingest (or replace) a configuration in the database. The library is
+        read one entry at a time, so it can be a lazy mapping such as
+        :class:`gFunctionDatabase.General.jsonindex.IndexedJsonLibrary`.
+
+        Parameters
+        ----------
+        configuration: str
+            The database configuration, i.e. L, U, rectangle
+        library: dict
+            The library, as returned by
+            :func:`gFunctionDatabase.General.fileio.js_r`
+        path_to_file: str
+            The path to the data file the library was read from
+        """
+        stat = os.stat(path_to_file)
+        with self.connection:
+            self.connection.execute(
+                'DELETE FROM heights WHERE field_id IN '
+                '(SELECT id FROM fields WHERE configuration = ?)',
+                (configuration,))
+            self.connection.execute(
+                'DELETE FROM fields WHERE configuration = ?', (configuration,))
+            for key in library:
+                content = library[key]
+                if 'g' in content:
+                    self._insert_field(configuration, key, None, content)
+                else:
+                    for secondary_key in content:
+                        self._insert_field(configuration, key, secondary_key,
+                                           content[secondary_key])
+            self.connection.execute(
+                'INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)',
+                (configuration, path_to_file, stat.st_mtime_ns, stat.st_size))
+
+    def _insert_field(self, configuration, key, secondary_key, content):
+        N, M = [int(k) for k in key.split('_')]
+        cursor = self.connection.execute(
+            'INSERT INTO fields (configuration, key, secondary_key, N, M, nbh, '
+            'logtime, bore_locations) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (configuration, key, secondary_key, N, M,
+             len(content['bore_locations']), pack(content['logtime']),
+             pack(content['bore_locations'])))
+        field_id = cursor.lastrowid
+        rows = []
+        for g_key in content['g']:
+            B, H, r_b, D = fileio.split_g_key(g_key)
+            rows.append((field_id, g_key, B, H, r_b, D,
+                         pack(content['g'][g_key])))
+        self.connection.executemany(
+            'INSERT INTO heights (field_id, g_key, B, H, r_b, D, g) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def configurations(self) -> list:
+        """
+        Returns
+        -------
+        configurations: list
+            The configurations that have been ingested
+        """
+        rows = self.connection.execute(
+            'SELECT configuration FROM sources ORDER BY configuration')
+        return [row[0] for row in rows]
+
+    def query(self, configurations: list = None, N: int = None, M: int = None,
+              nbh_min: int = None, nbh_max: int = None) -> list:
+        """
+        Query the fields of the database. Each of the arguments is optional,
+        and only the arguments that are given are used to filter the fields.
+
+        Parameters
+        ----------
+        configurations: list
+            The configurations to search
+        N: int
+            Number of boreholes in the y-direction (N <= M)
+        M: int
+            Number of boreholes in the x-direction
+        nbh_min: int
+            The minimum number of boreholes in the field
+        nbh_max: int
+            The maximum number of boreholes in the field
+
+        Returns
+        -------
+        fields: list
+            A list of dictionaries with the configuration, key, secondary_key,
+            N, M and nbh of each field
+        """
+        conditions = []
+        parameters = []
+        if configurations is not None:
+            conditions.append('configuration IN ({})'.format(
+                ', '.join('?' * len(configurations))))
+            parameters.extend(configurations)
+        for column, operator, value in [('N', '=', N), ('M', '=', M),
+                                        ('nbh', '>=', nbh_min),
+                                        ('nbh', '<=', nbh_max)]:
+            if value is not None:
+                conditions.append('{} {} ?'.format(column, operator))
+                parameters.append(value)
+        sql = 'SELECT configuration, key, secondary_key, N, M, nbh FROM fields'
+        if len(conditions) > 0:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY id'
+        columns = ['configuration', 'key', 'secondary_key', 'N', 'M', 'nbh']
+        return [dict(zip(columns, row))
+                for row in self.connection.execute(sql, parameters)]
+
+    def oriented_configurations(self) -> set:
+        """
+        Returns
+        -------
+        configurations: set
+            The configurations that hold fields keyed with N > M, i.e. a U
+            library that is keyed by orientation rather than with N <= M
+        """
+        return {row[0] for row in self.connection.execute(
+            'SELECT DISTINCT configuration FROM fields WHERE N > M')}
+
+    def library(self, configuration: str, arrays: bool = False,
+                owner: bool = False):
+        """
+        Returns
+        -------
+        library: SQLiteLibrary
+            A mapping that behaves like the library dictionary of the
+            configuration. If arrays is True, the fields are returned in the
+            array format of
+            :func:`gFunctionDatabase.General.fileio.field_arrays`. If owner
+            is True, closing the library closes the database.
+        """
+        return SQLiteLibrary(self, configuration, arrays=arrays, owner=owner)
+
+    def read_field(self, field_id: int, logtime: bytes,
+                   bore_locations: bytes, arrays: bool = False) -> dict:
+        """
+        Read the contents of one field into the cpgfunction output format, or
+        the array format if arrays is True.
+        """
+        rows = self.connection.execute(
+            'SELECT g_key, g FROM heights WHERE field_id = ? ORDER BY id',
+            (field_id,)).fetchall()
+        if arrays:
+            g = b''.join(row[1] for row in rows)
+            return fileio.field_arrays(
+                [row[0] for row in rows], np.frombuffer(g, dtype='<f8'),
+                np.frombuffer(logtime, dtype='<f8'),
+                np.frombuffer(bore_locations, dtype='<f8'))
+        return {'bore_locations': unpack(bore_locations, columns=2),
+                'g': {g_key: unpack(g) for g_key, g in rows},
+                'logtime': unpack(logtime)}
+
+
+class SQLiteLibrary(collections.abc.Mapping):
+    """
+    A read only view of one configuration in a :class:`SQLiteDatabase`. The
+    object behaves like the dictionary returned by
+    :func:`gFunctionDatabase.General.fileio.js_r`; an entry is read from the
+    database when it is accessed.
+
+    A library that owns its database closes the connection with
+    :func:`close`, or at the end of a with block.
+    """
+    def __init__(self, database: SQLiteDatabase, configuration: str,
+                 arrays: bool = False, owner: bool = False):
+        self.database = database
+        self.configuration = configuration
+        self.arrays = arrays
+        self.owner = owner
+        rows = database.connection.execute(
+            'SELECT key FROM fields WHERE configuration = ? GROUP BY key '
+            'ORDER BY MIN(id)', (configuration,))
+        self.primary_keys = [row[0] for row in rows]
+        self.key_set = set(self.primary_keys)
+
+    def __getitem__(self, key):
+        if key not in self.key_set:
+            raise KeyError(key)
+        rows = self.database.connection.execute(
+            'SELECT id, secondary_key, logtime, bore_locations FROM fields '
+            'WHERE configuration = ? AND key = ? ORDER BY id',
+            (self.configuration, key)).fetchall()
+        content = {}
+        for field_id, secondary_key, logtime, bore_locations in rows:
+            field = self.database.read_field(field_id, logtime, bore_locations,
+                                             arrays=self.arrays)
+            if secondary_key is None:
+                return field
+            content[secondary_key] = field
+        return content
+
+    def __iter__(self):
+        return iter(self.primary_keys)
+
+    def __len__(self):
+        return len(self.primary_keys)
+
+    def __contains__(self, key):
+        return key in self.key_set
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the database, if the library owns it.
+        """
+        if self.owner:
+            self.database.close()
@@ -1,3 +1,6 @@
 from . import data_definition
 from . import retrieval
+from . import gfunctioncache
+from . import similarity
 from . import application
+from . import asyncretrieval
@@ -1,16 +1,213 @@
 # Jack C. Cook
 # Thursday, September 16, 2021
+from collections import OrderedDict
+import concurrent.futures
+import math
+import os
 import warnings
 
-from scipy.interpolate import interp1d, lagrange
+from scipy.interpolate import BarycentricInterpolator, PchipInterpolator, \
+    PPoly, interp1d, make_interp_spline
+from scipy.special import exp1
 import matplotlib.pyplot as plt
 import numpy as np
 import pygfunction as gt
 
+from . import gfunctioncache
+
+
+# The heights (m) and the borehole radius (m) at each height of the 5m
+# libraries, and their burial depth (m)
+LIBRARY_HEIGHTS = [24., 48., 96., 192., 384.]
+LIBRARY_RADII = [0.075, 0.075, 0.075, 0.08, 0.0875]
+LIBRARY_BURIAL_DEPTH = 2.
+
+
+class VersionedDict(dict):
+    """
+    A dictionary that counts its modifications, so that the interpolants fit
+    to its contents can be invalidated when it changes. Changes made inside of
+    a value (i.e. to an element of a g-function list) are not counted.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version += 1
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self.version += 1
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self.version += 1
+        return item
+
+    def clear(self):
+        super().clear()
+        self.version += 1
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.version += 1
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.version += 1
+        return super().setdefault(key, default)
+
+
+def infinite_line_source(log_time, r_b_over_H) -> np.ndarray:
+    """
+    The g-function of a single borehole as an infinite line source,
+
+    .. math::
+        g = \\dfrac{1}{2} E_1\\left(\\dfrac{r_b^2}{4 \\alpha t}\\right)
+        = \\dfrac{1}{2} E_1\\left(\\dfrac{9}{4}
+        \\left(\\dfrac{r_b}{H}\\right)^2 e^{-\\ln(t/t_s)}\\right)
+
+    with ts = H^2 / (9 alpha). It is the response of a field at short times,
+    before the boreholes interact and the ends of the boreholes matter.
+
+    Parameters
+    ----------
+    log_time: array_like
+        The ln(t/ts) values
+    r_b_over_H: float or array_like
+        The borehole radius over the borehole height, broadcast against
+        log_time
+
+    Returns
+    -------
+    g: numpy.ndarray
+        The g-function values
+    """
+    with np.errstate(over='ignore'):
+        u = 9. / 4. * np.asarray(r_b_over_H, dtype=float) ** 2 * \
+            np.exp(-np.asarray(log_time, dtype=float))
+    return 0.5 * exp1(u)
+
+
+class LogTimeInterpolant:
+    """
+    A shape preserving (PCHIP) interpolant of a g-function in ln(t/ts). After
+    the last ln(t/ts) value, the g-function is extended linearly in ln(t/ts)
+    with the slope of the interpolant at the end.
+
+    Before the first ln(t/ts) value (i.e. the first hours to days of a step
+    response), the g-function is the infinite line source response of
+    :func:`infinite_line_source` scaled to the first g-function value. The
+    scaling fades as exp(ln(t/ts) - ln(t/ts)_0), so that the response tends
+    to the line source as the time tends to zero. Without r_b_over_H, the
+    g-function is extended linearly with the slope of the interpolant at the
+    start, is not allowed to fall below zero, and a warning is given.
+
+    Parameters
+    ----------
+    log_time: array_like
+        The ln(t/ts) values, increasing
+    g_function: array_like
+        The g-function values at each ln(t/ts), or an (n_rows, n_times) array
+        of g-functions that are evaluated with :func:`evaluate_rows`
+    r_b_over_H: float or array_like (optional)
+        The borehole radius over the borehole height of the g-function, or
+        of each row of g-functions
+    """
+    def __init__(self, log_time, g_function, r_b_over_H=None):
+        self.log_time = np.asarray(log_time, dtype=float)
+        self.g_function = np.asarray(g_function, dtype=float)
+        self.r_b_over_H = None
+        if r_b_over_H is not None:
+            self.r_b_over_H = np.asarray(r_b_over_H, dtype=float)
+        self.interpolant = PchipInterpolator(self.log_time, self.g_function,
+                                             axis=-1, extrapolate=False)
+        derivative = self.interpolant.derivative()
+        self.slopes = (derivative(self.log_time[0]),
+                       derivative(self.log_time[-1]))
+
+    def _before(self, log_time, first, slope, r_b_over_H) -> np.ndarray:
+        # the g-function before the first ln(t/ts) value
+        if r_b_over_H is None:
+            warnings.warn('Extrapolation is being used before the first '
+                          'ln(t/ts) value, give r_b_over_H to use the '
+                          'infinite line source.')
+            return np.maximum(
+                first + slope * (log_time - self.log_time[0]), 0.)
+        ratio = first / infinite_line_source(self.log_time[0], r_b_over_H)
+        weight = np.exp(np.minimum(log_time - self.log_time[0], 0.))
+        return infinite_line_source(log_time, r_b_over_H) * \
+            (1. + (ratio - 1.) * weight)
+
+    def __call__(self, log_time) -> np.ndarray:
+        log_time = np.asarray(log_time, dtype=float)
+        g = self.interpolant(log_time)
+        before = log_time < self.log_time[0]
+        if np.any(before):
+            g[before] = self._before(log_time[before], self.g_function[0],
+                                     self.slopes[0], self.r_b_over_H)
+        after = log_time > self.log_time[-1]
+        g[after] = self.g_function[-1] + \
+            self.slopes[1] * (log_time[after] - self.log_time[-1])
+        return g
+
+    def evaluate_rows(self, log_time) -> np.ndarray:
+        """
+        Evaluate each g-function of an (n_rows, n_times) interpolant at its
+        own ln(t/ts) values.
+
+        Parameters
+        ----------
+        log_time: array_like
+            An (n_rows, m) array, row i holds the ln(t/ts) values at which the
+            g-function of row i is evaluated
+
+        Returns
+        -------
+        g: numpy.ndarray
+            The (n_rows, m) g-function values
+        """
+        log_time = np.asarray(log_time, dtype=float)
+        rows = np.arange(log_time.shape[0])[:, np.newaxis]
+        interval = np.clip(
+            np.searchsorted(self.log_time, log_time, side='right') - 1, 0,
+            len(self.log_time) - 2)
+        dx = log_time - self.log_time[interval]
+        c = self.interpolant.c[:, interval, rows]
+        g = ((c[0] * dx + c[1]) * dx + c[2]) * dx + c[3]
+
+        before = log_time < self.log_time[0]
+        if np.any(before):
+            r_b_over_H = self.r_b_over_H
+            if r_b_over_H is not None and r_b_over_H.ndim > 0:
+                r_b_over_H = r_b_over_H[:, np.newaxis]
+            g = np.where(before, self._before(
+                log_time, self.g_function[:, :1],
+                self.slopes[0][:, np.newaxis], r_b_over_H), g)
+        after = self.g_function[:, -1:] + \
+            self.slopes[1][:, np.newaxis] * (log_time - self.log_time[-1])
+        return np.where(log_time > self.log_time[-1], after, g)
+
 
 class GFunction:
     def __init__(self, B: float, r_b_values: dict, D_values: dict,
-                 g_lts: dict, log_time: list, bore_locations: list):
+                 g_lts: dict, log_time: list, bore_locations: list,
+                 coefficients: dict = None, variations: dict = None):
+        # the fitted interpolation tables keyed by (kind, extrapolate), each
+        # stored with the versions of the data it was fit to (used in the
+        # method interpolation_table_for)
+        self.interpolants: dict = {}
         self.B: float = B  # a B spacing in the borefield
         # r_b (borehole radius) value keyed by height
         self.r_b_values: dict = r_b_values
@@ -22,13 +219,55 @@ class GFunction:
         self.bore_locations: list = bore_locations
         # self.time: dict = {}  # the time values in years
 
-        # an interpolation table for B/H ratios, D, r_b (used in the method
-        # g_function_interpolation)
+        # the interpolation table for B/H ratios, D, r_b used by the last
+        # interpolation
         self.interpolation_table: dict = {}
+        # the interpolants of g-functions in ln(t/ts), keyed by (kind, B/H) in
+        # least recently used order (used in the method g_function_at)
+        self.log_time_interpolants = OrderedDict()
+        self.max_log_time_interpolants: int = 256
+        # the grid of g-functions by height and r_b/H or D/H ratio, see
+        # variation_grid, and its interpolants by height keyed by
+        # (kind, extrapolate) (used in the method interpolate_variations)
+        self.variations: dict = variations
+        self.variation_interpolants: dict = {}
+        # interpolation tables that were precomputed in the library
+        if coefficients is not None:
+            self.load_interpolation_coefficients(coefficients)
+
+    @property
+    def g_lts(self) -> VersionedDict:
+        return self._g_lts
+
+    @g_lts.setter
+    def g_lts(self, value: dict):
+        self._g_lts = VersionedDict(value)
+        self.interpolants.clear()
+
+    @property
+    def r_b_values(self) -> VersionedDict:
+        return self._r_b_values
+
+    @r_b_values.setter
+    def r_b_values(self, value: dict):
+        self._r_b_values = VersionedDict(value)
+        self.interpolants.clear()
+
+    @property
+    def D_values(self) -> VersionedDict:
+        return self._D_values
+
+    @D_values.setter
+    def D_values(self, value: dict):
+        self._D_values = VersionedDict(value)
+        self.interpolants.clear()
 
     def g_function_interpolation(self, B_over_H: float, kind='default'):
         """
-        Interpolate a range of g-functions for a specific B/H ratio
+        Interpolate a range of g-functions for a specific B/H ratio. This is
+        a wrapper of :func:`g_function_interpolation_array` that returns the
+        g-function as a list.
+
         Parameters
         ----------
         B_over_H: float
@@ -49,6 +288,35 @@ class GFunction:
             .. math::
                 H_{eq} = \dfrac{B_{field}}{B/H}
         """
+        g_function, rb_value, D_value, H_eq = \
+            self.g_function_interpolation_array(B_over_H, kind=kind)
+        return g_function.tolist(), rb_value, D_value, H_eq
+
+    def g_function_interpolation_array(self, B_over_H: float,
+                                       kind='default'):
+        """
+        Interpolate a range of g-functions for a specific B/H ratio. The
+        g-functions are held as one (n_heights, n_times) array, and are fit
+        and evaluated along the height axis for every ln(t/ts) at once.
+
+        Parameters
+        ----------
+        B_over_H: float
+            A B/H ratio
+        kind: str
+            Could be 'linear', 'quadratic', 'cubic', 'lagrange' or 'pchip'
+            default: 'cubic'
+        Returns
+        -------
+        **g-function: numpy.ndarray**
+            The g-function values for each ln(t/ts)
+        **rb: float**
+            A borehole radius value that is interpolated for
+        **D: float**
+            A burial depth that is interpolated for
+        **H_eq: float**
+            An equivalent height
+        """
         # the g-functions are stored in a dictionary based on heights, so an
         # equivalent height can be found
         H_eq = 1 / B_over_H * self.B
@@ -61,92 +329,426 @@ class GFunction:
             fill_value = 'extrapolate'
             warnings.warn('Extrapolation is being used.')
 
-        # if the interpolation kind is default, use what we know about the
-        # accuracy of interpolation to choose a technique
+        kind = self.interpolation_kind(kind, len(height_values))
+        table = self.interpolation_table_for(kind, fill_value == 'extrapolate')
+
+        # create the g-function by interpolating at every ln(t/ts) value
+        rb_value = table['rb'](H_eq)
+        try:
+            D_value = table['D'](H_eq)
+        except KeyError:
+            D_value = None
+        g_function = table['g'](H_eq)
+        return g_function, rb_value, D_value, H_eq
+
+    def g_function_interpolation_batch(self, B_over_H_values,
+                                       kind='default'):
+        """
+        Interpolate the g-functions for many B/H ratios in one call.
+
+        Parameters
+        ----------
+        B_over_H_values: array_like
+            The B/H ratios, of length n_queries
+        kind: str
+            Could be 'linear', 'quadratic', 'cubic', 'lagrange' or 'pchip'
+            default: 'cubic'
+        Returns
+        -------
+        **g-functions: numpy.ndarray**
+            A (n_queries, n_times) array, each row is the g-function of a B/H
+            ratio
+        **rb: numpy.ndarray**
+            The borehole radius of each B/H ratio
+        **D: numpy.ndarray**
+            The burial depth of each B/H ratio, nan if the g-functions do not
+            have burial depths
+        **H_eq: numpy.ndarray**
+            The equivalent height of each B/H ratio
+        **extrapolated: numpy.ndarray**
+            True for the B/H ratios that are outside of the heights, which
+            are extrapolated without a warning
+        """
+        B_over_H_values = np.atleast_1d(np.asarray(B_over_H_values,
+                                                   dtype=float))
+        H_eq = 1 / B_over_H_values * self.B
+
+        height_values = list(self.g_lts.keys())
+        extrapolated = (H_eq < min(height_values)) | \
+            (H_eq > max(height_values))
+
+        kind = self.interpolation_kind(kind, len(height_values))
+        # an extrapolating table gives the same values within the heights
+        table = self.interpolation_table_for(kind, bool(extrapolated.any()))
+
+        g_functions = table['g'](H_eq)
+        rb_values = np.asarray(table['rb'](H_eq), dtype=float)
+        if 'D' in table:
+            D_values = np.asarray(table['D'](H_eq), dtype=float)
+        else:
+            D_values = np.full(H_eq.shape, np.nan)
+        return g_functions, rb_values, D_values, H_eq, extrapolated
+
+    def g_function_interpolation_grid(self, B_over_H_values, r_b_over_H=None,
+                                      D_over_H=None, kind='default'):
+        """
+        Interpolate the g-functions for B/H ratios and borehole radius
+        (r_b/H) or burial depth (D/H) ratios that differ from the library.
+
+        If the field has a grid of g-functions by height and r_b/H or D/H
+        (see :func:`variation_grid`), the g-functions are interpolated by
+        height for every ratio of the grid, and then between the ratios. The
+        g-function is linear in ln(r_b/H) (Eskilson 1987), so the radius is
+        interpolated in ln(r_b/H), and the analytic
+        :func:`borehole_radius_correction` is applied from the nearest ratio
+        outside of the grid, or from the interpolated radius of a field
+        without a grid of radii. A D/H ratio requires a grid of burial
+        depths, and is held at the nearest ratio outside of the grid.
+
+        Parameters
+        ----------
+        B_over_H_values: array_like
+            The B/H ratios, of length n_queries
+        r_b_over_H: float or array_like (optional)
+            The r_b/H ratio of each query, defaults to the library radius
+        D_over_H: float or array_like (optional)
+            The D/H ratio of each query, defaults to the library burial depth
+        kind: str
+            The interpolation kind by height, see
+            :func:`g_function_interpolation_batch`
+        Returns
+        -------
+        **g-functions: numpy.ndarray**
+            A (n_queries, n_times) array, each row is the g-function of a
+            query
+        **rb: numpy.ndarray**
+            The borehole radius of each query at the equivalent height
+        **D: numpy.ndarray**
+            The burial depth of each query at the equivalent height
+        **H_eq: numpy.ndarray**
+            The equivalent height of each query
+        **extrapolated: numpy.ndarray**
+            True for the queries outside of the heights, or outside of the
+            D/H ratios of the grid
+        """
+        g, rb, D, H_eq, extrapolated = \
+            self.g_function_interpolation_batch(B_over_H_values, kind=kind)
+        axis = None if self.variations is None else self.variations['axis']
+
+        if D_over_H is not None:
+            if axis != 'D':
+                raise ValueError('The field does not have a grid of burial '
+                                 'depths to interpolate D/H.')
+            D_over_H = np.broadcast_to(np.asarray(D_over_H, dtype=float),
+                                       H_eq.shape)
+            g, outside = self.interpolate_variations(H_eq, D_over_H, kind)
+            D = D_over_H * H_eq
+            extrapolated = extrapolated | outside
+
+        if r_b_over_H is not None:
+            r_b_over_H = np.broadcast_to(np.asarray(r_b_over_H, dtype=float),
+                                         H_eq.shape)
+            r_b_star = r_b_over_H * H_eq
+            if axis == 'r_b':
+                g, _ = self.interpolate_variations(H_eq, r_b_over_H, kind)
+            else:
+                g = g - np.log(r_b_star / rb)[:, np.newaxis]
+            rb = r_b_star
+        return g, rb, D, H_eq, extrapolated
+
+    def interpolate_variations(self, H_eq, ratios, kind='default') -> tuple:
+        """
+        Interpolate the grid of g-functions by height and r_b/H or D/H ratio
+        at equivalent heights and ratios, see
+        :func:`g_function_interpolation_grid`.
+
+        Returns
+        -------
+        (g, outside): tuple
+            The (n_queries, n_times) g-functions, and True for the queries
+            outside of the ratios of the grid
+        """
+        grid = self.variations
+        heights = grid['heights']
+        kind = self.interpolation_kind(kind, len(heights))
+        extrapolate = bool(np.any((H_eq < heights[0]) |
+                                  (H_eq > heights[-1])))
+        key = (kind, extrapolate)
+        if key not in self.variation_interpolants:
+            fill_value = 'extrapolate' if extrapolate else ''
+            self.variation_interpolants[key] = self.fit_by_height(
+                heights, grid['g'], kind, fill_value)
+        # the (n_queries, n_ratios, n_times) g-functions at the heights
+        g_grid = self.variation_interpolants[key](H_eq)
+
+        u_grid = np.asarray(grid['ratios'], dtype=float)
+        u = np.asarray(ratios, dtype=float)
+        if grid['axis'] == 'r_b':
+            u_grid = np.log(u_grid)
+            u = np.log(u)
+        i = np.clip(np.searchsorted(u_grid, u) - 1, 0, len(u_grid) - 2)
+        weight = np.clip((u - u_grid[i]) / (u_grid[i + 1] - u_grid[i]),
+                         0., 1.)[:, np.newaxis]
+        rows = np.arange(len(u))
+        g = (1 - weight) * g_grid[rows, i] + weight * g_grid[rows, i + 1]
+        nearest = np.clip(u, u_grid[0], u_grid[-1])
+        if grid['axis'] == 'r_b':
+            # Eskilson's radius correction from the nearest radius
+            g = g - (u - nearest)[:, np.newaxis]
+        return g, u != nearest
+
+    def g_function_at(self, H: float, alpha: float, time=None, log_time=None,
+                      B: float = None, kind='default') -> np.ndarray:
+        """
+        Evaluate the g-function of a borehole field at arbitrary times, such
+        as every hour of a building simulation. The g-function is interpolated
+        for B/H (see :func:`g_function_interpolation_array`), and then in
+        ln(t/ts) with a shape preserving interpolant (see
+        :class:`LogTimeInterpolant`). The interpolant of a B/H ratio is cached,
+        so that repeated evaluations for a field skip all of the setup.
+
+        Parameters
+        ----------
+        H: float
+            The borehole height (m)
+        alpha: float
+            The ground thermal diffusivity (m2/s)
+        time: array_like (optional)
+            The times (s)
+        log_time: array_like (optional)
+            The ln(t/ts) values, given instead of time
+        B: float (optional)
+            The borehole spacing (m), defaults to the spacing of the field
+        kind: str
+            The interpolation kind over B/H
+            default: 'cubic'
+
+        Returns
+        -------
+        **g-function: numpy.ndarray**
+            The g-function values at each time, of the shape of the times
+        """
+        if B is None:
+            B = self.B
+        if log_time is None:
+            if time is None:
+                raise ValueError('Either time or log_time is required.')
+            t_s = H ** 2 / (9 * alpha)
+            log_time = np.log(np.asarray(time, dtype=float) / t_s)
+        return self.log_time_interpolant(B / H, kind=kind)(log_time)
+
+    def log_time_interpolant(self, B_over_H: float,
+                             kind='default') -> LogTimeInterpolant:
+        """
+        Return the cached interpolant in ln(t/ts) of the g-function at a B/H
+        ratio, fitting it if it is not cached or if the data has changed.
+        """
+        versions = (self.g_lts.version, self.r_b_values.version,
+                    self.D_values.version)
+        key = (kind, float(B_over_H))
+        if key in self.log_time_interpolants and \
+                self.log_time_interpolants[key][0] == versions:
+            self.log_time_interpolants.move_to_end(key)
+            return self.log_time_interpolants[key][1]
+        g_function, rb, _, H_eq = \
+            self.g_function_interpolation_array(B_over_H, kind=kind)
+        interpolant = LogTimeInterpolant(self.log_time, g_function,
+                                         r_b_over_H=rb / H_eq)
+        self.log_time_interpolants[key] = (versions, interpolant)
+        self.log_time_interpolants.move_to_end(key)
+        while len(self.log_time_interpolants) > self.max_log_time_interpolants:
+            self.log_time_interpolants.popitem(last=False)
+        return interpolant
+
+    @staticmethod
+    def interpolation_kind(kind: str, num_curves: int) -> str:
+        """
+        Select the interpolation kind given the number of g-function curves.
+        The default kind is chosen from what we know about the accuracy of
+        interpolation, and a kind that requires more curves than are available
+        is reduced.
+        """
+        if num_curves < 2:
+            raise ValueError('Interpolation requires two g-function curves.')
+
         if kind == 'default':
-            num_curves = len(height_values)
             if num_curves >= 5:
                 kind = 'cubic'
             elif num_curves >= 3:
                 kind = 'quadratic'
-            elif num_curves == 2:
-                kind = 'linear'
             else:
-                raise ValueError(
-                    'Interpolation requires two g-function curves.')
+                kind = 'linear'
 
-        # Automatically adjust interpolation if necessary
-        # Lagrange also needs 2
+        # Lagrange and PCHIP also need 2
         interpolation_kinds = {'linear': 2, 'quadratic': 3, 'cubic': 4,
-                               'lagrange': 2}
+                               'lagrange': 2, 'pchip': 2}
+        if kind not in interpolation_kinds:
+            raise ValueError('The interpolation kind ' + kind + ' is not '
+                             'handled. Please enter one of the following '
+                             'kinds: default, ' +
+                             ', '.join(interpolation_kinds))
         curves_by_kind = {2: 'linear', 3: 'quadratic', 4: 'cubic'}
-        if len(height_values) < 2:
-            raise ValueError('Interpolation requires two g-function curves.')
-        else:
-            # If the number of required curves for the interpolation type is
-            # greater than what is available, reduce the interpolation type
-            required_curves = interpolation_kinds[kind]
-            if required_curves > len(height_values):
-                kind = curves_by_kind[len(height_values)]
-
-        # if the interpolation table is not yet know, build it
-        if len(self.interpolation_table) == 0:
-            # create an interpolation for the g-function which takes the height
-            # (or equivilant height) as an input the g-function needs to be
-            # interpolated at each point in dimensionless time
-            self.interpolation_table['g'] = []
-            for i, lntts in enumerate(self.log_time):
-                x = []
-                y = []
-                for key in self.g_lts:
-                    height_value = float(key)
-                    g_value = self.g_lts[key][i]
-                    x.append(height_value)
-                    y.append(g_value)
-                if kind == 'lagrange':
-                    f = lagrange(x, y)
-                else:
-                    f = interp1d(x, y, kind=kind, fill_value=fill_value)
-                self.interpolation_table['g'].append(f)
-            # create interpolation tables for 'D' and 'r_b' by height
-            keys = list(self.r_b_values.keys())
-            height_values: list = []
-            rb_values: list = []
-            D_values: list = []
-            for h in keys:
-                height_values.append(float(h))
-                rb_values.append(self.r_b_values[h])
-                try:
-                    D_values.append(self.D_values[h])
-                except:
-                    pass
-            if kind == 'lagrange':
-                rb_f = lagrange(height_values, rb_values)
-            else:
-                # interpolation function for rb values by H equivalent
-                rb_f = interp1d(height_values, rb_values, kind=kind, fill_value=fill_value)
-            self.interpolation_table['rb'] = rb_f
-            try:
-                if kind == 'lagrange':
-                    D_f = lagrange(height_values, D_values)
-                else:
-                    D_f = interp1d(height_values, D_values, kind=kind, fill_value=fill_value)
-                self.interpolation_table['D'] = D_f
-            except:
-                pass
+        # If the number of required curves for the interpolation type is
+        # greater than what is available, reduce the interpolation type
+        if interpolation_kinds[kind] > num_curves:
+            kind = curves_by_kind[num_curves]
+        return kind
 
-        # create the g-function by interpolating at each ln(t/ts) value
-        rb_value = self.interpolation_table['rb'](H_eq)
-        try:
-            D_value = self.interpolation_table['D'](H_eq)
-        except:
-            D_value = None
-        g_function: list = []
-        for i in range(len(self.log_time)):
-            f = self.interpolation_table['g'][i]
-            g = f(H_eq).tolist()
-            g_function.append(g)
-        return g_function, rb_value, D_value, H_eq
+    def interpolation_table_for(self, kind: str, extrapolate: bool) -> dict:
+        """
+        Return the interpolation table of a kind, fitting it if it is not
+        cached or if g_lts, r_b_values or D_values have changed since it was
+        fit.
+
+        Parameters
+        ----------
+        kind: str
+            The interpolation kind, see :func:`interpolation_kind`
+        extrapolate: bool
+            Whether the table can be evaluated outside of the heights
+
+        Returns
+        -------
+        table: dict
+            The interpolants of 'g', 'rb' and 'D' (if available) by height
+        """
+        versions = (self.g_lts.version, self.r_b_values.version,
+                    self.D_values.version)
+        key = (kind, extrapolate)
+        if key not in self.interpolants or \
+                self.interpolants[key][0] != versions:
+            fill_value = 'extrapolate' if extrapolate else ''
+            self.interpolants[key] = \
+                (versions, self.fit_interpolation_table(kind, fill_value))
+        self.interpolation_table = self.interpolants[key][1]
+        return self.interpolation_table
+
+    def fit_interpolation_table(self, kind: str, fill_value) -> dict:
+        """
+        Fit an interpolation table, the interpolants of the g-function, 'rb'
+        and 'D' by height (or equivalent height).
+        """
+        def fit(x, y):
+            return self.fit_by_height(x, y, kind, fill_value)
+
+        table = {}
+        # the heights and an (n_heights, n_times) array of the g-functions
+        x = np.array([float(key) for key in self.g_lts])
+        y = np.array([self.g_lts[key] for key in self.g_lts], dtype=float)
+        table['g'] = fit(x, y)
+
+        # create interpolation tables for 'D' and 'r_b' by height
+        keys = list(self.r_b_values.keys())
+        height_values = [float(h) for h in keys]
+        rb_values = [self.r_b_values[h] for h in keys]
+        D_values = [self.D_values[h] for h in keys if h in self.D_values]
+        # interpolation function for rb values by H equivalent
+        table['rb'] = fit(height_values, rb_values)
+        if len(D_values) == len(height_values):
+            table['D'] = fit(height_values, D_values)
+        return table
+
+    @staticmethod
+    def fit_by_height(x, y, kind: str, fill_value):
+        """
+        Fit an interpolant of a kind along the first axis of y, which is the
+        height axis. The Lagrange polynomial is evaluated in its barycentric
+        form, which is stable and fit once for every ln(t/ts).
+        """
+        if kind == 'lagrange':
+            return BarycentricInterpolator(x, y, axis=0)
+        elif kind == 'pchip':
+            return PchipInterpolator(x, y, axis=0,
+                                     extrapolate=fill_value == 'extrapolate')
+        return interp1d(x, y, kind=kind, axis=0, fill_value=fill_value)
+
+    @staticmethod
+    def piecewise_coefficients(x, y, kind: str):
+        """
+        Compute the piecewise polynomial coefficients of a spline fit along
+        the first axis of y, which is the spline fit by interp1d for the
+        'linear', 'quadratic' and 'cubic' kinds, or the PCHIP interpolant for
+        the 'pchip' kind.
+
+        Returns
+        -------
+        (breakpoints, c): tuple
+            The breakpoints and the (order + 1, n_intervals, ...) coefficients
+            of a :class:`scipy.interpolate.PPoly`
+        """
+        if kind == 'pchip':
+            f = PchipInterpolator(x, np.asarray(y, dtype=float), axis=0)
+            return f.x, f.c
+        orders = {'linear': 1, 'quadratic': 2, 'cubic': 3}
+        if kind not in orders:
+            raise ValueError('The interpolation kind ' + kind + ' is not a '
+                             'piecewise polynomial.')
+        k = orders[kind]
+        spline = make_interp_spline(x, np.asarray(y, dtype=float), k=k,
+                                    axis=0)
+        n = len(spline.t) - k - 1
+        breakpoints = np.unique(spline.t[k:n + 1])
+        # the derivatives at the start of each interval are the coefficients
+        c = np.stack([spline(breakpoints[:-1], nu=m) / math.factorial(m)
+                      for m in range(k, -1, -1)])
+        return breakpoints, c
+
+    def interpolation_coefficients(self, kind='default') -> dict:
+        """
+        Compute the piecewise polynomial coefficients of the g-function, r_b
+        and D interpolants by height, so that they can be stored in a library
+        and loaded with :func:`load_interpolation_coefficients` rather than
+        being fit again.
+
+        Parameters
+        ----------
+        kind: str
+            Could be 'linear', 'quadratic', 'cubic' or 'pchip'
+            default: 'cubic'
+
+        Returns
+        -------
+        coefficients: dict
+            The kind, heights 'H', 'breakpoints' and the coefficients of 'g',
+            'r_b' and 'D' (if the g-functions have burial depths)
+        """
+        heights = list(self.g_lts.keys())
+        kind = self.interpolation_kind(kind, len(heights))
+        x = np.array([float(h) for h in heights])
+        breakpoints, g = self.piecewise_coefficients(
+            x, [self.g_lts[h] for h in heights], kind)
+        _, r_b = self.piecewise_coefficients(
+            x, [self.r_b_values[h] for h in heights], kind)
+        coefficients = {'kind': kind, 'H': x, 'breakpoints': breakpoints,
+                        'g': g, 'r_b': r_b}
+        if all(h in self.D_values for h in heights):
+            _, coefficients['D'] = self.piecewise_coefficients(
+                x, [self.D_values[h] for h in heights], kind)
+        return coefficients
+
+    def load_interpolation_coefficients(self, coefficients: dict):
+        """
+        Build the interpolation tables from the coefficients computed by
+        :func:`interpolation_coefficients`, without fitting. The tables are
+        used for the kind both within and outside of the heights, and are fit
+        again if the data is modified.
+        """
+        heights = np.array([float(h) for h in self.g_lts.keys()])
+        if not np.array_equal(np.asarray(coefficients['H'], dtype=float),
+                              heights):
+            raise ValueError('The interpolation coefficients do not belong '
+                             'to the g-functions.')
+        breakpoints = np.asarray(coefficients['breakpoints'], dtype=float)
+        table = {}
+        for name, key in [('g', 'g'), ('rb', 'r_b'), ('D', 'D')]:
+            if key in coefficients:
+                table[name] = PPoly(np.asarray(coefficients[key], dtype=float),
+                                    breakpoints)
+        versions = (self.g_lts.version, self.r_b_values.version,
+                    self.D_values.version)
+        for extrapolate in [False, True]:
+            self.interpolants[(coefficients['kind'], extrapolate)] = \
+                (versions, table)
 
     @staticmethod
     def borehole_radius_correction(g_function: list, rb: float, rb_star: float):
@@ -304,11 +906,37 @@ class GFunction:
         Parameters
         ----------
         data: dict
-            A dictionary which is in the output format of cpgfunction.
+            A dictionary which is in the output format of cpgfunction, or in
+            the array format of
+            :func:`gFunctionDatabase.General.fileio.field_arrays`.
         Returns
         -------
             a dictionary for input to this object
         """
+        if 'H' in data:
+            # the array format is already sorted by height
+            D_values = np.where(np.isnan(data['D']), 2., data['D'])
+            # one g-function per height, the nearest to the library defaults
+            # for a grid of radii or burial depths
+            rows = nominal_rows(data['H'], data['r_b'], D_values)
+            heights = [float(H) for H in data['H'][rows]]
+            geothermal_g_input = {}
+            geothermal_g_input['B'] = data['B']
+            geothermal_g_input['r_b_values'] = \
+                dict(zip(heights, data['r_b'][rows].tolist()))
+            geothermal_g_input['D_values'] = \
+                dict(zip(heights, D_values[rows].tolist()))
+            geothermal_g_input['g_lts'] = dict(zip(heights, data['g'][rows]))
+            geothermal_g_input['log_time'] = data['logtime']
+            geothermal_g_input['bore_locations'] = data['bore_locations']
+            if 'coefficients' in data:
+                geothermal_g_input['coefficients'] = data['coefficients']
+            variations = variation_grid(data['H'], data['r_b'], data['D'],
+                                        data['g'])
+            if variations is not None:
+                geothermal_g_input['variations'] = variations
+            return geothermal_g_input
+
         log_time = data['logtime']
 
         bore_locations = data[
@@ -367,20 +995,149 @@ class GFunction:
         geothermal_g_input['g_lts'] = g
         geothermal_g_input['log_time'] = log_time
         geothermal_g_input['bore_locations'] = bore_locations
+        if 'coefficients' in data:
+            geothermal_g_input['coefficients'] = data['coefficients']
+        # the heights, radii and burial depths of every key, for a grid of
+        # radii or burial depths at each height
+        key_values = [[float(k) for k in key.split('_')[1:4]]
+                      for key in g_values]
+        if all(len(values) == 3 for values in key_values):
+            heights, r_bs_all, Ds_all = zip(*key_values)
+            variations = variation_grid(heights, r_bs_all, Ds_all,
+                                        list(g_values.values()))
+            if variations is not None:
+                geothermal_g_input['variations'] = variations
+                # the dictionaries by height hold the last g-function of each
+                # height, use the nearest to the library defaults instead
+                all_g = list(g_values.values())
+                rows = nominal_rows(heights, r_bs_all, Ds_all)
+                geothermal_g_input['r_b_values'] = \
+                    {heights[i]: r_bs_all[i] for i in rows}
+                geothermal_g_input['D_values'] = \
+                    {heights[i]: Ds_all[i] for i in rows}
+                geothermal_g_input['g_lts'] = {heights[i]: all_g[i]
+                                               for i in rows}
 
         return geothermal_g_input
 
 
-def uniform_temperature_uniform_segment_lengths(D_values: list, H_values: list,
-                                                r_b_values: list, B: float,
-                                                log_time: list, alpha: float,
-                                                coordinates: list,
-                                                nSegments: list):
-    # Compute a uniform borehole wall temperature g-function with uniform
-    # segment lengths
+def variation_grid(heights, r_b, D, g) -> dict:
+    """
+    Find the grid of g-functions of a field that has more than one borehole
+    radius or burial depth at each height. The grid is a tensor grid of the
+    heights and of the r_b/H (or D/H) ratios, which must be the same at each
+    height.
 
-    g_data: dict = {'bore_locations': coordinates, 'g': {}, 'logtime': log_time}
+    Parameters
+    ----------
+    heights, r_b, D: array_like
+        The height, borehole radius and burial depth of each g-function
+    g: array_like
+        The g-functions, with the shape (n_g_functions, n_times)
+
+    Returns
+    -------
+    grid: dict
+        The 'axis' ('r_b' or 'D'), the sorted 'heights' and 'ratios', and the
+        g-functions 'g' with the shape (n_heights, n_ratios, n_times), or None
+        if the field does not have a grid
+    """
+    heights = np.asarray(heights, dtype=float)
+    r_b = np.asarray(r_b, dtype=float)
+    D = np.asarray(D, dtype=float)
+    unique_heights = np.unique(heights)
+    if len(unique_heights) == len(heights):
+        return None
+
+    # the quantity that varies at each height
+    axes = {'r_b': r_b, 'D': D}
+    varying = [name for name, values in axes.items()
+               if any(len(np.unique(values[heights == h])) > 1
+                      for h in unique_heights)]
+    if len(varying) != 1:
+        return None
+    axis = varying[0]
+
+    ratios = None
+    order = []
+    for h in unique_heights:
+        indices = np.flatnonzero(heights == h)
+        h_ratios = axes[axis][indices] / h
+        sort = np.argsort(h_ratios)
+        if ratios is None:
+            ratios = h_ratios[sort]
+        elif len(h_ratios) != len(ratios) or \
+                not np.allclose(h_ratios[sort], ratios, rtol=1.0e-06):
+            return None
+        order.append(indices[sort])
+    if len(ratios) < 2:
+        return None
 
+    g = np.asarray(g, dtype=float)
+    return {'axis': axis, 'heights': unique_heights, 'ratios': ratios,
+            'g': g[np.array(order)]}
+
+
+def nominal_rows(heights, r_b, D) -> np.ndarray:
+    """
+    The g-function used at each height of a field for the interpolation by
+    B/H, which is the only g-function of the height unless the field has a
+    grid of radii or burial depths (see :func:`variation_grid`). Of a grid,
+    the g-function nearest the library defaults is used: the burial depth of
+    :data:`LIBRARY_BURIAL_DEPTH` and the radius of :data:`LIBRARY_RADII`
+    interpolated at the height (compared in ln(r_b)).
+
+    Parameters
+    ----------
+    heights, r_b, D: array_like
+        The height, borehole radius and burial depth of each g-function
+
+    Returns
+    -------
+    rows: numpy.ndarray
+        The index of the g-function of each height, sorted by height
+    """
+    heights = np.asarray(heights, dtype=float)
+    r_b = np.asarray(r_b, dtype=float)
+    D = np.asarray(D, dtype=float)
+    rows = []
+    for h in np.unique(heights):
+        indices = np.flatnonzero(heights == h)
+        nominal_r_b = np.interp(h, LIBRARY_HEIGHTS, LIBRARY_RADII)
+        distance_D = np.abs(D[indices] - LIBRARY_BURIAL_DEPTH)
+        distance_r_b = np.abs(np.log(r_b[indices] / nominal_r_b))
+        rows.append(indices[np.lexsort((distance_r_b, distance_D))[0]])
+    return np.array(rows, dtype=int)
+
+
+def field_coefficients(data: dict, kind: str = 'default') -> dict:
+    """
+    Compute the interpolation coefficients of a field in the output format of
+    cpgfunction (or the array format), see
+    :func:`GFunction.interpolation_coefficients`. This is the build step that
+    stores the coefficients in a binary library, see
+    :func:`gFunctionDatabase.General.binaryio.bin_dump`.
+    """
+    g_function = GFunction(**GFunction.configure_database_file_for_usage(data))
+    return g_function.interpolation_coefficients(kind=kind)
+
+
+def _uniform_temperature_g_function(boreField: list, alpha: float,
+                                    time: np.ndarray, options: dict) -> list:
+    # Compute the uniform borehole wall temperature g-function of one height,
+    # the task run by each worker process
+    gfunc_uniform_T = gt.gfunction.gFunction(
+        boreField, alpha, time=time, boundary_condition='UBWT',
+        options=options)
+    return gfunc_uniform_T.gFunc.tolist()
+
+
+def uniform_temperature_tasks(D_values: list, H_values: list,
+                              r_b_values: list, log_time: list, alpha: float,
+                              coordinates: list, nSegments: list) -> list:
+    # The (boreField, alpha, time, options) inputs of the uniform borehole
+    # wall temperature solve of each (D, H, r_b)
+    tasks = []
     for i in range(len(D_values)):
         D = D_values[i]
         H = H_values[i]
@@ -395,10 +1152,65 @@ def uniform_temperature_uniform_segment_lengths(D_values: list, H_values: list,
             x, y = coordinates[j]
             borehole = gt.boreholes.Borehole(H, D, r_b, x, y)
             boreField.append(borehole)
-        gfunc_uniform_T = gt.gfunction.gFunction(
-            boreField, alpha, time=t, boundary_condition='UBWT',
-            options=options)
-        key_value = '{}_{}_{}_{}'.format(B, H, r_b, D)
-        g_data['g'][key_value] = gfunc_uniform_T.gFunc.tolist()
+        tasks.append((boreField, alpha, t, options))
+    return tasks
+
+
+def uniform_temperature_uniform_segment_lengths(D_values: list, H_values: list,
+                                                r_b_values: list, B: float,
+                                                log_time: list, alpha: float,
+                                                coordinates: list,
+                                                nSegments: list,
+                                                workers: int = 1,
+                                                cache=None):
+    # Compute a uniform borehole wall temperature g-function with uniform
+    # segment lengths. The (D, H, r_b) solves are independent, so with more
+    # than one worker they are run in a pool of processes (workers=None uses
+    # every CPU), and the field takes about as long as its slowest height.
+    # With a cache (a gfunctioncache.GFunctionCache, or True for the default
+    # cache), the solves that were computed before are read from the cache.
+
+    g_data: dict = {'bore_locations': coordinates, 'g': {}, 'logtime': log_time}
+
+    n = len(D_values)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError('The number of workers must be at least 1.')
+    cache = gfunctioncache.resolve(cache)
+
+    tasks = uniform_temperature_tasks(D_values, H_values, r_b_values,
+                                      log_time, alpha, coordinates, nSegments)
+
+    g_values = [None] * n
+    if cache is not None:
+        parameters = [cache.parameters(boreField, alpha, t, 'UBWT',
+                                       options=options)
+                      for boreField, alpha, t, options in tasks]
+        g_values = [cache.lookup(value) for value in parameters]
+    missing = [i for i in range(n) if g_values[i] is None]
+
+    if min(workers, len(missing)) <= 1:
+        for i in missing:
+            g_values[i] = _uniform_temperature_g_function(*tasks[i])
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(workers, len(missing))) as pool:
+            # the solves with the most segments take the longest, so they
+            # are started first
+            order = sorted(missing, key=lambda i: -nSegments[i])
+            futures = {i: pool.submit(_uniform_temperature_g_function,
+                                      *tasks[i]) for i in order}
+            for i in missing:
+                g_values[i] = futures[i].result()
+
+    if cache is not None:
+        for i in missing:
+            cache.store(parameters[i], g_values[i])
+
+    for i in range(n):
+        key_value = '{}_{}_{}_{}'.format(B, H_values[i], r_b_values[i],
+                                         D_values[i])
+        g_data['g'][key_value] = g_values[i]
 
     return g_data
@@ -0,0 +1,316 @@
+"""
+**asyncretrieval.py**
+
+An asyncio interface to the retrieval and interpolation of fields, for use in
+servers that handle many requests on one event loop.
+
+Opening a library, retrieving a field and interpolating a g-function are
+blocking, so they are run in bounded executors rather than on the event loop.
+The libraries are opened and the fields retrieved in a small pool of worker
+threads. Concurrent requests for a configuration that is not yet open share a
+single load of the library. The interpolation is CPU bound and is run in a
+pool of worker processes. The workers open the libraries themselves and keep
+the fitted g-functions of the fields they have interpolated, so a request
+only sends the configuration, NxM and B/H to a worker.
+
+Note
+------
+Worker threads share the GIL with the event loop. Python code in a worker is
+preempted every switch interval (see :func:`sys.getswitchinterval`, 5 ms by
+default), so each thread busy with Python code can delay the event loop by a
+switch interval, and a single call into C code is not preempted at all. For
+this reason the CPU bound interpolation is not run in threads, and the binary
+storage (which only reads the header of a library when it is opened) is the
+default. The json storage decodes an entire library in one call to the json
+decoder, which holds the event loop for tens of milliseconds.
+"""
+
+import asyncio
+from collections import OrderedDict
+import concurrent.futures
+import functools
+import os
+import threading
+
+from . import application
+from . import retrieval
+
+
+class AsyncRetrieve:
+    """
+    Retrieve and interpolate fields from the database configurations with
+    coroutines.
+
+    Parameters
+    ----------
+    configuration : str (optional)
+        The default configuration of :func:`retrieve`, i.e. L, U, rectangle
+    storage : str (optional)
+        The storage format to read the configurations from, see
+        :func:`gFunctionDatabase.Management.retrieval.BaseRetrieval.load_data`
+    cache : bool (optional)
+        If True, the libraries are shared with the process wide
+        :data:`gFunctionDatabase.Management.retrieval.library_cache`
+    arrays : bool (optional)
+        If True, the fields are retrieved in the array format of
+        :func:`gFunctionDatabase.General.fileio.field_arrays`
+    max_workers : int (optional)
+        The number of worker threads that open libraries and retrieve fields
+    processes : int (optional)
+        The number of worker processes that interpolate, defaults to the
+        number of CPUs. The processes are started on the first call to
+        :func:`interpolate`.
+    executor : concurrent.futures.Executor (optional)
+        An executor to open libraries and retrieve fields in. If given,
+        max_workers is ignored and the executor is not shut down by
+        :func:`close`.
+    interpolation_executor : concurrent.futures.Executor (optional)
+        An executor to interpolate in. If given, processes is ignored and the
+        executor is not shut down by :func:`close`.
+    max_interpolants : int (optional)
+        The number of fields each interpolation worker keeps the fitted
+        g-functions of, see :func:`interpolate_in_worker`
+
+    Examples
+    ---------
+    >>> import asyncio
+    >>> import gFunctionDatabase as gfdb
+    >>> async def main():
+    ...     async with gfdb.Management.asyncretrieval.AsyncRetrieve('L') as r:
+    ...         return await asyncio.gather(r.retrieve(3, 4),
+    ...                                     r.interpolate('L', 5, 5, 0.05))
+    >>> field, interpolation = asyncio.run(main())
+    """
+    def __init__(self, configuration: str = None, storage: str = 'binary',
+                 cache: bool = False, arrays: bool = False,
+                 max_workers: int = 2, processes: int = None,
+                 executor=None, interpolation_executor=None,
+                 max_interpolants: int = 1024):
+        self.configuration = configuration
+        self.storage = storage
+        self.cache = cache
+        self.arrays = arrays
+        if executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix='gfdb-retrieve')
+            self._owns_executor = True
+        else:
+            self.executor = executor
+            self._owns_executor = False
+        self.processes = processes
+        self.interpolation_executor = interpolation_executor
+        self._owns_interpolation_executor = interpolation_executor is None
+        self.max_interpolants = max_interpolants
+        # The open Retrieve objects keyed by configuration
+        self.retrievals: dict = {}
+        # The loads in progress keyed by configuration
+        self._loading: dict = {}
+        # The number of libraries that have been loaded
+        self.loads = 0
+        self._lock = threading.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    def close(self):
+        """
+        Shut down the worker threads and processes, if they belong to this
+        object. This waits for the worker processes to exit, use
+        :meth:`aclose` in a coroutine.
+        """
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
+        if self._owns_interpolation_executor and \
+                self.interpolation_executor is not None:
+            self.interpolation_executor.shutdown(wait=True)
+            self.interpolation_executor = None
+
+    async def aclose(self):
+        """
+        Shut down the worker threads and processes, if they belong to this
+        object, waiting for the worker processes to exit in a thread so that
+        the event loop is not blocked.
+        """
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
+        if self._owns_interpolation_executor and \
+                self.interpolation_executor is not None:
+            interpolation_executor = self.interpolation_executor
+            self.interpolation_executor = None
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                None, functools.partial(interpolation_executor.shutdown,
+                                        wait=True))
+
+    def _open(self, configuration):
+        # Run in a worker thread: open the library and compute its boundaries
+        retrieve = retrieval.Retrieve(configuration, storage=self.storage,
+                                      cache=self.cache, arrays=self.arrays)
+        retrieve.boundary_index()
+        with self._lock:
+            self.loads += 1
+        return retrieve
+
+    def _loaded(self, configuration, future):
+        # Called on the event loop when a load finishes
+        del self._loading[configuration]
+        if not future.cancelled() and future.exception() is None:
+            self.retrievals[configuration] = future.result()
+
+    async def open(self, configuration: str) -> retrieval.Retrieve:
+        """
+        Open a configuration. The library is loaded once; requests that
+        arrive while it is loading wait on the same load, and a failed load
+        is attempted again by the next request.
+
+        Parameters
+        ----------
+        configuration : str
+            The database configuration, i.e. L, U, rectangle
+
+        Returns
+        -------
+        retrieve : gFunctionDatabase.Management.retrieval.Retrieve
+            The retrieval object of the configuration
+        """
+        if configuration in self.retrievals:
+            return self.retrievals[configuration]
+        future = self._loading.get(configuration)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, self._open,
+                                          configuration)
+            self._loading[configuration] = future
+            future.add_done_callback(
+                lambda f: self._loaded(configuration, f))
+        # a cancelled request does not cancel the load for the other requests
+        return await asyncio.shield(future)
+
+    async def retrieve(self, N: int, M: int,
+                       configuration: str = None) -> dict:
+        """
+        Retrieve an NxM field, see
+        :func:`gFunctionDatabase.Management.retrieval.Retrieve.retrieve`.
+
+        Parameters
+        ----------
+        N: int
+            Number of boreholes in the y-direction
+        M: int
+            Number of boreholes in the x-direction
+        configuration: str (optional)
+            The database configuration, defaults to the configuration given
+            when the object was created
+
+        Returns
+        -------
+        data: dict
+            The unimodal dictionary of fields returned by Retrieve.retrieve
+        """
+        if configuration is None:
+            configuration = self.configuration
+        if configuration is None:
+            raise ValueError('A configuration is required to retrieve a '
+                             'field.')
+        retrieve = await self.open(configuration)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, retrieve.retrieve,
+                                          N, M)
+
+    async def interpolate(self, configuration: str, N: int, M: int,
+                          B_over_H: float, kind: str = 'default') -> dict:
+        """
+        Interpolate the g-function of each field stored for NxM at a B/H
+        ratio in an interpolation worker, see :func:`interpolate_in_worker`
+        and
+        :func:`gFunctionDatabase.Management.application.GFunction.g_function_interpolation`.
+
+        Parameters
+        ----------
+        configuration: str
+            The database configuration, i.e. L, U, rectangle
+        N: int
+            Number of boreholes in the y-direction
+        M: int
+            Number of boreholes in the x-direction
+        B_over_H: float
+            A B/H ratio
+        kind: str (optional)
+            The interpolation kind
+
+        Returns
+        -------
+        interpolations: dict
+            The (g-function, rb, D, H_eq) tuple of each field, keyed the same
+            as the dictionary returned by :func:`retrieve`
+        """
+        if self.interpolation_executor is None:
+            self.interpolation_executor = \
+                concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.processes or os.cpu_count() or 1)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.interpolation_executor, interpolate_in_worker,
+            configuration, N, M, B_over_H, kind, self.storage, self.arrays,
+            self.max_interpolants)
+
+
+# The state of an interpolation worker: the libraries it has opened and the
+# GFunction of each field it has interpolated, in least recently used order
+_worker_retrievals: dict = {}
+_worker_g_functions = OrderedDict()
+_worker_lock = threading.Lock()
+
+
+def interpolate_in_worker(configuration: str, N: int, M: int,
+                          B_over_H: float, kind: str = 'default',
+                          storage: str = 'binary', arrays: bool = False,
+                          max_interpolants: int = 1024) -> dict:
+    """
+    Interpolate the g-function of each field stored for NxM at a B/H ratio,
+    in the process that calls it. The library of the configuration is opened
+    on the first call, and the GFunction of each field (with the interpolants
+    fit to it) is kept for the next calls, up to max_interpolants fields.
+    """
+    name = (configuration, storage, arrays)
+    with _worker_lock:
+        if name not in _worker_retrievals:
+            _worker_retrievals[name] = retrieval.Retrieve(
+                configuration, storage=storage, arrays=arrays)
+        retrieve = _worker_retrievals[name]
+        data = retrieve.retrieve(N, M)
+        g_functions = []
+        for key in data:
+            if (name, key) in _worker_g_functions:
+                _worker_g_functions.move_to_end((name, key))
+            else:
+                _worker_g_functions[(name, key)] = application.GFunction(
+                    **application.GFunction.
+                    configure_database_file_for_usage(data[key]))
+            g_functions.append(_worker_g_functions[(name, key)])
+        while len(_worker_g_functions) > max_interpolants:
+            _worker_g_functions.popitem(last=False)
+        # the interpolants are fit under the lock, as a GFunction is not safe
+        # to fit from several threads at once
+        return {key: g_function.g_function_interpolation(B_over_H, kind=kind)
+                for key, g_function in zip(data, g_functions)}
+
+
+def interpolate_fields(data: dict, B_over_H: float,
+                       kind: str = 'default') -> dict:
+    """
+    Interpolate the g-function of each field in a retrieved dictionary at a
+    B/H ratio.
+    """
+    interpolations = {}
+    for key in data:
+        g_function = application.GFunction(
+            **application.GFunction.configure_database_file_for_usage(
+                data[key]))
+        interpolations[key] = \
+            g_function.g_function_interpolation(B_over_H, kind=kind)
+    return interpolations
@@ -0,0 +1,506 @@
+"""
+**build.py**
+
+Build, extend or regenerate a configuration library (i.e. the L library with
+the fields from 2x2 to 32x32) by computing the g-function of every field with
+pygfunction.
+
+The fields are enumerated with the generators of
+:mod:`gFunctionDatabase.coordinates`. Each height of each field is a separate
+uniform borehole wall temperature solve, and the solves are scheduled over a
+pool of worker processes, the largest fields first, so that every core is
+busy until the end of the build.
+
+Every finished field is appended to a checkpoint, a json lines file that is
+flushed to disk after each field. The first line of the checkpoint holds the
+settings of the build. An interrupted build is resumed by running it again
+with the same checkpoint, which skips the fields that are already in the
+checkpoint (a partially written last line is discarded). When every field has
+been computed, the checkpoint is assembled into a json library in the layout
+of the registered libraries.
+
+Usage
+------
+    python -m gFunctionDatabase.Management.build L --N-max 32
+    python -m gFunctionDatabase.Management.build zoned --N-max 12 \\
+        --checkpoint zoned.jsonl --output zoned_configurations_5m.json
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import sys
+import time
+
+import natsort
+
+from gFunctionDatabase import General
+from gFunctionDatabase import coordinates
+from gFunctionDatabase import utilities
+from . import application
+from . import gfunctioncache
+
+
+# The heights (m) and the borehole radius (m) at each height of the 5m
+# libraries, and their burial depth (m)
+HEIGHTS = application.LIBRARY_HEIGHTS
+RADII = application.LIBRARY_RADII
+BURIAL_DEPTH = application.LIBRARY_BURIAL_DEPTH
+
+# The smallest number of boreholes on a side of each configuration
+MINIMUM_N = {'rectangle': 1, 'L': 2, 'U': 3, 'Open': 3, 'zoned': 3}
+
+CONFIGURATIONS = list(MINIMUM_N.keys())
+
+
+def configuration_entries(configuration: str, N_max: int, B: float = 5.,
+                          N_min: int = None) -> list:
+    """
+    Enumerate the fields of a configuration library.
+
+    The primary keys are N_M with N <= M, except for the U configuration with
+    N boreholes along its base and M along its sides. The U and Open
+    configurations are stored with two levels, and the coordinate generators
+    produce a thickness of one, the secondary key '1'. The secondary keys of
+    the zoned rectangles are the number of interior boreholes Nix_Niy.
+
+    Parameters
+    ----------
+    configuration: str
+        The configuration, one of rectangle, L, U, Open, zoned
+    N_max: int
+        The largest number of boreholes on a side
+    B: float (optional)
+        The borehole spacing (m)
+    N_min: int (optional)
+        The smallest number of boreholes on a side, defaults to the smallest
+        field of the configuration
+
+    Returns
+    -------
+    entries: list
+        The (primary key, secondary key, coordinates) tuples, the secondary
+        key is None for the configurations with one level
+    """
+    if configuration not in MINIMUM_N:
+        raise ValueError('The configuration ' + str(configuration) + ' can '
+                         'not be built. Please enter one of the following '
+                         'configurations: ' + ', '.join(CONFIGURATIONS))
+    minimum = MINIMUM_N[configuration]
+    if N_min is None:
+        N_min = minimum
+    N_min = max(N_min, minimum)
+
+    entries = []
+    for N in range(N_min, N_max + 1):
+        # a U is not symmetric, the other fields are equal when transposed
+        for M in range(N_min if configuration == 'U' else N, N_max + 1):
+            primary_key = '{}_{}'.format(N, M)
+            if configuration == 'rectangle':
+                entries.append((primary_key, None,
+                                coordinates.rectangle(N, M, B, B)))
+            elif configuration == 'L':
+                entries.append((primary_key, None,
+                                coordinates.L_shape(N, M, B, B)))
+            elif configuration == 'U':
+                entries.append((primary_key, '1',
+                                coordinates.U_shape(N, M, B, B)))
+            elif configuration == 'Open':
+                entries.append((primary_key, '1',
+                                coordinates.open_rectangle(N, M, B, B)))
+            else:
+                zoned = coordinates.ZonedRectangle(N, M, B)
+                for key, values in zoned.coordinates.items():
+                    # ZRect_Nx_x_Ny_Nix_x_Niy
+                    split = key.split('_')
+                    entries.append((primary_key,
+                                    '{}_{}'.format(split[4], split[6]),
+                                    values))
+    return entries
+
+
+def read_checkpoint(path_to_checkpoint: str) -> tuple:
+    """
+    Read a build checkpoint. A partially written last line, left by a build
+    that was interrupted while writing, is removed from the file.
+
+    Returns
+    -------
+    (settings, records): tuple
+        The settings of the build (None if the checkpoint does not exist) and
+        the records of the finished fields, each a dictionary with the key,
+        secondary_key, seconds and field
+    """
+    if not os.path.exists(path_to_checkpoint):
+        return None, []
+    settings = None
+    records = []
+    complete = 0  # the byte length of the complete lines
+    with open(path_to_checkpoint, 'rb') as file:
+        for line in file:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            complete += len(line)
+            if settings is None:
+                settings = record['settings']
+            else:
+                records.append(record)
+    if complete < os.path.getsize(path_to_checkpoint):
+        with open(path_to_checkpoint, 'r+b') as file:
+            file.truncate(complete)
+    return settings, records
+
+
+def _append(file, record: dict) -> None:
+    # append a line to the checkpoint and make it durable
+    file.write(json.dumps(record) + '\n')
+    file.flush()
+    os.fsync(file.fileno())
+
+
+def solve_height(boreField: list, alpha: float, times,
+                 options: dict) -> tuple:
+    """
+    Compute the g-function of one height of a field, the task run by each
+    worker process.
+
+    Returns
+    -------
+    (g, seconds): tuple
+        The g-function values and the time taken by the solve (s)
+    """
+    tic = time.perf_counter()
+    g = application._uniform_temperature_g_function(boreField, alpha, times,
+                                                    options)
+    return g, time.perf_counter() - tic
+
+
+def assemble_library(path_to_checkpoint: str, path_to_output: str) -> dict:
+    """
+    Write the fields of a checkpoint to a json library, ordered by their keys.
+    The library is compressed if the path ends in .json.gz or .json.xz.
+
+    Returns
+    -------
+    summary: dict
+        The configuration, the number of fields and the output path
+    """
+    settings, records = read_checkpoint(path_to_checkpoint)
+    if settings is None:
+        raise ValueError('The checkpoint ' + path_to_checkpoint + ' does not '
+                         'exist.')
+    library = {}
+    for record in records:
+        if record['secondary_key'] is None:
+            library[record['key']] = record['field']
+        else:
+            library.setdefault(record['key'], {})[record['secondary_key']] = \
+                record['field']
+    ordered = {}
+    for key in natsort.natsorted(library.keys()):
+        content = library[key]
+        if 'g' not in content:
+            content = {secondary_key: content[secondary_key] for secondary_key
+                       in natsort.natsorted(content.keys())}
+        ordered[key] = content
+    General.fileio.js_stream_dump(ordered, path_to_output)
+    return {'configuration': settings['configuration'],
+            'fields': len(records), 'output': path_to_output}
+
+
+def build_library(configuration: str, path_to_checkpoint: str, N_max: int,
+                  B: float = 5., N_min: int = None, heights: list = None,
+                  r_b: list = None, D: float = BURIAL_DEPTH,
+                  alpha: float = 1.0e-06, log_time: list = None,
+                  nSegments: int = 12, workers: int = None, cache=None,
+                  path_to_output: str = None):
+    """
+    Build a configuration library, resuming from the checkpoint if it exists.
+    The progress is streamed back as each field is finished.
+
+    Parameters
+    ----------
+    configuration: str
+        The configuration, one of rectangle, L, U, Open, zoned
+    path_to_checkpoint: str
+        The path to the json lines checkpoint of the build
+    N_max: int
+        The largest number of boreholes on a side
+    B: float (optional)
+        The borehole spacing (m)
+    N_min: int (optional)
+        The smallest number of boreholes on a side, see
+        :func:`configuration_entries`
+    heights: list (optional)
+        The heights (m), defaults to :data:`HEIGHTS`
+    r_b: list (optional)
+        The borehole radius (m) at each height, defaults to :data:`RADII`
+    D: float (optional)
+        The burial depth (m)
+    alpha: float (optional)
+        The ground thermal diffusivity (m2/s)
+    log_time: list (optional)
+        The ln(t/ts) values, defaults to Eskilson's 27 logarithmic times
+    nSegments: int (optional)
+        The number of segments of each borehole
+    workers: int (optional)
+        The number of worker processes, defaults to the number of CPUs. A
+        single worker computes the fields in this process.
+    cache: (optional)
+        A :class:`gFunctionDatabase.Management.gfunctioncache.GFunctionCache`,
+        or True for the default cache, from which the solves that were
+        computed before are read
+    path_to_output: str (optional)
+        The path to the json library that is assembled once every field has
+        been computed
+
+    Yields
+    -------
+    progress: dict
+        After each field, its 'key' and the solve time 'seconds' (the sum over
+        its heights), the number of fields 'completed' (including the fields
+        'resumed' from the checkpoint) and 'total', the 'elapsed' time of this
+        run and the estimated time remaining 'eta' (s), and whether the build
+        is 'final'. The last progress also holds the 'output' path.
+
+    Examples
+    ---------
+    >>> import gFunctionDatabase as gfdb
+    >>> for progress in gfdb.Management.build.build_library(
+    ...         'L', 'L.jsonl', N_max=4, path_to_output='L_5m.json'):
+    ...     print(progress['key'], progress['eta'])
+    """
+    if heights is None:
+        heights = list(HEIGHTS)
+    if r_b is None:
+        r_b = list(RADII)
+    if log_time is None:
+        log_time = utilities.Eskilson_log_times()
+    if len(r_b) != len(heights):
+        raise ValueError('A borehole radius is required for each height.')
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError('The number of workers must be at least 1.')
+    cache = gfunctioncache.resolve(cache)
+
+    settings = {'configuration': configuration, 'N_max': N_max, 'B': B,
+                'N_min': N_min, 'heights': [float(H) for H in heights],
+                'r_b': [float(value) for value in r_b], 'D': float(D),
+                'alpha': float(alpha), 'log_time': list(log_time),
+                'nSegments': nSegments}
+    settings = json.loads(json.dumps(settings))
+    entries = configuration_entries(configuration, N_max, B=B, N_min=N_min)
+
+    checkpoint_settings, records = read_checkpoint(path_to_checkpoint)
+    if checkpoint_settings is not None and checkpoint_settings != settings:
+        raise ValueError('The checkpoint ' + path_to_checkpoint + ' was '
+                         'written with different settings, resume it with '
+                         'the same settings or start a new checkpoint.')
+    finished = {(record['key'], record['secondary_key'])
+                for record in records}
+    del records
+    # the largest fields first, so that no worker is left with a large field
+    # at the end of the build
+    remaining = sorted([entry for entry in entries
+                        if (entry[0], entry[1]) not in finished],
+                       key=lambda entry: -len(entry[2]))
+    total = len(entries)
+    resumed = total - len(remaining)
+    # the cost of a field is estimated by its number of boreholes
+    remaining_cost = sum(len(entry[2]) for entry in remaining)
+    g_keys = ['{}_{}_{}_{}'.format(B, H, r_b[j], D)
+              for j, H in enumerate(heights)]
+
+    file = open(path_to_checkpoint, 'a')
+    try:
+        if checkpoint_settings is None:
+            _append(file, {'settings': settings})
+
+        tic = time.perf_counter()
+        completed_cost = 0
+        completed = resumed
+
+        def record(entry, g_values, seconds):
+            nonlocal completed, completed_cost, remaining_cost
+            primary_key, secondary_key, bore_locations = entry
+            _append(file, {'key': primary_key,
+                           'secondary_key': secondary_key,
+                           'seconds': seconds,
+                           'field': {'bore_locations': bore_locations,
+                                     'g': dict(zip(g_keys, g_values)),
+                                     'logtime': list(log_time)}})
+            completed += 1
+            completed_cost += len(bore_locations)
+            remaining_cost -= len(bore_locations)
+            elapsed = time.perf_counter() - tic
+            name = primary_key if secondary_key is None else \
+                primary_key + '/' + secondary_key
+            progress = {'key': name, 'seconds': seconds,
+                        'completed': completed, 'resumed': resumed,
+                        'total': total, 'elapsed': elapsed,
+                        'eta': elapsed / completed_cost * remaining_cost,
+                        'final': completed == total}
+            return progress
+
+        def tasks(entry):
+            # the solves of each height of a field, and their descriptions
+            # in the cache
+            _tasks = application.uniform_temperature_tasks(
+                [D] * len(heights), heights, r_b, log_time, alpha,
+                entry[2], [nSegments] * len(heights))
+            if cache is None:
+                return _tasks, [None] * len(_tasks)
+            parameters = [cache.parameters(boreField, _alpha, t, 'UBWT',
+                                           options=options)
+                          for boreField, _alpha, t, options in _tasks]
+            return _tasks, parameters
+
+        def cached(parameters):
+            return None if cache is None else cache.lookup(parameters)
+
+        def store(parameters, g):
+            if cache is not None:
+                cache.store(parameters, g)
+
+        if workers == 1 or len(remaining) == 0:
+            for entry in remaining:
+                _tasks, parameters = tasks(entry)
+                g_values = []
+                seconds = 0.
+                for j, task in enumerate(_tasks):
+                    g = cached(parameters[j])
+                    if g is None:
+                        g, _seconds = solve_height(*task)
+                        seconds += _seconds
+                        store(parameters[j], g)
+                    g_values.append(g)
+                yield record(entry, g_values, seconds)
+        else:
+            yield from _build_parallel(remaining, workers, tasks, cached,
+                                       store, record)
+
+        if path_to_output is not None:
+            file.close()
+            summary = assemble_library(path_to_checkpoint, path_to_output)
+            yield {'key': None, 'seconds': 0., 'completed': completed,
+                   'resumed': resumed, 'total': total,
+                   'elapsed': time.perf_counter() - tic, 'eta': 0.,
+                   'final': True, 'output': summary['output']}
+    finally:
+        file.close()
+
+
+def _build_parallel(remaining: list, workers: int, tasks, cached, store,
+                    record):
+    # schedule the heights of the fields over a pool of worker processes,
+    # with at most two solves per worker waiting in the pool so that the
+    # pool does not hold every field of the library
+    pending = {}  # the index of each field: [g_values, seconds, missing]
+    queue = []  # the (field, height, task) solves to submit
+    for i, entry in enumerate(remaining):
+        _tasks, parameters = tasks(entry)
+        g_values = [cached(value) for value in parameters]
+        missing = [j for j in range(len(_tasks)) if g_values[j] is None]
+        pending[i] = [g_values, 0., len(missing), parameters]
+        queue.extend((i, j, _tasks[j]) for j in missing)
+    queue.reverse()
+
+    def finish(i):
+        g_values, seconds = pending.pop(i)[:2]
+        return record(remaining[i], g_values, seconds)
+
+    # the fields that were entirely cached
+    for i in [i for i in pending if pending[i][2] == 0]:
+        yield finish(i)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        try:
+            while queue or futures:
+                while queue and len(futures) < 2 * workers:
+                    i, j, task = queue.pop()
+                    futures[pool.submit(solve_height, *task)] = (i, j)
+                done, _ = concurrent.futures.wait(
+                    futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    i, j = futures.pop(future)
+                    g, seconds = future.result()
+                    state = pending[i]
+                    state[0][j] = g
+                    state[1] += seconds
+                    state[2] -= 1
+                    store(state[3][j], g)
+                    if state[2] == 0:
+                        yield finish(i)
+        finally:
+            # the solves that have not started are dropped when the build
+            # is interrupted, the finished fields are in the checkpoint
+            for future in futures:
+                future.cancel()
+
+
+def _duration(seconds: float) -> str:
+    return str(datetime.timedelta(seconds=round(seconds)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m gFunctionDatabase.Management.build',
+        description='Build a configuration library with pygfunction, '
+                    'resuming from a checkpoint.')
+    parser.add_argument('configuration', choices=CONFIGURATIONS)
+    parser.add_argument('--N-max', type=int, required=True,
+                        help='the largest number of boreholes on a side')
+    parser.add_argument('--N-min', type=int,
+                        help='the smallest number of boreholes on a side')
+    parser.add_argument('--B', type=float, default=5.,
+                        help='the borehole spacing (m)')
+    parser.add_argument('--n-segments', type=int, default=12,
+                        help='the number of segments of each borehole')
+    parser.add_argument('--checkpoint',
+                        help='path to the checkpoint of the build')
+    parser.add_argument('--output', help='path to the json library')
+    parser.add_argument('--workers', type=int,
+                        help='worker processes, defaults to the CPUs')
+    parser.add_argument('--cache', action='store_true',
+                        help='read and store the solves in the g-function '
+                             'cache')
+    args = parser.parse_args(argv)
+
+    stem = '{}_configurations_{:g}m'.format(args.configuration, args.B)
+    checkpoint = args.checkpoint or stem + '.jsonl'
+    output = args.output or stem + '.json'
+
+    try:
+        for progress in build_library(
+                args.configuration, checkpoint, args.N_max, B=args.B,
+                N_min=args.N_min, nSegments=args.n_segments,
+                workers=args.workers, cache=args.cache or None,
+                path_to_output=output):
+            if progress['key'] is None:
+                print('{} fields -> {}'.format(progress['total'],
+                                               progress['output']))
+                continue
+            print('[{}/{}] {}: {:.1f} s, elapsed {}, ETA {}'.format(
+                progress['completed'], progress['total'], progress['key'],
+                progress['seconds'], _duration(progress['elapsed']),
+                _duration(progress['eta'])), flush=True)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print('Interrupted, run again with the checkpoint {} to '
+              'resume.'.format(checkpoint), file=sys.stderr)
+        return 130
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
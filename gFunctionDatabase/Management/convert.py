@@ -0,0 +1,392 @@
+"""
+**convert.py**
+
+Convert a g-function library into another storage format, verify that the
+conversion round trips bit for bit and record the checksums of the files in
+a manifest beside the converted library.
+
+The libraries are read and written one entry at a time, so the memory used
+does not grow with the size of the library. The round trip check compares
+every key, g-function value, ln(t/ts) value and coordinate of the source and
+the converted library, split over a pool of worker processes.
+
+Usage
+------
+    python -m gFunctionDatabase.Management.convert L --target binary
+    python -m gFunctionDatabase.Management.convert L --target binary \\
+        --coefficients
+    python -m gFunctionDatabase.Management.convert --source U_lib.json \\
+        --levels 2 --target json.xz --output U_lib.json.xz
+"""
+
+import argparse
+import concurrent.futures
+import os
+import sys
+
+import numpy as np
+
+from gFunctionDatabase import General
+from . import application
+from . import data_definition
+from . import retrieval
+
+
+TARGETS = ['binary', 'sqlite', 'json', 'json.gz', 'json.xz']
+
+
+def open_source(path_to_file: str, levels: int, index: dict = None):
+    """
+    Open a json library so that it can be read one entry at a time. An
+    uncompressed library is read through a byte offset index, a compressed
+    library is decoded in its entirety.
+
+    Parameters
+    ----------
+    path_to_file: str
+        The path to the json library
+    levels: int
+        The number of json levels in the library
+    index: dict (optional)
+        The byte offset index of the library, built if it is not given
+
+    Returns
+    -------
+    library: dict
+        The library, or a mapping that behaves like the library
+    """
+    if General.fileio.json_extension(path_to_file) == 'json':
+        if index is None:
+            index = General.jsonindex.js_index(path_to_file, levels)
+        return General.jsonindex.IndexedJsonLibrary(path_to_file, index)
+    return General.fileio.js_r(path_to_file)
+
+
+def open_target(target: str, path_to_output: str, configuration: str,
+                levels: int):
+    """
+    Open a converted library for reading. The library is closed with
+    :func:`close_target`.
+    """
+    if target == 'binary':
+        return General.binaryio.bin_r(path_to_output)
+    elif target == 'sqlite':
+        return General.sqliteio.SQLiteDatabase(path_to_output).library(
+            configuration, owner=True)
+    return open_source(path_to_output, levels)
+
+
+def close_target(library) -> None:
+    """
+    Close a library opened by :func:`open_target`, i.e. the connection of a
+    sqlite library.
+    """
+    close = getattr(library, 'close', None)
+    if close is not None:
+        close()
+
+
+def write_target(library, target: str, path_to_output: str,
+                 configuration: str, path_to_file: str,
+                 coefficients: bool = False) -> None:
+    """
+    Write a library to the target storage format one entry at a time. The
+    interpolation coefficients of each field are computed and stored if
+    coefficients is True (binary target only).
+    """
+    if coefficients and target != 'binary':
+        raise ValueError('The interpolation coefficients can only be stored '
+                         'in the binary target.')
+    if target == 'binary':
+        General.binaryio.bin_dump(
+            library, path_to_output,
+            coefficients=application.field_coefficients if coefficients
+            else None, source=General.fileio.source_stamp(path_to_file))
+    elif target == 'sqlite':
+        database = General.sqliteio.SQLiteDatabase(path_to_output)
+        try:
+            database.ingest(configuration, library, path_to_file)
+        finally:
+            database.close()
+    elif target in TARGETS:
+        General.fileio.js_stream_dump(library, path_to_output)
+    else:
+        raise ValueError('The target ' + target + ' is not handled by this '
+                         'function. Please enter one of the following '
+                         'targets: ' + ', '.join(TARGETS))
+
+
+def default_output(path_to_file: str, target: str) -> str:
+    """
+    The default path of a converted library that is not registered, which
+    sits beside the source library.
+    """
+    if target == 'sqlite':
+        return os.path.join(os.path.dirname(path_to_file),
+                            'gFunctionDatabase.sqlite')
+    file_ext = General.fileio.json_extension(path_to_file)
+    stem = path_to_file[:-len(file_ext) - 1]
+    if target == 'binary':
+        return stem + '.gfdb'
+    return stem + '.' + target
+
+
+def fields_match(source: dict, converted: dict) -> bool:
+    """
+    Compare two fields bit for bit, including the order of the g-function
+    keys.
+    """
+    def bits(values):
+        return np.asarray(values, dtype='<f8').tobytes()
+
+    if list(source['g'].keys()) != list(converted['g'].keys()):
+        return False
+    for key in source['g']:
+        if bits(source['g'][key]) != bits(converted['g'][key]):
+            return False
+    return bits(source['logtime']) == bits(converted['logtime']) and \
+        bits(source['bore_locations']) == bits(converted['bore_locations'])
+
+
+def verify_keys(path_to_file: str, levels: int, index: dict, target: str,
+                path_to_output: str, configuration: str, keys: list) -> list:
+    """
+    Compare the entries of the given primary keys in the source and the
+    converted library. This is the task run by each worker process, the
+    libraries are opened in the worker rather than being pickled.
+
+    Returns
+    -------
+    mismatches: list
+        The keys (primary, or primary/secondary) that do not match
+    """
+    source = open_source(path_to_file, levels, index=index)
+    converted = open_target(target, path_to_output, configuration, levels)
+    mismatches = []
+    try:
+        for key in keys:
+            if key not in converted:
+                mismatches.append(key)
+                continue
+            source_content = source[key]
+            converted_content = converted[key]
+            if levels == 1:
+                if not fields_match(source_content, converted_content):
+                    mismatches.append(key)
+                continue
+            if list(source_content.keys()) != \
+                    list(converted_content.keys()):
+                mismatches.append(key)
+                continue
+            for secondary_key in source_content:
+                if not fields_match(source_content[secondary_key],
+                                    converted_content[secondary_key]):
+                    mismatches.append(key + '/' + secondary_key)
+    finally:
+        close_target(converted)
+    return mismatches
+
+
+def verify(path_to_file: str, levels: int, target: str, path_to_output: str,
+           configuration: str, workers: int = None) -> list:
+    """
+    Verify that a converted library matches its source bit for bit, split
+    over a pool of worker processes.
+
+    Parameters
+    ----------
+    path_to_file: str
+        The path to the source json library
+    levels: int
+        The number of json levels in the library
+    target: str
+        The storage format of the converted library
+    path_to_output: str
+        The path to the converted library
+    configuration: str
+        The configuration name (used by the sqlite target)
+    workers: int (optional)
+        The number of worker processes, defaults to the number of CPUs. A
+        compressed source is verified in this process, as each worker would
+        otherwise decode the entire library.
+
+    Returns
+    -------
+    mismatches: list
+        The keys that do not match, empty if the conversion round trips.
+    """
+    index = None
+    if General.fileio.json_extension(path_to_file) == 'json':
+        index = General.jsonindex.js_index(path_to_file, levels)
+        keys = list(index['entries'].keys())
+    else:
+        keys = list(General.fileio.js_r(path_to_file).keys())
+        workers = 1
+
+    converted = open_target(target, path_to_output, configuration, levels)
+    mismatches = []
+    try:
+        if list(converted.keys()) != keys:
+            mismatches.append('<keys>')
+    finally:
+        close_target(converted)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        return mismatches + verify_keys(path_to_file, levels, index, target,
+                                        path_to_output, configuration, keys)
+
+    n_chunks = min(len(keys), 4 * workers)
+    chunks = [keys[i::n_chunks] for i in range(n_chunks)]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(verify_keys, path_to_file, levels, index,
+                               target, path_to_output, configuration, chunk)
+                   for chunk in chunks]
+        for future in futures:
+            mismatches += future.result()
+    return mismatches
+
+
+def convert(configuration: str = None, target: str = 'binary',
+            path_to_output: str = None, source: str = None,
+            levels: int = None, check: bool = True,
+            workers: int = None, coefficients: bool = False) -> dict:
+    """
+    Convert a library to another storage format.
+
+    Parameters
+    ----------
+    configuration: str (optional)
+        A registered configuration, i.e. L, U, rectangle
+    target: str
+        The storage format: binary, sqlite, json, json.gz or json.xz
+    path_to_output: str (optional)
+        The path to the converted library. For a registered configuration,
+        the binary and sqlite targets default to the paths they are read from
+        by :class:`gFunctionDatabase.Management.retrieval.Retrieve` (in its
+        cache directory). Otherwise, the library is written beside the source
+        (see :func:`default_output`).
+    source: str (optional)
+        The path to a json library that is not registered, such as a library
+        created from cpgfunction output. Either configuration or source must
+        be given.
+    levels: int (optional)
+        The number of json levels of the source library, required if the
+        source is not a registered configuration.
+    check: bool (optional)
+        Verify that the conversion round trips bit for bit
+    workers: int (optional)
+        The number of worker processes used for the verification
+    coefficients: bool (optional)
+        Store the interpolation coefficients of each field (binary target
+        only), so that the interpolants are not fit when a field is used, see
+        :func:`gFunctionDatabase.Management.application.field_coefficients`
+
+    Returns
+    -------
+    report: dict
+        The configuration, source, output, target and the keys that do not
+        round trip (if check is True).
+
+    Raises
+    -------
+    ValueError
+        If the converted library does not match the source
+    """
+    if configuration is not None:
+        base_retrieval = retrieval.BaseRetrieval()
+        path_to_file = base_retrieval.registry[configuration]
+        levels = base_retrieval.levels[configuration]
+        library = base_retrieval.stream_data(configuration)
+        if path_to_output is None and target == 'binary':
+            path_to_output = base_retrieval.binary_path(configuration)
+        elif path_to_output is None and target == 'sqlite':
+            path_to_output = base_retrieval.database_path()
+    elif source is not None:
+        if levels is None:
+            raise ValueError('The number of levels is required for a source '
+                             'that is not registered.')
+        path_to_file = source
+        configuration = os.path.basename(source).split('_')[0]
+        library = open_source(path_to_file, levels)
+    else:
+        raise ValueError('A configuration or a source must be given.')
+
+    if path_to_output is None:
+        path_to_output = default_output(path_to_file, target)
+    if os.path.abspath(path_to_output) == os.path.abspath(path_to_file):
+        raise ValueError('The output path is the source library.')
+    os.makedirs(os.path.dirname(os.path.abspath(path_to_output)),
+                exist_ok=True)
+
+    write_target(library, target, path_to_output, configuration, path_to_file,
+                 coefficients=coefficients)
+
+    report = {'configuration': configuration, 'source': path_to_file,
+              'output': path_to_output, 'target': target}
+    if check:
+        mismatches = verify(path_to_file, levels, target, path_to_output,
+                            configuration, workers=workers)
+        report['mismatches'] = mismatches
+        if len(mismatches) > 0:
+            raise ValueError('The converted library does not match the '
+                             'source at the keys: ' +
+                             ', '.join(mismatches[:10]))
+
+    # the manifest sits beside the converted library, so that the data
+    # directory is not written to
+    data_definition.update_manifest(
+        [path_to_file, path_to_output],
+        path_to_folder=os.path.dirname(os.path.abspath(path_to_output)))
+    # the output can be a library in the data directory
+    data_definition.clear_registry()
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m gFunctionDatabase.Management.convert',
+        description='Convert a g-function library into another storage '
+                    'format, verify the round trip and record checksums.')
+    parser.add_argument('configuration', nargs='?',
+                        help='a registered configuration, i.e. L, U, '
+                             'rectangle')
+    parser.add_argument('--source', help='path to a json library that is not '
+                                         'registered')
+    parser.add_argument('--levels', type=int, choices=[1, 2],
+                        help='the number of json levels of the source')
+    parser.add_argument('--target', choices=TARGETS, default='binary')
+    parser.add_argument('--output', help='path to the converted library')
+    parser.add_argument('--workers', type=int,
+                        help='worker processes for the round trip check')
+    parser.add_argument('--no-check', action='store_true',
+                        help='skip the round trip check')
+    parser.add_argument('--coefficients', action='store_true',
+                        help='store the interpolation coefficients of each '
+                             'field (binary target only)')
+    args = parser.parse_args(argv)
+
+    if (args.configuration is None) == (args.source is None):
+        parser.error('give either a configuration or --source')
+
+    try:
+        report = convert(configuration=args.configuration,
+                         target=args.target, path_to_output=args.output,
+                         source=args.source, levels=args.levels,
+                         check=not args.no_check, workers=args.workers,
+                         coefficients=args.coefficients)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+
+    print('{} ({}) -> {}'.format(report['configuration'], report['source'],
+                                 report['output']))
+    if 'mismatches' in report:
+        print('Round trip verified bit for bit.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,21 @@
 from gFunctionDatabase import Data
+from gFunctionDatabase import General
 
 from natsort.natsort import natsorted
 
+import json
+import os
+import threading
+
+
+# The name of the checksum manifest written beside converted libraries
+MANIFEST = 'checksums.manifest'
+
+# The registry listed by the first BaseDefinition of the process, see
+# cached_registry
+_registry = None
+_registry_lock = threading.Lock()
+
 
 class BaseDefinition(Data.available.Configuration):
     """
@@ -10,20 +24,35 @@ class BaseDefinition(Data.available.Configuration):
     """
     def __init__(self):
         super().__init__()
-        self.registry = self.register_database()
+        # a copy, so an instance can override its registry
+        self.registry = dict(cached_registry())
 
     @staticmethod
-    def register_database():
+    def register_database(verify=False, manifest_folder=None):
         """
         This registers the available databases into the database instance of
         this object.
 
+        Parameters
+        ----------
+        verify : bool (optional)
+            If True, each registered data file is checked against the
+            checksum manifest of its folder (see :func:`verify_manifest`).
+        manifest_folder : str (optional)
+            The folder of the checksum manifest the data files are checked
+            against, by default the folder of each data file. The manifest
+            written by :func:`gFunctionDatabase.Management.convert.convert`
+            sits beside the converted library, i.e. in the derived directory
+            of the retrieval cache (``BaseRetrieval().derived_directory()``).
+
         Returns
         -------
         registry : dict
             A dictionary with the keys being L, LopU, Open, U, rectangle and
             zoned. The values for each dictionary is the full file path to the
-            configuration json.
+            configuration json. If a configuration is available both
+            uncompressed and compressed, the uncompressed file is registered,
+            as it is the fastest to decode.
         """
         registry = {}
 
@@ -34,8 +63,147 @@ class BaseDefinition(Data.available.Configuration):
 
         data_file_keys = [f.split('_')[0] for f in available_data_files_sorted]
 
+        file_exts = list(General.fileio.JSON_OPENERS.keys())
+
+        def preference(file_name):
+            return file_exts.index(General.fileio.json_extension(file_name))
+
         for i in range(len(data_file_keys)):
-            registry[data_file_keys[i]] = \
-                path_to_database + available_data_files_sorted[i]
+            key = data_file_keys[i]
+            file_name = available_data_files_sorted[i]
+            if key in registry and preference(registry[key]) <= \
+                    preference(file_name):
+                continue
+            registry[key] = path_to_database + file_name
+
+        if verify:
+            for key in registry:
+                verify_manifest(registry[key], path_to_folder=manifest_folder)
 
         return registry
+
+
+def cached_registry() -> dict:
+    """
+    The registry of :func:`BaseDefinition.register_database`, which lists the
+    data directory on the first call of the process only. The returned
+    dictionary is shared and should not be modified. Call
+    :func:`clear_registry` after data files are added or removed.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = BaseDefinition.register_database()
+        return _registry
+
+
+def clear_registry() -> None:
+    """
+    Forget the cached registry, so the data directory is listed again.
+    """
+    global _registry
+    with _registry_lock:
+        _registry = None
+
+
+def read_manifest(path_to_folder: str) -> dict:
+    """
+    Read the checksum manifest of a folder.
+
+    Returns
+    -------
+    manifest: dict
+        The sha256, size and modification time of each file keyed by file
+        name, or an empty dictionary if the folder has no manifest.
+    """
+    path_to_manifest = os.path.join(path_to_folder, MANIFEST)
+    if not os.path.isfile(path_to_manifest):
+        return {}
+    with open(path_to_manifest) as f_in:
+        return json.load(f_in)
+
+
+def manifest_key(path: str, path_to_folder: str) -> str:
+    """
+    The key of a file in the manifest of a folder: its file name if it is in
+    the folder, otherwise its absolute path.
+    """
+    path = os.path.abspath(path)
+    if os.path.dirname(path) == os.path.abspath(path_to_folder):
+        return os.path.basename(path)
+    return path
+
+
+def update_manifest(paths: list, path_to_folder: str = None) -> None:
+    """
+    Record the checksum of files in the manifest of the folder each file is
+    in, or in the manifest of the given folder.
+
+    Parameters
+    ----------
+    paths: list
+        The paths to the files
+    path_to_folder: str (optional)
+        The folder of the manifest, so that the checksum of a file in a
+        folder that should not be written to (i.e. the installed data
+        directory) can be recorded elsewhere.
+    """
+    folders = {}
+    for path in paths:
+        folder = path_to_folder
+        if folder is None:
+            folder = os.path.dirname(os.path.abspath(path))
+        folders.setdefault(os.path.abspath(folder), []).append(path)
+    for folder in folders:
+        manifest = read_manifest(folder)
+        for path in folders[folder]:
+            stat = os.stat(path)
+            manifest[manifest_key(path, folder)] = {
+                'sha256': General.fileio.file_sha256(path),
+                'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        path_to_manifest = os.path.join(folder, MANIFEST)
+        with open(path_to_manifest + '.tmp', 'w') as fp:
+            json.dump(manifest, fp, indent=1, sort_keys=True)
+        os.replace(path_to_manifest + '.tmp', path_to_manifest)
+
+
+def verify_manifest(path: str, path_to_folder: str = None) -> bool:
+    """
+    Verify a file against the checksum manifest of its folder, or of the
+    given folder. The size of the file is always compared, and the checksum
+    is only recomputed if the modification time differs from the one
+    recorded, so verifying unmodified files at startup only requires a stat.
+
+    Parameters
+    ----------
+    path: str
+        The path to the file
+    path_to_folder: str (optional)
+        The folder of the manifest, defaults to the folder of the file
+
+    Returns
+    -------
+    bool
+        True if the file was verified, False if it is not in a manifest.
+
+    Raises
+    -------
+    ValueError
+        If the file does not match the manifest
+    """
+    if path_to_folder is None:
+        path_to_folder = os.path.dirname(os.path.abspath(path))
+    manifest = read_manifest(path_to_folder)
+    key = manifest_key(path, path_to_folder)
+    if key not in manifest:
+        return False
+    entry = manifest[key]
+    stat = os.stat(path)
+    if stat.st_size != entry['size']:
+        raise ValueError('The size of ' + path + ' does not match the '
+                         'checksum manifest.')
+    if stat.st_mtime_ns != entry['mtime_ns'] and \
+            General.fileio.file_sha256(path) != entry['sha256']:
+        raise ValueError('The checksum of ' + path + ' does not match the '
+                         'checksum manifest.')
+    return True
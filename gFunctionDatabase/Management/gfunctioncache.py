@@ -0,0 +1,365 @@
+"""
+**gfunctioncache.py**
+
+A content addressed on-disk cache of the g-functions computed with
+pygfunction, so that repeated analyses reuse solves that take minutes.
+
+Each solve is keyed on the SHA-256 hash of a canonical description of its
+inputs: the borehole coordinates, H, D, r_b, tilt and orientation of every
+borehole, alpha, the boundary condition, the method, the options that affect
+the result (i.e. nSegments) and the time vector. The version of pygfunction is
+part of the key, so an upgrade does not serve stale curves. The curves are
+stored as one json file per solve in the cache directory. When the files
+exceed the byte budget, the least recently used files are removed.
+
+The directory defaults to the GFDB_CACHE_DIR environment variable, or to
+gFunctionDatabase/gfunctions in the user cache directory (XDG_CACHE_HOME or
+~/.cache). Writes are atomic, so a cache directory can be shared by several
+processes.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pygfunction as gt
+
+try:
+    from importlib import metadata as _metadata
+    PYGFUNCTION_VERSION = _metadata.version('pygfunction')
+except Exception:  # pragma: no cover
+    PYGFUNCTION_VERSION = 'unknown'
+
+# The version of the cache file layout
+CACHE_VERSION = 1
+
+# The options that only change the output of pygfunction, not the g-function
+_DISPLAY_OPTIONS = ('disp', 'profiles')
+
+
+def default_directory() -> str:
+    """
+    The default cache directory.
+    """
+    directory = os.environ.get('GFDB_CACHE_DIR')
+    if directory:
+        return directory
+    root = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'gFunctionDatabase', 'gfunctions')
+
+
+def _canonical_float(value) -> float:
+    # -0.0 and 0.0 describe the same input
+    return float(value) + 0.
+
+
+def _canonical_value(value):
+    # json compatible option values
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def solve_parameters(boreholes: list, alpha: float, time,
+                     boundary_condition: str, method: str = None,
+                     options: dict = None) -> dict:
+    """
+    The canonical description of a g-function solve.
+
+    Parameters
+    ----------
+    boreholes: list
+        The boreholes of the field, pygfunction Borehole objects
+    alpha: float
+        The ground thermal diffusivity (m2/s)
+    time: array_like
+        The times of the g-function (s)
+    boundary_condition: str
+        The boundary condition, i.e. UBWT, UHTR
+    method: str (optional)
+        The pygfunction method, defaults to the method of the installed
+        pygfunction
+    options: dict (optional)
+        The pygfunction options
+
+    Returns
+    -------
+    parameters: dict
+        The inputs of the solve as json compatible values
+    """
+    if options is None:
+        options = {}
+    fields = []
+    for borehole in boreholes:
+        if not isinstance(borehole, gt.boreholes.Borehole):
+            raise ValueError('The boreholes must be pygfunction Borehole '
+                             'objects.')
+        fields.append([_canonical_float(value) for value in
+                       (borehole.x, borehole.y, borehole.H, borehole.D,
+                        borehole.r_b, borehole.tilt, borehole.orientation)])
+    options = {key: value for key, value in options.items()
+               if key not in _DISPLAY_OPTIONS}
+    return {'cache_version': CACHE_VERSION,
+            'pygfunction': PYGFUNCTION_VERSION,
+            'boreholes': fields,
+            'alpha': _canonical_float(alpha),
+            'boundary_condition': str(boundary_condition).upper(),
+            'method': method,
+            'options': json.loads(json.dumps(options, sort_keys=True,
+                                             default=_canonical_value)),
+            'time': [_canonical_float(t)
+                     for t in np.atleast_1d(np.asarray(time, dtype=float))]}
+
+
+def parameters_key(parameters: dict) -> str:
+    """
+    The SHA-256 hash of the canonical description of a solve.
+    """
+    text = json.dumps(parameters, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def solve_key(*args, **kwargs) -> str:
+    """
+    The key of a solve, the arguments are those of :func:`solve_parameters`.
+    """
+    return parameters_key(solve_parameters(*args, **kwargs))
+
+
+class GFunctionCache:
+    """
+    An on-disk cache of computed g-functions.
+
+    Parameters
+    ----------
+    directory : str (optional)
+        The cache directory, see :func:`default_directory`. It is created
+        when the first g-function is stored.
+    max_bytes : int (optional)
+        The byte budget of the files in the cache directory. A g-function
+        larger than the budget is returned but not stored.
+    """
+    def __init__(self, directory: str = None,
+                 max_bytes: int = 256 * 1024 ** 2):
+        if directory is None:
+            directory = default_directory()
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def path(self, key: str) -> str:
+        """
+        The path of the file of a key.
+        """
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key: str):
+        """
+        Return the g-function of a key, or None if it is not cached.
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'r') as file:
+                g = json.load(file)['g']
+            # mark the file as recently used
+            os.utime(path)
+        except (OSError, ValueError, KeyError, TypeError):
+            # a missing, partially removed or unreadable file is a miss
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return g
+
+    def put(self, key: str, g, parameters: dict = None) -> None:
+        """
+        Store the g-function of a key, and evict the least recently used
+        files if the cache exceeds its budget.
+
+        Parameters
+        ----------
+        key : str
+            The key of the solve, see :func:`parameters_key`
+        g : array_like
+            The g-function values
+        parameters : dict (optional)
+            The description of the solve, stored with the values
+        """
+        content = {'key': key, 'parameters': parameters,
+                   'g': np.asarray(g, dtype=float).tolist()}
+        text = json.dumps(content)
+        if len(text) > self.max_bytes:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # write to a temporary file and move it, so that a reader never sees
+        # a partial file
+        descriptor, temporary = tempfile.mkstemp(
+            dir=self.directory, prefix='.' + key, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'w') as file:
+                file.write(text)
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        self._evict()
+
+    def files(self) -> list:
+        """
+        List the cached files as (last use, bytes, path) tuples, from least to
+        most recently used.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        files.sort()
+        return files
+
+    def _evict(self) -> None:
+        files = self.files()
+        size = sum(file[1] for file in files)
+        for _, file_size, path in files:
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # removed by another process
+                pass
+            else:
+                with self._lock:
+                    self.evictions += 1
+            size -= file_size
+
+    def resize(self, max_bytes: int) -> None:
+        """
+        Change the byte budget, evicting files if necessary.
+        """
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def clear(self) -> None:
+        """
+        Remove every file from the cache and reset the statistics.
+        """
+        for _, _, path in self.files():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def statistics(self) -> dict:
+        """
+        Returns
+        -------
+        statistics : dict
+            The hits, misses and evictions of this process, and the number of
+            files and bytes in the cache directory.
+        """
+        files = self.files()
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'files': len(files),
+                    'resident_bytes': sum(file[1] for file in files),
+                    'max_bytes': self.max_bytes,
+                    'directory': self.directory}
+
+    def parameters(self, boreholes: list, alpha: float, time,
+                   boundary_condition: str, method: str = None,
+                   options: dict = None) -> dict:
+        """
+        The description of a solve that the cache is keyed on, see
+        :func:`solve_parameters`.
+        """
+        return solve_parameters(boreholes, alpha, time, boundary_condition,
+                                method=method, options=options)
+
+    def lookup(self, parameters: dict):
+        """
+        Return the g-function of a solve described by :meth:`parameters`, or
+        None if it is not cached.
+        """
+        return self.get(parameters_key(parameters))
+
+    def store(self, parameters: dict, g) -> None:
+        """
+        Store the g-function of a solve described by :meth:`parameters`.
+        """
+        self.put(parameters_key(parameters), g, parameters=parameters)
+
+    def g_function(self, boreholes: list, alpha: float, time,
+                   boundary_condition: str = 'UBWT', method: str = None,
+                   options: dict = None) -> np.ndarray:
+        """
+        Compute the g-function of a field with pygfunction, or return it from
+        the cache.
+
+        Only fields of boreholes are cached, the MIFT boundary condition
+        requires a network and is computed with pygfunction directly.
+
+        Parameters
+        ----------
+        boreholes, alpha, time, boundary_condition, method, options:
+            The inputs of pygfunction.gfunction.gFunction, see
+            :func:`solve_parameters`
+
+        Returns
+        -------
+        g: numpy.ndarray
+            The g-function values at the times
+        """
+        parameters = self.parameters(boreholes, alpha, time,
+                                     boundary_condition, method=method,
+                                     options=options)
+        g = self.lookup(parameters)
+        if g is not None:
+            return np.array(g, dtype=float)
+
+        kwargs = {} if method is None else {'method': method}
+        g = gt.gfunction.gFunction(
+            boreholes, alpha, time=np.asarray(time, dtype=float),
+            boundary_condition=boundary_condition,
+            options={} if options is None else options, **kwargs).gFunc
+        self.store(parameters, g)
+        return np.asarray(g, dtype=float)
+
+
+# The g-function cache of the process, in the default directory
+gfunction_cache = GFunctionCache()
+
+
+def resolve(cache):
+    """
+    Resolve the cache argument of a compute function: None or False disables
+    caching, True uses :data:`gfunction_cache`.
+    """
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return gfunction_cache
+    if not isinstance(cache, GFunctionCache):
+        raise ValueError('The cache must be a GFunctionCache, True or None.')
+    return cache
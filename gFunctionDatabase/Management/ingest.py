@@ -0,0 +1,361 @@
+"""
+**ingest.py**
+
+Ingest a folder of cpgfunction output files (one json file per field) into a
+configuration library.
+
+The key of each field is read from its file name, i.e. ZRect_4_x_8_1_x_3 is
+the zoned rectangle 4_8 with the interior 1_3. A file whose name does not
+follow the cpgfunction naming is keyed by feature recognition of its
+borehole locations (see :mod:`gFunctionDatabase.featurerecognition`).
+
+The files are parsed in a pool of worker processes and streamed into the
+library writer in the order of their keys, with a bounded number of files in
+flight, so the memory used does not grow with the number of files. A report
+with one row per file (the key, the number of boreholes, the heights and
+whether the recognized features match the key) is written as a csv file with
+the standard library.
+
+Usage
+------
+    python -m gFunctionDatabase.Management.ingest \\
+        Partial_Libraries/Zoned_Rectangle_Output_Partial zoned \\
+        --output zoned_configurations_5m.json --report zoned_report.csv
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import os
+import re
+import sys
+import types
+
+import natsort
+
+from gFunctionDatabase import General
+from gFunctionDatabase import featurerecognition
+
+
+# The cpgfunction file name patterns of each configuration
+FILE_NAME_PATTERNS = {
+    'zoned': re.compile(r'^ZRect_(\d+)_x_(\d+)_(\d+)_x_(\d+)$'),
+    'U': re.compile(r'^U_(\d+)_x_(\d+)_(\d+)$'),
+    'Open': re.compile(r'^ORect_(\d+)_x_(\d+)_(\d+)$'),
+    'rectangle': re.compile(r'^(?:Rect_(\d+)_x_(\d+)|Line_(\d+))$'),
+    'L': re.compile(r'^L_(\d+)_x_(\d+)$')}
+
+CONFIGURATIONS = list(FILE_NAME_PATTERNS.keys())
+
+# The columns of the report
+REPORT_COLUMNS = ['file_path', 'key', 'secondary_key', 'recognized_by',
+                  'nbh', 'Nx', 'Ny', 'heights', 'n_times', 'consistent']
+
+
+def _file_stem(path_to_file: str) -> str:
+    name = os.path.basename(path_to_file)
+    file_ext = General.fileio.json_extension(name)
+    if file_ext is not None:
+        name = name[:-len(file_ext) - 1]
+    return name
+
+
+def key_from_file_name(path_to_file: str, configuration: str):
+    """
+    Read the library key of a field from its cpgfunction file name.
+
+    Returns
+    -------
+    (primary_key, secondary_key): tuple or None
+        The keys, the secondary key is None for the configurations with one
+        level (the rectangles and L's are keyed N_M with N <= M). None if the
+        file name does not follow the naming of the configuration.
+    """
+    if configuration not in FILE_NAME_PATTERNS:
+        raise ValueError('The configuration ' + str(configuration) + ' can '
+                         'not be ingested. Please enter one of the following '
+                         'configurations: ' + ', '.join(CONFIGURATIONS))
+    match = FILE_NAME_PATTERNS[configuration].match(
+        _file_stem(path_to_file))
+    if match is None:
+        return None
+    values = [int(value) for value in match.groups() if value is not None]
+    if configuration == 'zoned':
+        return '{}_{}'.format(*values[:2]), '{}_{}'.format(*values[2:])
+    if configuration in ['U', 'Open']:
+        return '{}_{}'.format(*values[:2]), str(values[2])
+    if len(values) == 1:
+        # a line of boreholes
+        values = [1] + values
+    return '{}_{}'.format(*sorted(values)), None
+
+
+def key_from_features(field: dict, configuration: str) -> tuple:
+    """
+    Key a field by feature recognition of its borehole locations, for the
+    files that do not follow the cpgfunction naming.
+
+    Returns
+    -------
+    (primary_key, secondary_key): tuple
+        The keys, see :func:`key_from_file_name`
+    """
+    if configuration in ['U', 'Open']:
+        features = featurerecognition.recognize_features(
+            types.SimpleNamespace(bore_locations=field['bore_locations']),
+            configuration)
+        return '{}_{}'.format(features['Nx'], features['Ny']), \
+            str(features['nested'])
+    x, y = list(zip(*field['bore_locations']))
+    features = featurerecognition.FeatureRecognition(list(x), list(y))
+    if configuration == 'zoned':
+        interior_x, interior_y = list(zip(*features.interior))
+        return '{}_{}'.format(features.nx, features.ny), \
+            '{}_{}'.format(len(set(interior_x)), len(set(interior_y)))
+    return '{}_{}'.format(*sorted([features.nx, features.ny])), None
+
+
+def _report_row(path_to_file: str, field: dict, primary_key: str,
+                secondary_key: str, recognized_by: str) -> dict:
+    # the report row of a field, the borehole counts along x and y found by
+    # feature recognition are compared to the key
+    x, y = list(zip(*field['bore_locations']))
+    features = featurerecognition.FeatureRecognition(list(x), list(y))
+    N, M = [int(value) for value in primary_key.split('_')]
+    heights = sorted({General.fileio.split_g_key(key)[1]
+                      for key in field['g']})
+    return {'file_path': path_to_file, 'key': primary_key,
+            'secondary_key': secondary_key, 'recognized_by': recognized_by,
+            'nbh': len(field['bore_locations']), 'Nx': features.nx,
+            'Ny': features.ny,
+            'heights': ' '.join('{:g}'.format(H) for H in heights),
+            'n_times': len(field['logtime']),
+            'consistent': sorted([features.nx, features.ny]) ==
+            sorted([N, M])}
+
+
+def recognize_file(path_to_file: str, configuration: str) -> tuple:
+    """
+    Key a file by feature recognition, the task run by each worker process
+    for the files whose name does not follow the cpgfunction naming.
+    """
+    field = General.fileio.js_r(path_to_file)
+    return key_from_features(field, configuration)
+
+
+def load_file(path_to_file: str, primary_key: str, secondary_key: str,
+              recognized_by: str) -> tuple:
+    """
+    Read a cpgfunction output file, the task run by each worker process.
+
+    Returns
+    -------
+    (field, row): tuple
+        The field, with the bore_locations, g and logtime of the library
+        format, and its report row
+    """
+    data = General.fileio.js_r(path_to_file)
+    field = {'bore_locations': data['bore_locations'], 'g': data['g'],
+             'logtime': data['logtime']}
+    return field, _report_row(path_to_file, field, primary_key,
+                              secondary_key, recognized_by)
+
+
+def _ordered_map(pool, function, arguments: list, window: int):
+    # map the function over the arguments in order, with at most window
+    # tasks in flight
+    futures = []
+    arguments = iter(arguments)
+    try:
+        for argument in arguments:
+            futures.append(pool.submit(function, *argument))
+            if len(futures) >= window:
+                yield futures.pop(0).result()
+        while futures:
+            yield futures.pop(0).result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+class _SerialPool:
+    # runs the tasks in this process, with the interface of an executor
+    def submit(self, function, *args):
+        future = concurrent.futures.Future()
+        future.set_result(function(*args))
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _StreamedLibrary:
+    # a mapping that hands the fields to js_stream_dump in the order of the
+    # keys, one primary key at a time, as they are read by the pool
+
+    def __init__(self, entries: list, results, rows: list):
+        self.primary_keys = []
+        for primary_key, _, _, _ in entries:
+            if not self.primary_keys or self.primary_keys[-1] != primary_key:
+                self.primary_keys.append(primary_key)
+        self.entries = iter(entries)
+        self.results = results
+        self.rows = rows
+        self.pending = None
+
+    def __iter__(self):
+        return iter(self.primary_keys)
+
+    def __getitem__(self, primary_key):
+        content = {}
+        while True:
+            if self.pending is None:
+                entry = next(self.entries, None)
+                if entry is None:
+                    break
+                self.pending = (entry, next(self.results))
+            (key, secondary_key, _, _), (field, row) = self.pending
+            if key != primary_key:
+                break
+            self.pending = None
+            self.rows.append(row)
+            if secondary_key is None:
+                return field
+            content[secondary_key] = field
+        return content
+
+
+def ingest_folder(path_to_folder: str, configuration: str,
+                  path_to_output: str, path_to_report: str = None,
+                  workers: int = None) -> dict:
+    """
+    Ingest the cpgfunction output files of a folder into a json library.
+
+    Parameters
+    ----------
+    path_to_folder: str
+        The folder of cpgfunction output files (.json, .json.gz or .json.xz)
+    configuration: str
+        The configuration, one of zoned, U, Open, rectangle, L
+    path_to_output: str
+        The path to the json library, compressed if it ends in .json.gz or
+        .json.xz
+    path_to_report: str (optional)
+        The path to the csv report
+    workers: int (optional)
+        The number of worker processes, defaults to the number of CPUs. A
+        single worker reads the files in this process.
+
+    Returns
+    -------
+    report: dict
+        The report rows ('rows', a list of dictionaries with the
+        :data:`REPORT_COLUMNS`), the number of 'fields' and the keys of the
+        fields whose features do not match their key ('inconsistent')
+    """
+    if configuration not in FILE_NAME_PATTERNS:
+        raise ValueError('The configuration ' + str(configuration) + ' can '
+                         'not be ingested. Please enter one of the following '
+                         'configurations: ' + ', '.join(CONFIGURATIONS))
+    files = [os.path.join(path_to_folder, name) for name in
+             natsort.natsorted(os.listdir(path_to_folder))
+             if General.fileio.json_extension(name) is not None]
+    if len(files) == 0:
+        raise ValueError('There are no json files in ' + path_to_folder)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError('The number of workers must be at least 1.')
+    window = 2 * workers
+
+    if workers == 1:
+        pool = _SerialPool()
+    else:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    with pool:
+        keys = [key_from_file_name(path_to_file, configuration)
+                for path_to_file in files]
+        unnamed = [i for i in range(len(files)) if keys[i] is None]
+        # the files without a cpgfunction name are read to be keyed
+        recognized = _ordered_map(
+            pool, recognize_file,
+            [(files[i], configuration) for i in unnamed], window)
+        for i, key in zip(unnamed, recognized):
+            keys[i] = key
+
+        entries = []
+        owners = {}
+        for i, (primary_key, secondary_key) in enumerate(keys):
+            if (primary_key, secondary_key) in owners:
+                raise ValueError(
+                    'The files ' + owners[(primary_key, secondary_key)] +
+                    ' and ' + files[i] + ' have the same key.')
+            owners[(primary_key, secondary_key)] = files[i]
+            entries.append((primary_key, secondary_key, files[i],
+                            'features' if i in unnamed else 'file name'))
+        entries = natsort.natsorted(
+            entries, key=lambda entry: (entry[0], entry[1] or ''))
+
+        rows = []
+        results = _ordered_map(
+            pool, load_file,
+            [(path_to_file, primary_key, secondary_key, recognized_by)
+             for primary_key, secondary_key, path_to_file, recognized_by
+             in entries], window)
+        General.fileio.js_stream_dump(
+            _StreamedLibrary(entries, results, rows), path_to_output)
+
+    if path_to_report is not None:
+        write_report(rows, path_to_report)
+    inconsistent = [row['key'] if row['secondary_key'] is None else
+                    row['key'] + '/' + row['secondary_key']
+                    for row in rows if not row['consistent']]
+    return {'rows': rows, 'fields': len(rows), 'inconsistent': inconsistent,
+            'output': path_to_output}
+
+
+def write_report(rows: list, path_to_report: str) -> None:
+    """
+    Write the report rows to a csv file.
+    """
+    with open(path_to_report, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=REPORT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m gFunctionDatabase.Management.ingest',
+        description='Ingest a folder of cpgfunction output files into a '
+                    'configuration library.')
+    parser.add_argument('folder', help='the folder of cpgfunction outputs')
+    parser.add_argument('configuration', choices=CONFIGURATIONS)
+    parser.add_argument('--output', help='path to the json library')
+    parser.add_argument('--report', help='path to the csv report')
+    parser.add_argument('--workers', type=int,
+                        help='worker processes, defaults to the CPUs')
+    args = parser.parse_args(argv)
+
+    output = args.output or \
+        '{}_configurations_5m.json'.format(args.configuration)
+    try:
+        report = ingest_folder(args.folder, args.configuration, output,
+                               path_to_report=args.report,
+                               workers=args.workers)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+
+    print('{} fields -> {}'.format(report['fields'], report['output']))
+    for key in report['inconsistent']:
+        print('The features of {} do not match its key.'.format(key),
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
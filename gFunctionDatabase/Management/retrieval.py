@@ -1,18 +1,68 @@
 from gFunctionDatabase import General
+from gFunctionDatabase import Data
 from . import data_definition
 import natsort
 
+from collections import OrderedDict
+import hashlib
 import logging
+import os
+import sys
+import threading
+import types
+
+import numpy as np
+
+
+def default_cache_directory() -> str:
+    """
+    The default directory of the files derived from the json libraries (the
+    binary libraries, the byte offset indices and the SQLite database).
+    """
+    directory = os.environ.get('GFDB_LIBRARY_CACHE_DIR')
+    if directory:
+        return directory
+    root = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'gFunctionDatabase', 'libraries')
+
+
+def holds_transposes(keys) -> bool:
+    """
+    Whether the N_M keys of a library include fields with N > M. The
+    cpgfunction libraries are keyed with N <= M, as a field and its transpose
+    are the same field. A U built by :mod:`gFunctionDatabase.Management.build`
+    is keyed by orientation instead, N boreholes along its base and M along
+    its sides, and holds both orientations.
+    """
+    for key in keys:
+        N, M = key.split('_')
+        if int(N) > int(M):
+            return True
+    return False
 
 
 class BaseRetrieval(data_definition.BaseDefinition):
     """
     Base object for retrieving data from the database.
+
+    Parameters
+    ----------
+    cache_directory : str (optional)
+        The directory the files derived from the json libraries are written
+        to, defaults to the GFDB_LIBRARY_CACHE_DIR environment variable, or
+        to gFunctionDatabase/libraries in the user cache directory
+        (XDG_CACHE_HOME or ~/.cache). The installed data directory is never
+        written to, as it can be read only.
     """
-    def __init__(self):
+    def __init__(self, cache_directory=None):
         super().__init__()
+        if cache_directory is None:
+            cache_directory = default_cache_directory()
+        self.cache_directory = cache_directory
 
-    def load_data(self, configuration):
+    def load_data(self, configuration, storage='json', cache=False,
+                  arrays=False):
         """
         This function takes in a configuration string argument, loads the
         specified database configuration file into memory and returns the entire
@@ -23,21 +73,53 @@ class BaseRetrieval(data_definition.BaseDefinition):
         There is no way to inject into a json file. When a library is opened,
         the entirety of the library is loaded into memory. For this reason, it
         is good practice to limit the number of database configuration files
-        open at one time.
+        open at one time. The binary storage does not have this limitation,
+        only the header of the library is read when it is opened.
 
         Parameters
         ----------
         configuration : str
             A string defining the database configuration to be loaded.
             Options include: C, L, LopU, Open, U, rectangle, zoned
+        storage : str (optional)
+            The storage format to read the configuration from.
+            Options include: json, binary, lazy, sqlite. The binary library
+            is built from the json library in the cache directory the first
+            time it is requested, and rebuilt unless the size and
+            modification time of the json library match the ones it was
+            built from. The lazy storage reads the json library through a
+            byte offset index, and the sqlite storage reads the configuration
+            from a SQLite database (both built and checked the same way).
+            Both only decode the entries that are accessed.
+        cache : bool (optional)
+            If True, the library is served from the process wide
+            :data:`library_cache`, so that repeated loads of a configuration
+            do not read the data file again. The cached library is shared: a
+            json library is returned as a read only mapping, and its entries
+            must not be modified.
+        arrays : bool (optional)
+            If True, each field is returned in the array format of
+            :func:`gFunctionDatabase.General.fileio.field_arrays`: the
+            g-functions as one float64 array of shape (n_heights, n_times)
+            sorted by height, the coordinates as an (nbh, 2) array and the
+            heights, radii and burial depths as parallel arrays. The json
+            storage converts each field as it is decoded, and the binary
+            storage returns views of the memory map.
 
         Returns
         -------
         database : dict
-            The contents of a database file is returned as a dictionary.
+            The contents of a database file is returned as a dictionary. The
+            binary storage returns a
+            :class:`gFunctionDatabase.General.binaryio.BinaryLibrary` and the
+            lazy storage returns a
+            :class:`gFunctionDatabase.General.jsonindex.IndexedJsonLibrary`
+            and the sqlite storage returns a
+            :class:`gFunctionDatabase.General.sqliteio.SQLiteLibrary`, all of
+            which behave like the dictionary.
         """
         try:
-            return General.fileio.js_r(self.registry[configuration])
+            path_to_file = self.registry[configuration]
         except KeyError:
             logger = logging.getLogger(__name__)
             logger.error('The requested configuration ' + configuration +
@@ -46,27 +128,469 @@ class BaseRetrieval(data_definition.BaseDefinition):
                          'rectangle, zoned')
             raise
 
+        if cache:
+            return library_cache.get(
+                configuration, storage, path_to_file,
+                lambda: self.read_data(configuration, storage, arrays=arrays),
+                arrays=arrays)
+        return self.read_data(configuration, storage, arrays=arrays)
+
+    def read_data(self, configuration, storage, arrays=False):
+        """
+        Read a configuration from the data file of the given storage format,
+        see :func:`load_data`.
+        """
+        path_to_file = self.registry[configuration]
+        if storage == 'json':
+            if arrays:
+                return General.fileio.js_r_arrays(path_to_file)
+            return General.fileio.js_r(path_to_file)
+        elif storage == 'binary':
+            path_to_binary = self.binary_path(configuration)
+            stamp = General.fileio.source_stamp(path_to_file)
+            if os.path.isfile(path_to_binary):
+                library = General.binaryio.bin_r(path_to_binary,
+                                                 arrays=arrays)
+                if library.source == stamp:
+                    return library
+                del library
+            os.makedirs(os.path.dirname(path_to_binary), exist_ok=True)
+            General.binaryio.bin_dump(self.stream_data(configuration),
+                                      path_to_binary, source=stamp)
+            return General.binaryio.bin_r(path_to_binary, arrays=arrays)
+        elif storage == 'lazy':
+            if General.fileio.json_extension(path_to_file) != 'json':
+                raise ValueError('The lazy storage requires an uncompressed '
+                                 'json library, the ' + configuration +
+                                 ' library is compressed.')
+            path_to_index = self.index_path(configuration)
+            index = None
+            if os.path.isfile(path_to_index):
+                index = General.jsonindex.idx_r(path_to_index)
+            if index is None or index.get('source') != \
+                    General.fileio.source_stamp(path_to_file):
+                index = General.jsonindex.js_index(
+                    path_to_file, self.levels[configuration])
+                os.makedirs(os.path.dirname(path_to_index), exist_ok=True)
+                General.jsonindex.idx_dump(index, path_to_index)
+            return General.jsonindex.IndexedJsonLibrary(path_to_file, index,
+                                                        arrays=arrays)
+        elif storage == 'sqlite':
+            # the library owns its connection, see SQLiteLibrary.close
+            return self.sqlite_database([configuration]).library(
+                configuration, arrays=arrays, owner=True)
+        else:
+            raise ValueError('The storage ' + storage + ' is not handled by '
+                             'this function. Please enter one of the following '
+                             'storage formats: json, binary, lazy, sqlite')
+
+    def stream_data(self, configuration):
+        """
+        Open a configuration so that it can be read one entry at a time, which
+        is used to convert a library to another storage format with bounded
+        memory. The lazy storage is used unless the json library is
+        compressed, in which case the entire library is decoded.
+        """
+        if General.fileio.json_extension(self.registry[configuration]) == \
+                'json':
+            return self.read_data(configuration, 'lazy')
+        return self.read_data(configuration, 'json')
+
+    def sqlite_database(self, configurations=None):
+        """
+        Open the SQLite database, ingesting any of the requested
+        configurations that are missing or out of date. The configurations are
+        ingested one entry at a time, see :func:`stream_data`.
+
+        Parameters
+        ----------
+        configurations : list (optional)
+            The configurations that need to be in the database, defaults to
+            every configuration in the registry.
+
+        Returns
+        -------
+        database : gFunctionDatabase.General.sqliteio.SQLiteDatabase
+            The database, which the caller closes
+        """
+        if configurations is None:
+            configurations = list(self.registry.keys())
+        os.makedirs(self.derived_directory(), exist_ok=True)
+        database = General.sqliteio.SQLiteDatabase(self.database_path())
+        try:
+            for configuration in configurations:
+                path_to_file = self.registry[configuration]
+                if not database.up_to_date(configuration, path_to_file):
+                    database.ingest(configuration,
+                                    self.stream_data(configuration),
+                                    path_to_file)
+        except BaseException:
+            database.close()
+            raise
+        return database
+
+    def query_fields(self, configurations=None, N=None, M=None, nbh_min=None,
+                     nbh_max=None):
+        """
+        Query the fields of every configuration through the SQLite database,
+        i.e. all fields with 60-80 boreholes in any configuration. See
+        :func:`gFunctionDatabase.General.sqliteio.SQLiteDatabase.query`.
+
+        Returns
+        -------
+        fields: list
+            A list of dictionaries with the configuration, key, secondary_key,
+            N, M and nbh of each field. N and M are swapped for the
+            configurations that are keyed with N <= M, but not for the
+            libraries keyed by orientation (see :func:`holds_transposes`).
+        """
+        database = self.sqlite_database(configurations)
+        try:
+            fields = database.query(configurations=configurations, N=N, M=M,
+                                    nbh_min=nbh_min, nbh_max=nbh_max)
+            if N is not None and M is not None and N > M:
+                oriented = database.oriented_configurations()
+                fields += [field for field in database.query(
+                    configurations=configurations, N=M, M=N, nbh_min=nbh_min,
+                    nbh_max=nbh_max)
+                    if field['configuration'] not in oriented]
+            return fields
+        finally:
+            database.close()
+
+    def derived_directory(self):
+        """
+        The directory of the files derived from the json libraries of this
+        installation, a folder of the cache directory named after a digest of
+        the data directory. Installations in different environments do not
+        overwrite each other's files.
+        """
+        path_to_data = os.path.dirname(
+            os.path.abspath(Data.available.__file__))
+        digest = hashlib.sha256(path_to_data.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_directory, digest[:16])
+
+    def database_path(self):
+        """
+        The path to the SQLite database, which sits in the derived directory.
+        """
+        return os.path.join(self.derived_directory(),
+                            'gFunctionDatabase.sqlite')
+
+    def binary_path(self, configuration):
+        """
+        The path to the binary library file of a configuration, which is named
+        after the json library file with a .gfdb extension and sits in the
+        derived directory.
+        """
+        file_name = os.path.basename(self.registry[configuration])
+        file_ext = General.fileio.json_extension(file_name)
+        return os.path.join(self.derived_directory(),
+                            file_name[:-len(file_ext)] + 'gfdb')
+
+    def index_path(self, configuration):
+        """
+        The path to the byte offset index of a configuration, which is named
+        after the json library file with a .json.idx extension and sits in
+        the derived directory.
+        """
+        return os.path.join(self.derived_directory(),
+                            os.path.basename(self.registry[configuration]) +
+                            '.idx')
+
+
+def deep_getsizeof(obj, seen=None) -> int:
+    """
+    Estimate the number of bytes held in memory by a decoded library. The
+    containers are followed recursively, numpy arrays count their buffer and
+    memory maps count nothing, as their pages belong to the file.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.memmap):
+        return 0
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_getsizeof(key, seen) + deep_getsizeof(value, seen)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            size += deep_getsizeof(value, seen)
+    elif hasattr(obj, '__dict__'):
+        size += deep_getsizeof(vars(obj), seen)
+    return size
+
+
+class LibraryCache:
+    """
+    A cache of decoded libraries that is shared by every
+    :class:`BaseRetrieval` in the process.
+
+    The libraries are keyed by configuration, storage format and the
+    modification time and size of the data file, so a library that changes on
+    disk is read again. When the libraries held exceed the byte budget, the
+    least recently used library is evicted.
+
+    The libraries are shared by every caller. A json library is returned as a
+    read only mapping (types.MappingProxyType), so keys cannot be added or
+    removed, but its entries are the decoded dictionaries themselves and must
+    not be modified. The other storage formats are read only already. What
+    the users derive from a library is kept in its :func:`index`, which is
+    dropped with the library.
+
+    Parameters
+    ----------
+    max_bytes : int (optional)
+        The byte budget of the cache, as estimated by :func:`deep_getsizeof`.
+        A library larger than the budget is returned but not held.
+    """
+    def __init__(self, max_bytes: int = 1024 ** 3):
+        self.max_bytes = max_bytes
+        # (key, library, bytes, index) in LRU order
+        self.libraries = OrderedDict()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, configuration, storage, path_to_file, loader,
+            arrays=False):
+        """
+        Return a library from the cache, or load and cache it.
+
+        Parameters
+        ----------
+        configuration : str
+            The database configuration
+        storage : str
+            The storage format of the library
+        path_to_file : str
+            The path to the data file of the configuration
+        loader : callable
+            A function without arguments that loads the library
+        arrays : bool (optional)
+            Whether the loader returns the fields in the array format
+
+        Returns
+        -------
+        library : Mapping
+            The library returned by the loader, as a read only mapping if it
+            is a dictionary
+        """
+        stat = os.stat(path_to_file)
+        name = (configuration, storage, arrays)
+        version = (path_to_file, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if name in self.libraries and \
+                    self.libraries[name][0] == version:
+                self.libraries.move_to_end(name)
+                self.hits += 1
+                return self.libraries[name][1]
+            self.misses += 1
+
+        library = loader()
+        size = deep_getsizeof(library)
+        if isinstance(library, dict):
+            library = types.MappingProxyType(library)
+
+        with self._lock:
+            self._discard(name)
+            if size <= self.max_bytes:
+                self.libraries[name] = (version, library, size, {})
+                self.resident_bytes += size
+                self._evict()
+        return library
+
+    def _discard(self, name):
+        if name in self.libraries:
+            self.resident_bytes -= self.libraries.pop(name)[2]
+
+    def _evict(self):
+        while self.resident_bytes > self.max_bytes:
+            _, (_, _, size, _) = self.libraries.popitem(last=False)
+            self.resident_bytes -= size
+            self.evictions += 1
+
+    def index(self, library) -> dict:
+        """
+        The index of a cached library, a dictionary in which the users of the
+        library store what they derive from it (i.e. the boundaries of
+        :class:`Retrieve`). The index belongs to the cache entry, and so to
+        the version of the data file the library was read from. A library
+        that is not held by the cache is given an empty dictionary.
+        """
+        with self._lock:
+            for _, cached, _, index in self.libraries.values():
+                if cached is library:
+                    return index
+        return {}
+
+    def resize(self, max_bytes: int):
+        """
+        Change the byte budget, evicting libraries if necessary.
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        """
+        Remove every library from the cache and reset the statistics.
+        """
+        with self._lock:
+            self.libraries.clear()
+            self.resident_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def statistics(self) -> dict:
+        """
+        Returns
+        -------
+        statistics : dict
+            The hits, misses, evictions, resident bytes and the cached
+            (configuration, storage, arrays) libraries from least to most
+            recently used.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'resident_bytes': self.resident_bytes,
+                    'max_bytes': self.max_bytes,
+                    'libraries': list(self.libraries.keys())}
+
+
+# The library cache shared by the process
+library_cache = LibraryCache()
+
 
 class Retrieve(BaseRetrieval):
-    def __init__(self, configuration):
-        super().__init__()
+    """
+    Retrieve fields from a database configuration.
+
+    Parameters
+    ----------
+    configuration : str
+        A string defining the database configuration to be loaded.
+        Options include: C, L, LopU, Open, U, rectangle, zoned
+    storage : str (optional)
+        The storage format to read the configuration from, see
+        :func:`BaseRetrieval.load_data`. The binary storage serves each N_M
+        field by slicing a memory mapped library file, and the lazy storage
+        seeks to and decodes only the requested N_M entry of the json library,
+        rather than decoding the entire json library.
+    cache : bool (optional)
+        If True, the library is shared through the process wide
+        :data:`library_cache`, so that constructing a Retrieve for the same
+        configuration again does not read the data file.
+    arrays : bool (optional)
+        If True, the fields are retrieved in the array format of
+        :func:`gFunctionDatabase.General.fileio.field_arrays`, see
+        :func:`BaseRetrieval.load_data`.
+    cache_directory : str (optional)
+        The directory of the files derived from the json libraries, see
+        :class:`BaseRetrieval`
+
+    A Retrieve can be used in a with block, which calls :func:`close` at its
+    end.
+    """
+    def __init__(self, configuration, storage='json', cache=False,
+                 arrays=False, cache_directory=None):
+        super().__init__(cache_directory=cache_directory)
         self.configuration = configuration
-        self.data = self.load_data(configuration)
+        self.storage = storage
+        self.cache = cache
+        self.arrays = arrays
+        self.data = self.load_data(configuration, storage=storage,
+                                   cache=cache, arrays=arrays)
+        # The boundaries of the library, the set of (N, M) fields within them
+        # and the unimodal order of the secondary keys, computed on first use
+        # and shared with the other instances of a cached library
+        if cache:
+            self.index: dict = library_cache.index(self.data)
+        else:
+            self.index: dict = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the data file of the library, i.e. the connection of the sqlite
+        storage. A library shared through :data:`library_cache` is left open,
+        as other instances use it.
+        """
+        if not self.cache and hasattr(self.data, 'close'):
+            self.data.close()
 
     def query_database(self):
         """
-            It is helpful to know what has been computed in a library. The maximum
-            number of boreholes. This function
-            is prolific. <<<add more details on how this function is so great.>>>
+            It is helpful to know what has been computed in a library. The
+            library boundaries are the first and last N_M field available for
+            each N. The boundaries are computed once, on the first call, and
+            reused thereafter, also by the instances that share a cached
+            library.
 
             Returns
             -------
             library_boundaries: dict
-                The boundaries. Explain further later.
+                The boundaries keyed by N, each value is a list containing the
+                first and the last (N, M) tuple available in the library.
+        """
+        self.boundary_index()
+        return dict(self.index['library_boundaries'])
+
+    def boundary_index(self) -> set:
+        """
+        Compute the library boundaries if they are not yet known, along with
+        the set of (N, M) fields that are within them.
+
+        Returns
+        -------
+        available_fields: set
+            A set of (N, M) tuples that can be retrieved, where N <= M unless
+            the library is keyed by orientation (see :func:`oriented`).
+        """
+        if 'available_fields' not in self.index:
+            library_boundaries = self.scan_boundaries()
+            available_fields = set()
+            for i in library_boundaries:
+                start, stop = library_boundaries[i]
+                for j in range(start[1], stop[1] + 1):
+                    available_fields.add((i, j))
+            self.index['library_boundaries'] = library_boundaries
+            self.index['available_fields'] = available_fields
+        return self.index['available_fields']
+
+    def oriented(self) -> bool:
+        """
+        Whether the library is keyed by orientation, i.e. it holds the fields
+        with N > M (see :func:`holds_transposes`). This is detected once from
+        the keys of the library, and stored in its index.
+        """
+        if 'oriented' not in self.index:
+            self.index['oriented'] = holds_transposes(self.data.keys())
+        return self.index['oriented']
+
+    def scan_boundaries(self):
+        """
+        Scan the keys of the library for the library boundaries, see
+        :func:`query_database`.
         """
 
         if self.configuration in self.levels:
             keys = list(self.data.keys())
+            oriented = self.oriented()
 
             # find the starting x and y point
             x = []
@@ -80,17 +604,19 @@ class Retrieve(BaseRetrieval):
             library_boundaries = {}
             i = min(x)
             j = min(y)
-            key = self.create_key(i, j)
+            key = self.create_key(i, j, oriented=oriented)
             while key in self.data:
                 start = (i, j)
                 while key in self.data:
                     j += 1
-                    key = self.create_key(i, j)
+                    key = self.create_key(i, j, oriented=oriented)
                 stop = (i, j - 1)
                 library_boundaries[i] = [start, stop]
                 i += 1
-                j = i
-                key = self.create_key(i, j)
+                # the transpose of a field is the same field, unless the
+                # library is keyed by orientation
+                j = min(y) if oriented else i
+                key = self.create_key(i, j, oriented=oriented)
         else:
             raise ValueError(
                 'The lib style given is not handled by this function')
@@ -109,35 +635,26 @@ class Retrieve(BaseRetrieval):
             Number of boreholes in the y-direction
 
         .. note::
-                N < M
+                N and M are swapped so that N <= M, except for a library
+                keyed by orientation (see :func:`oriented`), in which N is the
+                number of boreholes along the base of a U and M the number
+                along its sides, and N > M is a different field.
 
         Returns
         -------
         None
 
         """
-        # see the documentation for the current range of the library
-        library_boundaries = self.query_database()
-        N, M = self.check_layout(M, N)
+        oriented = self.oriented()
+        if not oriented:
+            N, M = self.check_layout(M, N)
 
-        keys = sorted(list(library_boundaries.keys()), key=int)
-        first_key = keys[0]
-        last_key = keys[-1]
-
-        # make sure the number in the y-direction is in available in the library
-        if first_key <= N <= last_key:
-            pass
-        else:
-            raise ValueError('The field is not in the library')
-        # make sure the number in the x-direction is available in the library
-        x_min = library_boundaries[N][0][1]
-        x_max = library_boundaries[N][1][1]
-        if x_min <= M <= x_max:
-            pass
-        else:
+        # make sure the field is within the current range of the library (see
+        # the documentation of query_database)
+        if (N, M) not in self.boundary_index():
             raise ValueError('The field is not in the library')
 
-        key = self.create_key(N, M)
+        key = self.create_key(N, M, oriented=oriented)
 
         # get the number of levels
         levels = self.levels[self.configuration]
@@ -148,16 +665,8 @@ class Retrieve(BaseRetrieval):
             data = {self.configuration + '_' + key: content}
         elif levels == 2:
             data = {}
-            # Make sure the list is unimodal starting from lowest heat rise to
-            # largest
             sec_type = self.secondary_type[self.configuration]
-            if sec_type == 'r':
-                # sec type reduction
-                keys = list(reversed(natsort.natsorted(list(content.keys()))))
-            elif sec_type == 't':
-                keys = natsort.natsorted(list(content.keys()))
-            elif sec_type == 'pair':
-                keys = natsort.natsorted(list(content.keys()))
+            keys = self.sort_secondary_keys(key, content)
 
             for _key in keys:
                 data[self.configuration + '_' + key + '_' + sec_type +
@@ -169,6 +678,37 @@ class Retrieve(BaseRetrieval):
 
         return data
 
+    def sort_secondary_keys(self, key, content):
+        """
+        Sort the secondary keys of a primary key so that the list is unimodal
+        starting from lowest heat rise to largest. The order is computed once
+        per primary key, and stored in the index of the library.
+
+        Parameters
+        ----------
+        key: str
+            The primary N_M key
+        content: dict
+            The contents of the primary key
+
+        Returns
+        -------
+        keys: list
+            The sorted secondary keys
+        """
+        secondary_keys = self.index.setdefault('secondary_keys', {})
+        if key not in secondary_keys:
+            sec_type = self.secondary_type[self.configuration]
+            if sec_type == 'r':
+                # sec type reduction
+                keys = list(reversed(natsort.natsorted(list(content.keys()))))
+            elif sec_type == 't':
+                keys = natsort.natsorted(list(content.keys()))
+            elif sec_type == 'pair':
+                keys = natsort.natsorted(list(content.keys()))
+            secondary_keys[key] = keys
+        return secondary_keys[key]
+
     # def count_boreholes(self):
     #     """
     #     Compute the number of boreholes in a borefield
@@ -203,7 +743,7 @@ class Retrieve(BaseRetrieval):
     #         self.configuration, Nx, Ny, Nix, Niy, reduced, thickness)
 
     @classmethod
-    def create_key(cls, i: int, j: int):
+    def create_key(cls, i: int, j: int, oriented: bool = False):
         """
         Given an i and a j create the standard `i_j` key for the library
 
@@ -213,13 +753,17 @@ class Retrieve(BaseRetrieval):
             Number of boreholes in the x-direction
         j: int
             Number of boreholes in the y-direction
+        oriented: bool (optional)
+            If True, i and j are not swapped so that i <= j, for a library
+            keyed by orientation (see :func:`holds_transposes`)
 
         Returns
         -------
         key: str
             i_j
         """
-        i, j = cls.check_layout(j, i)
+        if not oriented:
+            i, j = cls.check_layout(j, i)
         return str(i) + '_' + str(j)
 
     @staticmethod
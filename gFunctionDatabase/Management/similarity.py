@@ -0,0 +1,457 @@
+"""
+**similarity.py**
+
+Serve g-functions from their dimensionless form, so that a field is solved
+with pygfunction once for every spacing B.
+
+A g-function in ln(t/ts) depends only on the dimensionless geometry of the
+field (see `examples/DimensioningRules/dimensioning_rules.py`): the borehole
+locations over H (i.e. B/H), D/H and r_b/H. The ground thermal diffusivity
+only scales the characteristic time ts = H^2 / (9 alpha). A solve is therefore
+keyed on the borehole locations, lengths, burial depths and radii divided by
+the borehole length, which rescales the coordinates to a field of unit height
+as :meth:`gFunctionDatabase.Management.application.GFunction.correct_coordinates`
+rescales them to another spacing, and on ln(t/ts). The locations are
+translated to the origin and the field is put in a canonical orientation (of
+the rotations by 90 degrees and the reflections), since these do not change
+the g-function.
+
+Requests share a g-function when their dimensionless values match within a
+tolerance, |a - b| <= atol + rtol |b|. The values are rounded to a number of
+decimals (finer than the tolerance) to pick the canonical orientation and to
+key the cached files, so an exact match is a single file lookup. Otherwise the
+files of the solves with the same structure (the number of boreholes and of
+ln(t/ts) values, the boundary condition, the method and the options) are
+compared with the request, with the boreholes in any order and in any of the
+orientations, so requests on either side of a rounding boundary still match.
+
+A :class:`SimilarityCache` looks each request up in the on-disk cache of
+:mod:`gFunctionDatabase.Management.gfunctioncache`, and (optionally) in the
+registered libraries, i.e. the 5m L library, whose fields are indexed by
+their dimensionless geometry at each height. The library g-functions were
+computed with cpgfunction, whose discretization differs from the method and
+the number of segments of a request, so they are only served to a caller that
+opts in (any_discretization=True).
+"""
+
+import json
+import os
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from gFunctionDatabase import General
+from . import gfunctioncache
+from . import retrieval
+
+
+def _orientations(x: np.ndarray, y: np.ndarray) -> list:
+    # the rotations by 90 degrees and the reflections of the locations
+    return [(x, y), (-x, y), (x, -y), (-x, -y),
+            (y, x), (-y, x), (y, -x), (-y, -x)]
+
+
+def canonical_boreholes(boreholes: np.ndarray, decimals: int = 9) -> list:
+    """
+    The canonical dimensionless description of a field.
+
+    Parameters
+    ----------
+    boreholes: numpy.ndarray
+        The (x, y, H, D, r_b, tilt, orientation) of each borehole, with the
+        lengths in any unit
+    decimals: int (optional)
+        The number of decimals the dimensionless values are rounded to
+
+    Returns
+    -------
+    boreholes: list
+        The sorted (x, y, H, D, r_b, tilt, orientation) of each borehole,
+        with the lengths over the largest borehole length, in the orientation
+        that sorts first. Tilted fields are only translated. Two fields are
+        similar when their descriptions are exactly equal.
+    """
+    boreholes = np.array(boreholes, dtype=float)
+    length = np.max(boreholes[:, 2])
+    boreholes[:, :5] /= length
+    if np.any(boreholes[:, 5] != 0.):
+        orientations = [(boreholes[:, 0], boreholes[:, 1])]
+    else:
+        orientations = _orientations(boreholes[:, 0], boreholes[:, 1])
+
+    canonical = None
+    for x, y in orientations:
+        values = boreholes.copy()
+        values[:, 0] = x - np.min(x)
+        values[:, 1] = y - np.min(y)
+        # -0.0 and 0.0 describe the same input
+        values = np.round(values, decimals) + 0.
+        values = sorted(map(tuple, values.tolist()))
+        if canonical is None or values < canonical:
+            canonical = values
+    return [list(values) for values in canonical]
+
+
+def dimensionless_parameters(boreholes: list, alpha: float, time,
+                             boundary_condition: str, method: str = None,
+                             options: dict = None,
+                             decimals: int = 9) -> dict:
+    """
+    The canonical dimensionless description of a g-function solve, the
+    arguments are those of
+    :func:`gFunctionDatabase.Management.gfunctioncache.solve_parameters`.
+
+    Returns
+    -------
+    parameters: dict
+        The description, with the canonical 'boreholes' (see
+        :func:`canonical_boreholes`) and the ln(t/ts) values 'log_time'
+        (with ts of the largest borehole length) in place of the absolute
+        borehole dimensions, alpha and the times
+    """
+    parameters = gfunctioncache.solve_parameters(
+        boreholes, alpha, time, boundary_condition, method=method,
+        options=options)
+    fields = np.array(parameters['boreholes'], dtype=float)
+    # solve_parameters orders the values x, y, H, D, r_b, tilt, orientation
+    length = np.max(fields[:, 2])
+    t_s = length ** 2 / (9 * parameters['alpha'])
+    log_time = np.round(np.log(np.array(parameters['time']) / t_s),
+                        decimals) + 0.
+    del parameters['alpha'], parameters['time']
+    parameters['similarity'] = True
+    parameters['boreholes'] = canonical_boreholes(fields, decimals=decimals)
+    parameters['log_time'] = log_time.tolist()
+    return parameters
+
+
+def same_field(boreholes: list, other: list, rtol: float,
+               atol: float) -> bool:
+    """
+    Whether two canonical field descriptions (see :func:`canonical_boreholes`)
+    are the same field within a tolerance: each value of every borehole is
+    within atol + rtol |value| of a borehole of the other field. The
+    boreholes can be in any order, and the first field in any of its
+    orientations, as the rounding can put nearly equal fields in a different
+    canonical orientation or order.
+    """
+    boreholes = np.asarray(boreholes, dtype=float)
+    other = np.asarray(other, dtype=float)
+    if boreholes.shape != other.shape:
+        return False
+    tree = cKDTree(other)
+    tolerance = atol + rtol * np.abs(other)
+    if np.any(boreholes[:, 5] != 0.):
+        orientations = [(boreholes[:, 0], boreholes[:, 1])]
+    else:
+        orientations = _orientations(boreholes[:, 0], boreholes[:, 1])
+    for x, y in orientations:
+        values = boreholes.copy()
+        values[:, 0] = x - np.min(x)
+        values[:, 1] = y - np.min(y)
+        _, index = tree.query(values)
+        if len(np.unique(index)) == len(index) and \
+                np.all(np.abs(values - other[index]) <= tolerance[index]):
+            return True
+    return False
+
+
+def similar(parameters: dict, other: dict, rtol: float, atol: float) -> bool:
+    """
+    Whether two descriptions of the same structure (see
+    :func:`structure_key`) match within a tolerance, see :func:`same_field`.
+    """
+    return len(parameters['log_time']) == len(other['log_time']) and \
+        np.allclose(parameters['log_time'], other['log_time'], rtol=rtol,
+                    atol=atol) and \
+        same_field(parameters['boreholes'], other['boreholes'], rtol, atol)
+
+
+def structure_key(parameters: dict) -> str:
+    """
+    The key of a description of :func:`dimensionless_parameters` without its
+    dimensionless values: the number of boreholes and of ln(t/ts) values, the
+    boundary condition, the method, the options and the versions. Solves that
+    match within a tolerance have the same structure.
+    """
+    structure = dict(parameters)
+    structure['boreholes'] = len(parameters['boreholes'])
+    structure['log_time'] = len(parameters['log_time'])
+    return gfunctioncache.parameters_key(structure)
+
+
+def geometry_key(boreholes: list) -> str:
+    """
+    The key of a canonical field geometry, see :func:`canonical_boreholes`.
+    """
+    return gfunctioncache.parameters_key({'boreholes': boreholes})
+
+
+class LibraryIndex:
+    """
+    An index of the fields of registered libraries by their dimensionless
+    geometry at each height.
+
+    Parameters
+    ----------
+    configurations: list
+        The registered configurations to index, i.e. ['L']
+    decimals: int (optional)
+        The number of decimals the dimensionless values are rounded to
+    rtol: float (optional)
+        The relative tolerance of a match, see :func:`same_field`
+    atol: float (optional)
+        The absolute tolerance of a match
+    """
+    def __init__(self, configurations: list, decimals: int = 9,
+                 rtol: float = 1e-6, atol: float = 1e-8):
+        self.configurations = list(configurations)
+        self.decimals = decimals
+        self.rtol = rtol
+        self.atol = atol
+        self._index = None
+        # the canonical boreholes and the entry of each field at each
+        # height, keyed by the number of boreholes
+        self._fields = None
+
+    def build(self) -> dict:
+        """
+        Index the libraries, keyed by :func:`geometry_key`. The libraries are
+        read through :data:`gFunctionDatabase.Management.retrieval.library_cache`.
+
+        Returns
+        -------
+        index: dict
+            For each geometry, the (configuration, key, secondary key, g-key,
+            ln(t/ts) values, g-function) of the fields with the geometry
+        """
+        base_retrieval = retrieval.BaseRetrieval()
+        index = {}
+        self._fields = {}
+        for configuration in self.configurations:
+            library = base_retrieval.load_data(configuration)
+            for key, content in library.items():
+                if 'g' in content:
+                    fields = [(None, content)]
+                else:
+                    fields = list(content.items())
+                for secondary_key, field in fields:
+                    self._add(index, configuration, key, secondary_key,
+                              field)
+        self._index = index
+        return index
+
+    def _add(self, index: dict, configuration: str, key: str,
+             secondary_key: str, field: dict) -> None:
+        locations = np.array(field['bore_locations'], dtype=float)
+        log_time = np.round(np.array(field['logtime'], dtype=float),
+                            self.decimals) + 0.
+        for g_key, g in field['g'].items():
+            _, H, r_b, D = General.fileio.split_g_key(g_key)
+            if D is None:
+                # the libraries without burial depths in their keys are
+                # computed with D = 2 m
+                D = 2.
+            boreholes = np.zeros((len(locations), 7))
+            boreholes[:, :2] = locations
+            boreholes[:, 2:5] = [H, D, r_b]
+            canonical = canonical_boreholes(boreholes,
+                                            decimals=self.decimals)
+            entry = (configuration, key, secondary_key, g_key,
+                     log_time.tolist(), g)
+            index.setdefault(geometry_key(canonical), []).append(entry)
+            self._fields.setdefault(len(canonical), []).append(
+                (canonical, entry))
+
+    def match(self, parameters: dict, any_discretization: bool = False):
+        """
+        Find the library g-function of a solve described by
+        :func:`dimensionless_parameters`. Only uniform borehole wall
+        temperature solves at the ln(t/ts) values of the library are matched,
+        within the tolerance.
+
+        Parameters
+        ----------
+        parameters: dict
+            The dimensionless description of the solve
+        any_discretization: bool (optional)
+            The library g-functions are served whatever the method and the
+            number of segments of the solve, so nothing is matched unless
+            this is True.
+
+        Returns
+        -------
+        match: dict or None
+            The 'configuration', 'key', 'secondary_key', 'g_key' and 'g' of
+            the library field, None if there is no match
+        """
+        if not any_discretization or \
+                parameters['boundary_condition'] != 'UBWT':
+            return None
+        if self._index is None:
+            self.build()
+        exact = self._index.get(geometry_key(parameters['boreholes']), [])
+        candidates = [(parameters['boreholes'], entry) for entry in exact] + \
+            self._fields.get(len(parameters['boreholes']), [])
+        for boreholes, entry in candidates:
+            configuration, key, secondary_key, g_key, log_time, g = entry
+            if similar(parameters, {'boreholes': boreholes,
+                                    'log_time': log_time},
+                       self.rtol, self.atol):
+                return {'configuration': configuration, 'key': key,
+                        'secondary_key': secondary_key, 'g_key': g_key,
+                        'g': g}
+        return None
+
+
+class SimilarityCache(gfunctioncache.GFunctionCache):
+    """
+    An on-disk cache of g-functions keyed on their dimensionless form, which
+    can also serve the g-functions of the registered libraries.
+
+    A request is looked up in the cache, then in the libraries, and is only
+    solved with pygfunction when neither has a dimensionless match. It can be
+    passed as the cache of
+    :func:`gFunctionDatabase.Management.application.uniform_temperature_uniform_segment_lengths`
+    and :func:`gFunctionDatabase.Management.build.build_library`.
+
+    Parameters
+    ----------
+    directory : str (optional)
+        The cache directory, see
+        :func:`gFunctionDatabase.Management.gfunctioncache.default_directory`
+    max_bytes : int (optional)
+        The byte budget of the files in the cache directory
+    libraries : list (optional)
+        The registered configurations to serve g-functions from, i.e. ['L'].
+        By default no library is used.
+    any_discretization : bool (optional)
+        The library g-functions were computed with cpgfunction, so a library
+        match ignores the method and the number of segments of the request.
+        The libraries are only used when the caller accepts this with
+        any_discretization=True.
+    decimals : int (optional)
+        The number of decimals the dimensionless values are rounded to, which
+        should be finer than the tolerance
+    rtol : float (optional)
+        The relative tolerance of a match, see :func:`same_field`
+    atol : float (optional)
+        The absolute tolerance of a match
+
+    Raises
+    -------
+    ValueError
+        If libraries are given without any_discretization
+    """
+    def __init__(self, directory: str = None,
+                 max_bytes: int = 256 * 1024 ** 2, libraries: list = None,
+                 any_discretization: bool = False, decimals: int = 9,
+                 rtol: float = 1e-6, atol: float = 1e-8):
+        super().__init__(directory=directory, max_bytes=max_bytes)
+        if libraries and not any_discretization:
+            raise ValueError('The library g-functions are served whatever '
+                             'the method and the number of segments of a '
+                             'request, pass any_discretization=True to use '
+                             'the libraries.')
+        self.decimals = decimals
+        self.rtol = rtol
+        self.atol = atol
+        self.any_discretization = any_discretization
+        self.library_index = None
+        if libraries:
+            self.library_index = LibraryIndex(libraries, decimals=decimals,
+                                              rtol=rtol, atol=atol)
+        self.library_hits = 0
+
+    def parameters(self, boreholes: list, alpha: float, time,
+                   boundary_condition: str, method: str = None,
+                   options: dict = None) -> dict:
+        """
+        The dimensionless description of a solve, see
+        :func:`dimensionless_parameters`.
+        """
+        return dimensionless_parameters(boreholes, alpha, time,
+                                        boundary_condition, method=method,
+                                        options=options,
+                                        decimals=self.decimals)
+
+    def key(self, parameters: dict) -> str:
+        """
+        The key of a solve, the :func:`structure_key` prefix followed by the
+        hash of the rounded description.
+        """
+        return structure_key(parameters)[:16] + '-' + \
+            gfunctioncache.parameters_key(parameters)
+
+    def find(self, parameters: dict):
+        """
+        The key of the cached solve that matches a solve within the
+        tolerance, or None. The cached solves of the same structure are
+        compared when there is no exact match.
+        """
+        key = self.key(parameters)
+        if os.path.isfile(self.path(key)):
+            return key
+        if not os.path.isdir(self.directory):
+            return None
+        prefix = key.split('-')[0] + '-'
+        for entry in os.scandir(self.directory):
+            if not entry.name.startswith(prefix) or \
+                    not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path, 'r') as file:
+                    other = json.load(file)['parameters']
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+            if similar(parameters, other, self.rtol, self.atol):
+                return entry.name[:-len('.json')]
+        return None
+
+    def lookup(self, parameters: dict):
+        """
+        Return the g-function of a solve from the cache or from the libraries,
+        or None if neither has a dimensionless match.
+        """
+        key = self.find(parameters)
+        if key is None:
+            with self._lock:
+                self.misses += 1
+            g = None
+        else:
+            g = self.get(key)
+        if g is not None or self.library_index is None:
+            return g
+        match = self.library_index.match(
+            parameters, any_discretization=self.any_discretization)
+        if match is None:
+            return None
+        with self._lock:
+            self.library_hits += 1
+        return list(match['g'])
+
+    def store(self, parameters: dict, g) -> None:
+        """
+        Store the g-function of a solve, see :func:`key`.
+        """
+        self.put(self.key(parameters), g, parameters=parameters)
+
+    def clear(self) -> None:
+        super().clear()
+        with self._lock:
+            self.library_hits = 0
+
+    def statistics(self) -> dict:
+        """
+        Returns
+        -------
+        statistics : dict
+            The statistics of
+            :meth:`gFunctionDatabase.Management.gfunctioncache.GFunctionCache.statistics`,
+            and the number of 'library_hits'. A library hit is also counted
+            as a miss of the cache.
+        """
+        statistics = super().statistics()
+        with self._lock:
+            statistics['library_hits'] = self.library_hits
+        return statistics
@@ -8,3 +8,6 @@ from . import featurerecognition
 from . import pipes
 from . import coordinates
 from . import utilities
+from . import superposition
+from . import sizing
+from . import selection
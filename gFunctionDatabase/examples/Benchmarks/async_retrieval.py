@@ -0,0 +1,53 @@
+"""
+Benchmark the request throughput of AsyncRetrieve and the stalls of the event
+loop while the requests are served. A heartbeat task sleeps for 1 ms at a time
+and records how late it wakes up. The library is opened and the worker
+processes started before the heartbeat begins.
+"""
+
+import asyncio
+import time
+
+import gFunctionDatabase as gfdb
+
+
+async def heartbeat(stalls: list, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        tic = loop.time()
+        await asyncio.sleep(0.001)
+        stalls.append(loop.time() - tic - 0.001)
+
+
+async def serve(storage: str, n_requests: int):
+    fields = [(N, M) for N in range(3, 12) for M in range(N, 12)]
+    stalls = []
+    stop = asyncio.Event()
+    async with gfdb.Management.asyncretrieval.AsyncRetrieve(
+            storage=storage) as async_retrieval:
+        await async_retrieval.interpolate('L', 3, 3, 0.08)
+        monitor = asyncio.create_task(heartbeat(stalls, stop))
+        tic = time.perf_counter()
+        await asyncio.gather(
+            *[async_retrieval.interpolate('L', *fields[i % len(fields)], 0.08)
+              for i in range(n_requests)])
+        elapsed = time.perf_counter() - tic
+    stop.set()
+    await monitor
+    stalls.sort()
+    return elapsed, stalls[int(0.99 * len(stalls))], stalls[-1]
+
+
+def main():
+    n_requests = 500
+    print('Storage\tRequests\tTime (s)\tRequests/s\t99th percentile stall '
+          '(ms)\tMax stall (ms)')
+    for storage in ['json', 'lazy', 'binary']:
+        elapsed, stall_99, stall_max = asyncio.run(serve(storage, n_requests))
+        print('{0}\t{1}\t{2:.3f}\t{3:.0f}\t{4:.2f}\t{5:.2f}'.format(
+            storage, n_requests, elapsed, n_requests / elapsed,
+            stall_99 * 1000, stall_max * 1000))
+
+
+if __name__ == '__main__':
+    main()
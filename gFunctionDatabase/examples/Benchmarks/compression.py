@@ -0,0 +1,46 @@
+"""
+Benchmark the size and the decode time of the json libraries when they are
+stored uncompressed, gzip compressed and xz compressed.
+"""
+
+import os
+import tempfile
+import time
+
+import gFunctionDatabase as gfdb
+
+
+def time_decode(file_path: str, repeats: int = 3) -> float:
+    # the best of several decodes, in seconds
+    times = []
+    for _ in range(repeats):
+        tic = time.perf_counter()
+        gfdb.General.fileio.js_r(file_path)
+        times.append(time.perf_counter() - tic)
+    return min(times)
+
+
+def main():
+    base_retrieval = gfdb.Management.retrieval.BaseRetrieval()
+
+    print('Configuration\tCodec\tSize (MB)\tRatio\tDecode (s)')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for configuration in base_retrieval.registry:
+            library = base_retrieval.load_data(configuration)
+            uncompressed_size = None
+            for file_ext in gfdb.General.fileio.JSON_OPENERS:
+                file_path = os.path.join(tmp_dir,
+                                         configuration + '.' + file_ext)
+                gfdb.General.fileio.js_dump(library, file_path)
+                size = os.path.getsize(file_path)
+                if uncompressed_size is None:
+                    uncompressed_size = size
+                decode_time = time_decode(file_path)
+                print('{0}\t{1}\t{2:.3f}\t{3:.2f}\t{4:.4f}'.format(
+                    configuration, file_ext, size / 1.0e06,
+                    uncompressed_size / size, decode_time))
+                os.remove(file_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark the computation of the g-functions of a field at the five heights
+of the library with
+:func:`gFunctionDatabase.Management.application.uniform_temperature_uniform_segment_lengths`,
+one height after another and with the heights solved in a pool of processes.
+
+The heights are independent, so with at least as many CPUs as heights the
+parallel computation takes about as long as the slowest height.
+"""
+
+import os
+import time
+
+import numpy as np
+
+import gFunctionDatabase as gfdb
+
+
+def main(N: int = 7, M: int = 10, workers: int = None):
+    B = 5.
+    alpha = 1.0e-06
+    log_time = gfdb.utilities.Eskilson_log_times()
+    coordinates = gfdb.coordinates.rectangle(N, M, B, B)
+    H_values = [24., 48., 96., 192., 384.]
+    D_values = [2.] * len(H_values)
+    r_b_values = [0.075] * len(H_values)
+    nSegments = [12] * len(H_values)
+    compute = gfdb.Management.application.\
+        uniform_temperature_uniform_segment_lengths
+
+    times = []
+    for H in H_values:
+        tic = time.perf_counter()
+        compute([2.], [H], [0.075], B, log_time, alpha, coordinates, [12])
+        times.append(time.perf_counter() - tic)
+    print('Field: {}x{}, CPUs: {}'.format(N, M, os.cpu_count()))
+    print('Slowest height: {:.2f} s'.format(max(times)))
+
+    tic = time.perf_counter()
+    serial = compute(D_values, H_values, r_b_values, B, log_time, alpha,
+                     coordinates, nSegments)
+    serial_time = time.perf_counter() - tic
+    print('Serial: {:.2f} s'.format(serial_time))
+
+    tic = time.perf_counter()
+    parallel = compute(D_values, H_values, r_b_values, B, log_time, alpha,
+                       coordinates, nSegments, workers=workers)
+    parallel_time = time.perf_counter() - tic
+    print('Parallel: {:.2f} s ({:.1f}x)'.format(
+        parallel_time, serial_time / parallel_time))
+
+    difference = max(np.max(np.abs(np.array(parallel['g'][key]) -
+                                   np.array(serial['g'][key])))
+                     for key in serial['g'])
+    print('Max difference: {:.2e}'.format(difference))
+
+
+if __name__ == '__main__':
+    main()
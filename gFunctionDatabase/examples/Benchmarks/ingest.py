@@ -0,0 +1,78 @@
+"""
+Benchmark the ingestion of a folder of cpgfunction output files with
+:func:`gFunctionDatabase.Management.ingest.ingest_folder` against reading
+every file into one dictionary and dumping it, as the former FolderToLib
+did.
+
+The folder holds copies of a zoned rectangle output under the names of a
+larger library. The peak memory of this process is measured with tracemalloc,
+with a single worker so that the files are read in this process.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import gFunctionDatabase as gfdb
+from gFunctionDatabase.Management import ingest
+
+
+def make_folder(path_to_folder: str, n_files: int) -> None:
+    # copies of one cpgfunction output under zoned rectangle names
+    source = os.path.join(os.path.dirname(gfdb.__file__), 'Data', 'examples',
+                          'Partial_Libraries',
+                          'Zoned_Rectangle_Output_Partial',
+                          'ZRect_4_x_9_1_x_6.json')
+    os.makedirs(path_to_folder)
+    for i in range(n_files):
+        Nx, Ny = divmod(i, 100)
+        shutil.copy(source, os.path.join(
+            path_to_folder, 'ZRect_{}_x_{}_1_x_1.json'.format(Nx + 4,
+                                                              Ny + 4)))
+
+
+def in_memory(path_to_folder: str, path_to_output: str) -> None:
+    # read every file into one dictionary, then dump it
+    library = {}
+    for name in os.listdir(path_to_folder):
+        primary_key, secondary_key = ingest.key_from_file_name(name, 'zoned')
+        library.setdefault(primary_key, {})[secondary_key] = \
+            gfdb.General.fileio.js_r(os.path.join(path_to_folder, name))
+    gfdb.General.fileio.js_dump(library, path_to_output)
+
+
+def measure(function, *args) -> tuple:
+    tracemalloc.start()
+    tic = time.perf_counter()
+    function(*args)
+    toc = time.perf_counter()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return toc - tic, peak / 1024 ** 2
+
+
+def main(n_files: int = 3000):
+    with tempfile.TemporaryDirectory() as directory:
+        folder = os.path.join(directory, 'outputs')
+        make_folder(folder, n_files)
+
+        seconds, peak = measure(in_memory, folder,
+                                os.path.join(directory, 'in_memory.json'))
+        print('In memory: {:.2f} s, peak {:.1f} MiB'.format(seconds, peak))
+        seconds, peak = measure(ingest.ingest_folder, folder, 'zoned',
+                                os.path.join(directory, 'streamed.json'),
+                                os.path.join(directory, 'report.csv'), 1)
+        print('Streamed: {:.2f} s, peak {:.1f} MiB (report included)'.format(
+            seconds, peak))
+
+        tic = time.perf_counter()
+        ingest.ingest_folder(folder, 'zoned',
+                             os.path.join(directory, 'parallel.json'))
+        print('Streamed with {} workers: {:.2f} s'.format(
+            os.cpu_count(), time.perf_counter() - tic))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark the accuracy and the throughput of the interpolation kinds over B/H.
+
+The accuracy is measured by leaving out each of the inner heights of every
+field of the L library, interpolating the g-function of that height from the
+remaining heights and comparing it to the g-function that was left out. The
+throughput is the time to fit the interpolation table of a field and to
+interpolate one B/H ratio, and the time to interpolate one B/H ratio with a
+table that is already fit. The fit of one interpolant per ln(t/ts) value (the
+procedure before the interpolation was vectorized) is given for reference.
+"""
+
+import time
+import warnings
+
+import numpy as np
+from scipy.interpolate import interp1d, lagrange
+
+import gFunctionDatabase as gfdb
+
+
+KINDS = ['linear', 'quadratic', 'cubic', 'lagrange', 'pchip']
+
+
+def per_time_interpolation(g_function, B_over_H: float, kind: str) -> list:
+    # one interpolant for each ln(t/ts) value
+    H_eq = 1 / B_over_H * g_function.B
+    x = list(g_function.g_lts.keys())
+    g = []
+    for i in range(len(g_function.log_time)):
+        y = [g_function.g_lts[key][i] for key in x]
+        if kind == 'lagrange':
+            f = lagrange(x, y)
+        else:
+            f = interp1d(x, y, kind=kind)
+        g.append(float(f(H_eq)))
+    return g
+
+
+def leave_one_out(library: dict, kind: str) -> np.ndarray:
+    # the maximum relative error of each interpolated g-function
+    errors = []
+    for field in library.values():
+        g_input = gfdb.Management.application.GFunction.\
+            configure_database_file_for_usage(field)
+        heights = list(g_input['g_lts'].keys())
+        for height in heights[1:-1]:
+            reduced = dict(g_input)
+            for name in ['g_lts', 'r_b_values', 'D_values']:
+                reduced[name] = {k: v for k, v in g_input[name].items()
+                                 if k != height}
+            g_function = gfdb.Management.application.GFunction(**reduced)
+            g, _, _, _ = g_function.g_function_interpolation_array(
+                g_function.B / height, kind=kind)
+            reference = np.asarray(g_input['g_lts'][height])
+            errors.append(np.max(np.abs(g - reference) / reference))
+    return np.array(errors)
+
+
+def throughput(field: dict, kind: str, repeats: int = 200) -> tuple:
+    g_input = gfdb.Management.application.GFunction.\
+        configure_database_file_for_usage(field)
+    B_over_H_values = np.linspace(0.015, 0.2, repeats)
+
+    tic = time.perf_counter()
+    for B_over_H in B_over_H_values:
+        g_function = gfdb.Management.application.GFunction(**g_input)
+        g_function.g_function_interpolation_array(B_over_H, kind=kind)
+    fit_time = (time.perf_counter() - tic) / repeats
+
+    tic = time.perf_counter()
+    for B_over_H in B_over_H_values:
+        g_function.g_function_interpolation_array(B_over_H, kind=kind)
+    evaluate_time = (time.perf_counter() - tic) / repeats
+    return fit_time, evaluate_time
+
+
+def main():
+    base_retrieval = gfdb.Management.retrieval.BaseRetrieval()
+    library = base_retrieval.load_data('L', arrays=True)
+    field = library['5_8']
+
+    print('Kind\tMean error (%)\tMax error (%)\tFit + evaluate (us)\t'
+          'Evaluate (us)')
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for kind in KINDS:
+            errors = leave_one_out(library, kind)
+            fit_time, evaluate_time = throughput(field, kind)
+            print('{}\t{:.3f}\t{:.3f}\t{:.1f}\t{:.1f}'.format(
+                kind, 100 * np.mean(errors), 100 * np.max(errors),
+                1.0e06 * fit_time, 1.0e06 * evaluate_time))
+
+        g_function = gfdb.Management.application.GFunction(
+            **gfdb.Management.application.GFunction.
+            configure_database_file_for_usage(field))
+        for kind in ['cubic', 'lagrange']:
+            tic = time.perf_counter()
+            for B_over_H in np.linspace(0.015, 0.2, 50):
+                per_time_interpolation(g_function, B_over_H, kind)
+            print('{} (per ln(t/ts))\t-\t-\t{:.1f}\t-'.format(
+                kind, 1.0e06 * (time.perf_counter() - tic) / 50))
+
+
+if __name__ == '__main__':
+    main()
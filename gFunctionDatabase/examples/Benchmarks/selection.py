@@ -0,0 +1,53 @@
+"""
+Benchmark the selection of the best fields of each configuration library with
+an increasing number of worker processes, and the time saved by stopping once
+the ranking is stable.
+"""
+
+import os
+import time
+
+import gFunctionDatabase as gfdb
+
+
+LOADS = [[40.0e3, 80.0e3, 160.0e3], [-30.0e3, -90.0e3, -180.0e3]]
+DURATIONS = [10 * 365 * 86400., 30 * 86400., 6 * 3600.]
+SETTINGS = {'k_s': 2.0, 'alpha': 1.0e-06, 'T_g': 12., 'R_b': 0.15,
+            'T_min': 0., 'T_max': 35., 'lot': (80., 120.), 'top_k': 10}
+
+
+def time_selection(configuration: str, **kwargs) -> tuple:
+    tic = time.perf_counter()
+    for ranking in gfdb.selection.select_fields(configuration, LOADS,
+                                                DURATIONS, **SETTINGS,
+                                                **kwargs):
+        pass
+    return time.perf_counter() - tic, ranking
+
+
+def main():
+    base_retrieval = gfdb.Management.retrieval.BaseRetrieval()
+    n_cpus = os.cpu_count() or 1
+    counts = [n for n in [1, 2, 4, 8, 16, 32] if n <= n_cpus]
+
+    print('Configuration\tWorkers\tTime (s)\tSpeedup\tEntries\tBest')
+    for configuration in base_retrieval.registry:
+        # build the binary library before timing
+        base_retrieval.read_data(configuration, 'binary')
+        serial_time = None
+        for workers in counts:
+            elapsed, ranking = time_selection(configuration, workers=workers)
+            if serial_time is None:
+                serial_time = elapsed
+            print('{}\t{}\t{:.3f}\t{:.2f}\t{}\t{}'.format(
+                configuration, workers, elapsed, serial_time / elapsed,
+                ranking['completed'], ranking['ranked'][0]['key']))
+        elapsed, ranking = time_selection(configuration, workers=counts[-1],
+                                          patience=4)
+        print('{}\t{} (patience 4)\t{:.3f}\t{:.2f}\t{}\t{}'.format(
+            configuration, counts[-1], elapsed, serial_time / elapsed,
+            ranking['completed'], ranking['ranked'][0]['key']))
+
+
+if __name__ == '__main__':
+    main()
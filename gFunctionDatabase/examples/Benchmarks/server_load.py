@@ -0,0 +1,86 @@
+"""
+A load test of the query server on localhost. The server is started in a
+separate process with the L configuration, and a number of client threads
+(each with its own connection) send retrieve, interpolate and batch
+interpolate requests. The throughput and the latency percentiles of each
+request type are reported.
+"""
+
+import concurrent.futures
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from gFunctionDatabase import server
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port: int, timeout: float = 120.):
+    tic = time.perf_counter()
+    while time.perf_counter() - tic < timeout:
+        try:
+            with server.Client(port=port) as client:
+                return client.configurations()
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('The server did not start.')
+
+
+def run_client(port: int, kind: str, n_requests: int, batch_size: int):
+    fields = [(N, M) for N in range(3, 12) for M in range(N, 12)]
+    latencies = []
+    with server.Client(port=port) as client:
+        for i in range(n_requests):
+            N, M = fields[i % len(fields)]
+            B_over_H = 0.05 + 0.01 * (i % 10)
+            tic = time.perf_counter()
+            if kind == 'retrieve':
+                client.retrieve('L', N, M)
+            elif kind == 'interpolate':
+                client.interpolate('L', N, M, B_over_H)
+            else:
+                requests = [list(fields[(i + j) % len(fields)]) + [B_over_H]
+                            for j in range(batch_size)]
+                client.interpolate_batch('L', requests)
+            latencies.append(time.perf_counter() - tic)
+    return latencies
+
+
+def main(n_clients: int = 8, n_requests: int = 200, batch_size: int = 50):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gFunctionDatabase.server', '--port',
+         str(port), '--configurations', 'L'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(port)
+        print('Request\tClients\tFields/s\tp50 (ms)\tp99 (ms)')
+        for kind in ['retrieve', 'interpolate', 'batch']:
+            tic = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(n_clients) as pool:
+                futures = [pool.submit(run_client, port, kind, n_requests,
+                                       batch_size) for _ in range(n_clients)]
+                latencies = np.concatenate([f.result() for f in futures])
+            elapsed = time.perf_counter() - tic
+            n_fields = n_clients * n_requests
+            if kind == 'batch':
+                n_fields *= batch_size
+            print('{0}\t{1}\t{2:.0f}\t{3:.2f}\t{4:.2f}'.format(
+                kind, n_clients, n_fields / elapsed,
+                np.percentile(latencies, 50) * 1000,
+                np.percentile(latencies, 99) * 1000))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark the depth sizing of every field of a configuration library with
+:func:`gFunctionDatabase.sizing.size_fields` against a scalar root find on
+each field, which retrieves the field, interpolates the g-function for every
+trial depth and fits an interpolant in ln(t/ts).
+"""
+
+import math
+import time
+
+import numpy as np
+from scipy.optimize import brentq
+
+import gFunctionDatabase as gfdb
+
+
+LOADS = [[40.0e3, 80.0e3, 160.0e3], [-30.0e3, -90.0e3, -180.0e3]]
+DURATIONS = [10 * 365 * 86400., 30 * 86400., 6 * 3600.]
+k_s = 2.0
+alpha = 1.0e-06
+T_g = 12.
+R_b = 0.15
+T_min = 0.
+T_max = 35.
+
+
+def scalar_size(retrieval, N: int, M: int) -> float:
+    # the workflow without the sizing module, one field at a time
+    data = retrieval.retrieve(N, M)
+    field = data[list(data.keys())[0]]
+    g_function = gfdb.Management.application.GFunction(
+        **gfdb.Management.application.GFunction.
+        configure_database_file_for_usage(field))
+    nbh = len(g_function.bore_locations)
+    heights = list(g_function.g_lts.keys())
+    elapsed = np.cumsum(DURATIONS[::-1])[::-1]
+    steps = np.diff(LOADS, axis=1, prepend=0.)
+
+    def excess(H):
+        g, rb, _, H_eq = g_function.g_function_interpolation(
+            g_function.B / H)
+        interpolant = gfdb.Management.application.LogTimeInterpolant(
+            g_function.log_time, g, r_b_over_H=rb / H_eq)
+        g = interpolant(np.log(elapsed / (H ** 2 / (9 * alpha))))
+        T_f = T_g - (steps @ g / (2 * math.pi * k_s) +
+                     np.array(LOADS)[:, -1] * R_b) / (nbh * H)
+        return max(np.max(T_min - T_f), np.max(T_f - T_max))
+
+    if excess(heights[-1]) > 0:
+        return np.nan
+    if excess(heights[0]) <= 0:
+        return heights[0]
+    return brentq(excess, heights[0], heights[-1], xtol=1.0e-03)
+
+
+def main(configuration: str = 'L'):
+    base_retrieval = gfdb.Management.retrieval.BaseRetrieval()
+
+    tic = time.perf_counter()
+    library = base_retrieval.load_data(configuration, arrays=True)
+    sizes = gfdb.sizing.size_fields(library, LOADS, DURATIONS, k_s, alpha,
+                                    T_g, R_b, T_min, T_max)
+    vectorized_time = time.perf_counter() - tic
+
+    retrieval = gfdb.Management.retrieval.Retrieve(configuration)
+    tic = time.perf_counter()
+    H = []
+    for key in sizes['keys']:
+        N, M = [int(value) for value in key.split('_')]
+        H.append(scalar_size(retrieval, N, M))
+    scalar_time = time.perf_counter() - tic
+    H = np.array(H)
+
+    feasible = sizes['feasible']
+    print('Fields: {}, feasible: {}, pruned: {}'.format(
+        len(sizes['keys']), np.count_nonzero(feasible),
+        np.count_nonzero(sizes['pruned'])))
+    print('Scalar root find: {:.2f} s'.format(scalar_time))
+    print('size_fields: {:.2f} s ({:.0f}x)'.format(
+        vectorized_time, scalar_time / vectorized_time))
+    print('Max relative difference in H: {:.2e}'.format(
+        np.max(np.abs(sizes['H'][feasible] / H[feasible] - 1))))
+    best = np.nanargmin(sizes['total_length'])
+    print('Shortest total length: {} ({:.1f} m x {:.0f})'.format(
+        sizes['keys'][best], sizes['H'][best], sizes['nbh'][best]))
+
+
+if __name__ == '__main__':
+    main()
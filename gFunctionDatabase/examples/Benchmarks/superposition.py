@@ -0,0 +1,78 @@
+"""
+Benchmark the temporal superposition of 20 years of hourly loads (175,200
+steps) with an FFT convolution and with load aggregation against the direct
+O(n^2) loop.
+
+The direct loop takes hours at 175,200 steps, so it is timed on shorter load
+series and its time at 175,200 steps is extrapolated from the last of them.
+"""
+
+import math
+import time
+
+import numpy as np
+
+import gFunctionDatabase as gfdb
+
+
+def hourly_loads(n: int) -> np.ndarray:
+    # a seasonal extraction rate (W/m) with hourly noise
+    hours = np.arange(n)
+    rng = np.random.default_rng(0)
+    return 25. * np.cos(2 * math.pi * hours / 8760.) + \
+        10. * np.sin(2 * math.pi * hours / 24.) + rng.normal(0., 5., n)
+
+
+def main():
+    n_hours = 20 * 8760
+    H = 150.
+    alpha = 1.0e-06
+    k_s = 2.0
+    T_g = 10.
+
+    retrieval = gfdb.Management.retrieval.Retrieve('L')
+    g_function = gfdb.Management.application.GFunction(
+        **gfdb.Management.application.GFunction.
+        configure_database_file_for_usage(retrieval.retrieve(5, 8)['L_5_8']))
+    response = gfdb.superposition.step_response(g_function, H, alpha)
+    loads = hourly_loads(n_hours)
+    times = 3600. * np.arange(1, n_hours + 1)
+
+    tic = time.perf_counter()
+    g_values = response(times)
+    toc = time.perf_counter()
+    print('g-function at {} hours: {:.4f} s'.format(n_hours, toc - tic))
+
+    print('Method\tSteps\tTime (s)\tMax difference from FFT (K)')
+    naive_time = None
+    for n in [1000, 2000, 4000]:
+        fft = gfdb.superposition.uniform_superposition(loads[:n],
+                                                       g_values[:n], k_s)
+        tic = time.perf_counter()
+        naive = gfdb.superposition.naive_superposition(loads[:n],
+                                                       g_values[:n], k_s)
+        naive_time = time.perf_counter() - tic
+        print('naive\t{}\t{:.3f}\t{:.2e}'.format(
+            n, naive_time, np.max(np.abs(naive - fft))))
+    print('naive\t{}\t{:.0f} (extrapolated)\t-'.format(
+        n_hours, naive_time * (n_hours / n) ** 2))
+
+    tic = time.perf_counter()
+    T_b = gfdb.superposition.borehole_wall_temperature(
+        g_function, loads, k_s, alpha, H, T_g)
+    toc = time.perf_counter()
+    print('fft\t{}\t{:.4f}\t0'.format(n_hours, toc - tic))
+
+    for cells_per_level in [5, 10, 20]:
+        tic = time.perf_counter()
+        T_b_aggregated = gfdb.superposition.borehole_wall_temperature(
+            g_function, loads, k_s, alpha, H, T_g, times=times,
+            cells_per_level=cells_per_level)
+        toc = time.perf_counter()
+        print('aggregation ({} cells)\t{}\t{:.3f}\t{:.2e}'.format(
+            cells_per_level, n_hours, toc - tic,
+            np.max(np.abs(T_b_aggregated - T_b))))
+
+
+if __name__ == '__main__':
+    main()
@@ -52,7 +52,7 @@ def main():
         uniform_temperature_uniform_segment_lengths(D_values, H_values,
                                                     r_b_values, B, log_time,
                                                     alpha, r_coodinates,
-                                                    nSegments)
+                                                    nSegments, cache=True)
     GFunction_input = gfdb.Management.application.GFunction.\
         configure_database_file_for_usage(g_data)
     GFunction_5m = gfdb.Management.application.GFunction(**GFunction_input)
@@ -94,7 +94,7 @@ def main():
         uniform_temperature_uniform_segment_lengths(D_values, H_values,
                                                     r_b_values, B, log_time,
                                                     alpha, r_coodinates,
-                                                    nSegments)
+                                                    nSegments, cache=True)
     GFunction_input = gfdb.Management.application.GFunction. \
         configure_database_file_for_usage(g_data)
     GFunction_20m = gfdb.Management.application.GFunction(**GFunction_input)
@@ -29,7 +29,7 @@ def main():
         uniform_temperature_uniform_segment_lengths(D_values, H_values,
                                                     r_b_values, B, log_time,
                                                     alpha, r_coodinates,
-                                                    nSegments)
+                                                    nSegments, cache=True)
     GFunction_input = gfdb.Management.application.GFunction. \
         configure_database_file_for_usage(g_data)
     GFunction_8m = gfdb.Management.application.GFunction(**GFunction_input)
@@ -45,7 +45,7 @@ def main():
         uniform_temperature_uniform_segment_lengths(D_values, H_values,
                                                     r_b_values, B, log_time,
                                                     alpha, r_coodinates,
-                                                    nSegments)
+                                                    nSegments, cache=True)
     GFunction_input = gfdb.Management.application.GFunction. \
         configure_database_file_for_usage(g_data)
     GFunction_5m = gfdb.Management.application.GFunction(**GFunction_input)
@@ -86,14 +86,13 @@ def main():
     B: float = 8.
     H: float = 128.
     B_over_H: float = B / H
-    interpolation_kinds = ['linear', 'quadratic', 'cubic', 'lagrange']
+    interpolation_kinds = ['linear', 'quadratic', 'cubic', 'lagrange',
+                           'pchip']
     # Store the g-function interpolated with different procedures
     g_functions = []
     for kind in interpolation_kinds:
         g_function, rb_value, D_value, H_eq = \
             GFunction_5m.g_function_interpolation(B_over_H, kind=kind)
-        # this needs reset to recompute the table with a new kind
-        GFunction_5m.interpolation_table = {}
         g_functions.append(g_function)
     mean_percentage_errors = []
     for i in range(len(g_functions)):
@@ -121,15 +120,13 @@ def main():
     # Now check to see the accuracy of interpolation with reduced curves
     # first remove the highest height, then the lowest height, then the highest
     # height
-    print('#Ref g-functions\tLinear\tQuadratic\tCubic\tLagrange')
+    print('#Ref g-functions\t' + '\t'.join(interpolation_kinds))
     sign = 1
     for _ in range(4):
         g_functions = []
         for kind in interpolation_kinds:
             g_function, rb_value, D_value, H_eq = \
                 GFunction_5m.g_function_interpolation(B_over_H, kind=kind)
-            # this needs reset to recompute the table with a new kind
-            GFunction_5m.interpolation_table = {}
             g_functions.append(g_function)
         mean_percentage_errors = ''
         for i in range(len(g_functions)):
@@ -147,6 +144,7 @@ def main():
         else:
             # remove min height
             h = min(height_values)
+        # the interpolation tables are fit again after the heights change
         del GFunction_5m.g_lts[h]
         del GFunction_5m.r_b_values[h]
         del GFunction_5m.D_values[h]
@@ -1,3 +1,67 @@
 # Jack C. Cook
 # Thursday, February 4, 2020
 
+"""
+**interpolation_2D.py**
+
+This example focuses on 2D interpolation over B/H and r_b/H ratios. A field
+is computed for two borehole radii at each height, and the g-function of a
+borehole radius between them is interpolated on the grid of B/H and r_b/H
+ratios. The interpolation is compared to the g-function computed with
+pygfunction, and to the analytic borehole radius correction.
+"""
+
+import gFunctionDatabase as gfdb
+
+
+def main():
+    # Use Eskilson's 27 logarithmic times
+    log_time = gfdb.utilities.Eskilson_log_times()
+    alpha = 1.0e-06
+    B = 5.
+    coordinates = gfdb.coordinates.rectangle(3, 4, B, B)
+
+    # Compute the g-functions for r_b/H = 0.0005 and 0.002 at each height
+    H_values = [24., 48., 96., 192., 384.]
+    r_b_over_H_values = [0.0005, 0.002]
+    D_values, heights, r_b_values = [], [], []
+    for H in H_values:
+        for r_b_over_H in r_b_over_H_values:
+            D_values.append(2.)
+            heights.append(H)
+            r_b_values.append(r_b_over_H * H)
+    nSegments = [12] * len(heights)
+    g_data = gfdb.Management.application.\
+        uniform_temperature_uniform_segment_lengths(
+            D_values, heights, r_b_values, B, log_time, alpha, coordinates,
+            nSegments)
+    GFunction = gfdb.Management.application.GFunction(
+        **gfdb.Management.application.GFunction.
+        configure_database_file_for_usage(g_data))
+    print('Grid of {} by height and {}/H ratio'.format(
+        GFunction.variations['g'].shape[:2], GFunction.variations['axis']))
+
+    # The design has a B/H of 5/128 and a r_b/H of 0.001
+    H = 128.
+    r_b = 0.128
+    g, rb, D, H_eq, extrapolated = GFunction.g_function_interpolation_grid(
+        [B / H], r_b_over_H=r_b / H)
+
+    # The reference g-function
+    reference = gfdb.Management.application.\
+        uniform_temperature_uniform_segment_lengths(
+            [2.], [H], [r_b], B, log_time, alpha, coordinates, [12])
+    reference = list(reference['g'].values())[0]
+
+    # The analytic correction of the g-function interpolated by height only
+    g_1D, rb_1D, _, _ = GFunction.g_function_interpolation(B / H)
+    g_corrected = GFunction.borehole_radius_correction(g_1D, rb_1D, r_b)
+
+    print('Mean percent error of the 2D interpolation: {0:.3f}%'.format(
+        gfdb.statistics.mpe(reference, g[0].tolist())))
+    print('Mean percent error of the radius correction: {0:.3f}%'.format(
+        gfdb.statistics.mpe(reference, g_corrected)))
+
+
+if __name__ == '__main__':
+    main()
@@ -126,14 +126,18 @@ def main():
     # Evaluate the g-functions for the borefield
     # -------------------------------------------------------------------------
 
+    # The UHTR and UBWT g-functions are read from the g-function cache when
+    # they have been computed before
+    cache = gfdb.Management.gfunctioncache.gfunction_cache
+
     # Calculate the g-function for uniform heat extraction rate
-    gfunc_uniform_Q = gt.gfunction.gFunction(
-        boreField, alpha, time=time_arr, boundary_condition='UHTR',
+    g_uniform_Q = cache.g_function(
+        boreField, alpha, time_arr, boundary_condition='UHTR',
         options=options)
 
     # Calculate the g-function for uniform borehole wall temperature
-    gfunc_uniform_T = gt.gfunction.gFunction(
-        boreField, alpha, time=time_arr, boundary_condition='UBWT',
+    g_uniform_T = cache.g_function(
+        boreField, alpha, time_arr, boundary_condition='UBWT',
         options=options)
 
     # Create table providing variation of parameters to change effective
@@ -165,8 +169,8 @@ def main():
     ax.set_ylabel(r'$g$-function')
     gt.gfunction._format_axes(ax)
 
-    ax.plot(log_time, gfunc_uniform_Q.gFunc, label='UHF')
-    ax.plot(log_time, gfunc_uniform_T.gFunc, '--', label='UBHWT')
+    ax.plot(log_time, g_uniform_Q, label='UHF')
+    ax.plot(log_time, g_uniform_T, '--', label='UBHWT')
 
     for i in range(len(UIFT_gfunctions)):
         ax.plot(
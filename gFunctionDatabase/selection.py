@@ -0,0 +1,255 @@
+"""
+**selection.py**
+
+Select the best fields of an entire configuration library for a site, with
+the work split over a pool of worker processes.
+
+Every entry of the library (including the secondary entries of the two level
+configurations, i.e. the thickness variants of the U configuration) is checked
+against a rectangular lot and sized with
+:func:`gFunctionDatabase.sizing.size_fields`. The fields that fit on the lot
+and meet the temperature limits are ranked by their total borehole length.
+
+The workers read the fields from the binary library of the configuration,
+which each worker opens once as a memory map (see
+:func:`gFunctionDatabase.General.binaryio.bin_r`), so the library is neither
+decoded by every worker nor pickled to them. Only the keys of each chunk of
+entries are sent to a worker, and only the ranked results are sent back.
+"""
+
+import concurrent.futures
+import heapq
+import os
+
+import numpy as np
+
+from . import General
+from . import sizing
+from .Management import retrieval
+
+
+# the library opened by a worker process, see _open_library
+_library = None
+
+
+def _open_library(path_to_binary: str) -> None:
+    # the initializer of a worker process
+    global _library
+    _library = General.binaryio.bin_r(path_to_binary, arrays=True)
+
+
+def library_entries(library) -> list:
+    """
+    List the entries of a binary library as (primary key, secondary key)
+    tuples, the secondary key is None in a library with one level. The
+    entries are ordered by their number of boreholes, which is read from the
+    header of the library.
+    """
+    entries = []
+    for primary_key, entry in library.entries.items():
+        if 'g_keys' in entry:
+            entries.append((entry['bore_locations'][1], primary_key, None))
+        else:
+            for secondary_key, record in entry.items():
+                entries.append((record['bore_locations'][1], primary_key,
+                                secondary_key))
+    entries.sort(key=lambda entry: entry[0])
+    return [(primary_key, secondary_key)
+            for _, primary_key, secondary_key in entries]
+
+
+def entry_name(primary_key: str, secondary_key: str = None) -> str:
+    """
+    The name of a library entry, primary or primary/secondary.
+    """
+    if secondary_key is None:
+        return primary_key
+    return primary_key + '/' + secondary_key
+
+
+def fits_lot(bore_locations, lot: tuple) -> bool:
+    """
+    Check if the boreholes fit on a rectangular lot of (width, length) in
+    meters, in either orientation.
+    """
+    extent = np.ptp(np.asarray(bore_locations, dtype=float), axis=0)
+    width, length = sorted(extent)
+    lot_width, lot_length = sorted(lot)
+    return bool(width <= lot_width and length <= lot_length)
+
+
+def evaluate_entries(entries: list, settings: dict, library=None) -> tuple:
+    """
+    Check a chunk of library entries against the lot and size the fields that
+    fit. This is the task run by each worker process.
+
+    Parameters
+    ----------
+    entries: list
+        The (primary key, secondary key) tuples of the chunk
+    settings: dict
+        The keyword arguments of :func:`select_fields` that are passed on to
+        :func:`gFunctionDatabase.sizing.size_fields`, and the lot
+    library: BinaryLibrary (optional)
+        The library, defaults to the library opened by the worker
+
+    Returns
+    -------
+    (results, n_evaluated): tuple
+        The feasible fields of the chunk as dictionaries with the key, H,
+        nbh and total_length, and the number of entries that fit on the lot
+    """
+    if library is None:
+        library = _library
+    settings = dict(settings)
+    lot = settings.pop('lot')
+    B = settings.get('B')
+    fields = {}
+    for primary_key, secondary_key in entries:
+        field = library[primary_key]
+        if secondary_key is not None:
+            field = field[secondary_key]
+        if lot is not None:
+            scale = 1. if B is None else B / field['B']
+            if not fits_lot(field['bore_locations'] * scale, lot):
+                continue
+        fields[entry_name(primary_key, secondary_key)] = field
+    if len(fields) == 0:
+        return [], 0
+
+    sizes = sizing.size_fields(fields, **settings)
+    results = []
+    for i in np.flatnonzero(sizes['feasible']):
+        results.append({'key': sizes['keys'][i], 'H': float(sizes['H'][i]),
+                        'nbh': int(sizes['nbh'][i]),
+                        'total_length': float(sizes['total_length'][i])})
+    return results, len(fields)
+
+
+def select_fields(configuration: str, loads, durations, k_s: float,
+                  alpha: float, T_g: float, R_b: float, T_min: float,
+                  T_max: float, lot: tuple = None, B: float = None,
+                  H_min: float = None, H_max: float = None,
+                  kind: str = 'default', top_k: int = 10,
+                  patience: int = None, workers: int = None,
+                  chunk_size: int = None):
+    """
+    Rank the fields of a configuration library by their total borehole
+    length. The ranking is streamed back as the chunks of entries are
+    evaluated.
+
+    Parameters
+    ----------
+    configuration: str
+        The database configuration, i.e. L, U, rectangle
+    loads, durations, k_s, alpha, T_g, R_b, T_min, T_max:
+        The design loads and the ground and borehole properties, see
+        :func:`gFunctionDatabase.sizing.size_fields`
+    lot: tuple (optional)
+        The (width, length) of the lot (m). The extent of the boreholes must
+        fit on the lot in either orientation.
+    B, H_min, H_max, kind: (optional)
+        The spacing (m), the depth limits (m) and the interpolation kind, see
+        :func:`gFunctionDatabase.sizing.size_fields`
+    top_k: int (optional)
+        The number of fields to rank
+    patience: int (optional)
+        Stop once the top_k fields have not changed for this many completed
+        chunks. The entries are evaluated in the order of their number of
+        boreholes, so a large library can be cut short once the compact
+        fields have been ranked. By default every entry is evaluated.
+    workers: int (optional)
+        The number of worker processes, defaults to the number of CPUs. A
+        single worker evaluates the entries in this process.
+    chunk_size: int (optional)
+        The number of entries sent to a worker at once, defaults to splitting
+        the library into 8 chunks per worker
+
+    Yields
+    -------
+    ranking: dict
+        After each chunk, the 'ranked' fields (a list of dictionaries with the
+        key, H, nbh and total_length, shortest total length first), the
+        number of entries 'completed', 'evaluated' (those that fit on the
+        lot) and 'total' in the library, and whether the ranking is 'final'.
+
+    Examples
+    ---------
+    >>> import gFunctionDatabase as gfdb
+    >>> for ranking in gfdb.selection.select_fields(
+    ...         'L', [[40.0e3, 80.0e3, 160.0e3]],
+    ...         [10 * 365 * 86400., 30 * 86400., 6 * 3600.], k_s=2.,
+    ...         alpha=1.0e-06, T_g=12., R_b=0.15, T_min=0., T_max=35.,
+    ...         lot=(60., 100.), top_k=5):
+    ...     pass
+    >>> best = ranking['ranked'][0]
+    """
+    base_retrieval = retrieval.BaseRetrieval()
+    # the binary library is built if it is missing or out of date
+    library = base_retrieval.read_data(configuration, 'binary', arrays=True)
+    entries = library_entries(library)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(entries) // (8 * workers)))
+    chunks = [entries[i:i + chunk_size]
+              for i in range(0, len(entries), chunk_size)]
+    settings = {'loads': loads, 'durations': durations, 'k_s': k_s,
+                'alpha': alpha, 'T_g': T_g, 'R_b': R_b, 'T_min': T_min,
+                'T_max': T_max, 'B': B, 'H_min': H_min, 'H_max': H_max,
+                'kind': kind, 'lot': lot}
+
+    # the top_k fields as a heap of (-total_length, key, result)
+    heap = []
+    completed = 0
+    evaluated = 0
+    unchanged = 0
+
+    def rank(chunk, results, n_evaluated):
+        nonlocal completed, evaluated, unchanged
+        completed += len(chunk)
+        evaluated += n_evaluated
+        changed = False
+        for result in results:
+            item = (-result['total_length'], result['key'], result)
+            if len(heap) < top_k:
+                heapq.heappush(heap, item)
+                changed = True
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+                changed = True
+        unchanged = 0 if changed else unchanged + 1
+        stable = patience is not None and len(heap) == top_k and \
+            unchanged >= patience
+        ranking = {'ranked': [item[2] for item in sorted(heap, reverse=True)],
+                   'completed': completed, 'evaluated': evaluated,
+                   'total': len(entries),
+                   'final': completed == len(entries) or stable}
+        return ranking
+
+    if workers == 1:
+        for chunk in chunks:
+            ranking = rank(chunk, *evaluate_entries(chunk, settings,
+                                                    library=library))
+            yield ranking
+            if ranking['final']:
+                return
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_open_library,
+            initargs=(library.file_path, )) as pool:
+        futures = {pool.submit(evaluate_entries, chunk, settings): chunk
+                   for chunk in chunks}
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                ranking = rank(futures[future], *future.result())
+                yield ranking
+                if ranking['final']:
+                    return
+        finally:
+            # the chunks that have not started are dropped on early
+            # termination, or when the caller stops iterating
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,508 @@
+"""
+**server.py**
+
+A local query server that holds the database configurations in memory, and a
+lightweight client for it, using only the standard library http modules.
+
+The server loads the configurations once and keeps the interpolants of the
+fields that have been requested, so any number of scripts and notebooks can
+share one warm copy of the libraries rather than each loading its own.
+
+Endpoints
+----------
+    GET  /configurations
+    GET  /query_database?configuration=L
+    GET  /retrieve?configuration=L&N=5&M=8
+    GET  /interpolate?configuration=L&N=5&M=8&B_over_H=0.05&kind=default
+    POST /retrieve/batch      {"configuration": "L", "fields": [[N, M], ...]}
+    POST /interpolate/batch   {"configuration": "L", "kind": "default",
+                               "requests": [[N, M, B_over_H], ...]}
+
+The single requests are answered with json. The batch requests are answered
+with an array payload (see :func:`pack_arrays`): a little endian uint32 header
+length, a json header describing each array and the float64 values of the
+arrays.
+
+Usage
+------
+    python -m gFunctionDatabase.server --port 8642 --configurations L U
+"""
+
+import argparse
+import collections
+import http.client
+import http.server
+import json
+import struct
+import threading
+import urllib.parse
+
+import numpy as np
+
+from gFunctionDatabase import General
+from gFunctionDatabase import Management
+
+
+DEFAULT_PORT = 8642
+HEADER_LENGTH = struct.Struct('<I')
+DTYPE = np.dtype('<f8')
+
+
+def pack_arrays(arrays: dict, meta: dict = None) -> bytes:
+    """
+    Pack named arrays into an array payload.
+
+    Parameters
+    ----------
+    arrays: dict
+        The arrays keyed by name, converted to float64
+    meta: dict (optional)
+        Other json serializable information to put in the header
+
+    Returns
+    -------
+    payload: bytes
+        The header length, the json header and the float64 values
+    """
+    header = {'arrays': [], 'meta': meta or {}}
+    values = []
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array, dtype=DTYPE)
+        header['arrays'].append({'name': name, 'shape': list(array.shape),
+                                 'offset': offset})
+        values.append(array.tobytes())
+        offset += array.size
+    header = json.dumps(header).encode('utf-8')
+    return HEADER_LENGTH.pack(len(header)) + header + b''.join(values)
+
+
+def unpack_arrays(payload: bytes):
+    """
+    Unpack an array payload created by :func:`pack_arrays`.
+
+    Returns
+    -------
+    (arrays, meta): tuple
+        The arrays keyed by name and the meta information of the header
+    """
+    header_length, = HEADER_LENGTH.unpack_from(payload)
+    start = HEADER_LENGTH.size + header_length
+    header = json.loads(payload[HEADER_LENGTH.size:start].decode('utf-8'))
+    values = np.frombuffer(payload, dtype=DTYPE, offset=start)
+    arrays = {}
+    for entry in header['arrays']:
+        size = int(np.prod(entry['shape']))
+        arrays[entry['name']] = values[entry['offset']:entry['offset'] + size]\
+            .reshape(entry['shape'])
+    return arrays, header['meta']
+
+
+class LibraryServer:
+    """
+    The database configurations and the interpolants held by a server.
+
+    Parameters
+    ----------
+    configurations : list (optional)
+        The configurations to load, defaults to every registered configuration
+    storage : str (optional)
+        The storage format to read the configurations from, see
+        :func:`gFunctionDatabase.Management.retrieval.BaseRetrieval.load_data`
+    max_interpolants : int (optional)
+        The number of fields to keep the interpolants of, the interpolants of
+        the least recently used field are discarded.
+    """
+    def __init__(self, configurations: list = None, storage: str = 'json',
+                 max_interpolants: int = 4096):
+        if configurations is None:
+            configurations = list(
+                Management.retrieval.BaseRetrieval().registry.keys())
+        self.retrievals = {}
+        for configuration in configurations:
+            retrieve = Management.retrieval.Retrieve(configuration,
+                                                     storage=storage)
+            retrieve.boundary_index()
+            self.retrievals[configuration] = retrieve
+        self.max_interpolants = max_interpolants
+        # The GFunction of each field that has been interpolated and the
+        # lock its interpolants are fit under, keyed by field in least
+        # recently used order
+        self.interpolants = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def retrieval(self, configuration: str):
+        try:
+            return self.retrievals[configuration]
+        except KeyError:
+            raise KeyError('The configuration ' + str(configuration) +
+                           ' is not loaded by the server.')
+
+    def query_database(self, configuration: str) -> dict:
+        return self.retrieval(configuration).query_database()
+
+    def retrieve(self, configuration: str, N: int, M: int) -> dict:
+        return self.retrieval(configuration).retrieve(N, M)
+
+    def interpolant(self, key: str, field: dict):
+        """
+        Return the GFunction of a field, which keeps the interpolation tables
+        that have been fit to it, and the lock to hold while it is used. The
+        requests are answered in several threads, and a GFunction fits its
+        interpolants when they are first used.
+
+        Returns
+        -------
+        (g_function, lock): tuple
+            The GFunction and its threading.Lock
+        """
+        with self._lock:
+            if key in self.interpolants:
+                self.interpolants.move_to_end(key)
+                return self.interpolants[key]
+        g_function = Management.application.GFunction(
+            **Management.application.GFunction.
+            configure_database_file_for_usage(field))
+        with self._lock:
+            # another thread may have published the field in the meantime
+            if key not in self.interpolants:
+                self.interpolants[key] = (g_function, threading.Lock())
+                while len(self.interpolants) > self.max_interpolants:
+                    self.interpolants.popitem(last=False)
+            return self.interpolants[key]
+
+    def interpolate(self, configuration: str, N: int, M: int,
+                    B_over_H: float, kind: str = 'default') -> dict:
+        """
+        Interpolate each field stored for NxM at a B/H ratio.
+
+        Returns
+        -------
+        interpolations: dict
+            The g-function, rb, D, H_eq and whether extrapolation was used
+            for each field, keyed the same as the dictionary returned by
+            :func:`retrieve`
+        """
+        data = self.retrieve(configuration, N, M)
+        interpolations = {}
+        for key in data:
+            g_function, lock = self.interpolant(key, data[key])
+            with lock:
+                g, rb, D, H_eq, extrapolated = g_function.\
+                    g_function_interpolation_batch([B_over_H], kind=kind)
+            interpolations[key] = {
+                'g': g[0].tolist(), 'rb': float(rb[0]),
+                'H_eq': float(H_eq[0]),
+                'D': None if np.isnan(D[0]) else float(D[0]),
+                'extrapolated': bool(extrapolated[0])}
+        return interpolations
+
+    def retrieve_batch(self, configuration: str, fields: list):
+        """
+        Retrieve a batch of fields as arrays, named
+        '<field key>/<array>' after the keys of
+        :func:`gFunctionDatabase.General.fileio.field_arrays`.
+
+        Returns
+        -------
+        (arrays, meta): tuple
+            The arrays and the field keys retrieved for each NxM
+        """
+        arrays = {}
+        keys = []
+        for N, M in fields:
+            data = self.retrieve(configuration, N, M)
+            keys.append(list(data.keys()))
+            for key, field in data.items():
+                if 'H' not in field:
+                    field = General.fileio.content_to_arrays(field)
+                for name in ['B', 'g', 'logtime', 'bore_locations', 'H',
+                             'r_b', 'D']:
+                    arrays[key + '/' + name] = field[name]
+        return arrays, {'keys': keys}
+
+    def interpolate_batch(self, configuration: str, requests: list,
+                          kind: str = 'default'):
+        """
+        Interpolate a batch of (N, M, B/H) requests as arrays. Each row of
+        the arrays is one interpolated field, and the 'request' array holds the
+        index of the request the row belongs to.
+
+        Returns
+        -------
+        (arrays, meta): tuple
+            The g (rows, n_times), rb, D (nan if the field has no D), H_eq,
+            extrapolated (1. or 0.) and request arrays, and the field key of
+            each row
+        """
+        rows = {'g': [], 'rb': [], 'D': [], 'H_eq': [], 'extrapolated': [],
+                'request': []}
+        keys = []
+        for i, (N, M, B_over_H) in enumerate(requests):
+            interpolations = self.interpolate(configuration, N, M, B_over_H,
+                                              kind=kind)
+            for key, interpolation in interpolations.items():
+                keys.append(key)
+                rows['g'].append(interpolation['g'])
+                rows['rb'].append(interpolation['rb'])
+                D = interpolation['D']
+                rows['D'].append(np.nan if D is None else D)
+                rows['H_eq'].append(interpolation['H_eq'])
+                rows['extrapolated'].append(
+                    float(interpolation['extrapolated']))
+                rows['request'].append(i)
+        return rows, {'keys': keys}
+
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answer the requests of a :class:`LibraryServer`, see the endpoints in
+    the module documentation.
+    """
+    protocol_version = 'HTTP/1.1'
+    # the headers and the body are written separately, which would otherwise
+    # wait on the delayed acknowledgement of the client
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, obj):
+        self.send(status, json.dumps(obj).encode('utf-8'), 'application/json')
+
+    def answer(self, method):
+        try:
+            status, body, content_type = method()
+        except KeyError as error:
+            self.send_json(404, {'error': str(error.args[0])})
+        except (ValueError, TypeError) as error:
+            self.send_json(400, {'error': str(error)})
+        except Exception as error:
+            self.send_json(500, {'error': type(error).__name__ + ': ' +
+                                 str(error)})
+        else:
+            self.send(status, body, content_type)
+
+    def do_GET(self):
+        self.answer(self.get)
+
+    def do_POST(self):
+        self.answer(self.post)
+
+    @staticmethod
+    def parameter(query: dict, name: str, cast=str):
+        if name not in query:
+            raise ValueError('The parameter ' + name + ' is required.')
+        return cast(query[name])
+
+    def get(self):
+        library = self.server.library
+        url = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if url.path == '/configurations':
+            result = list(library.retrievals.keys())
+        elif url.path == '/query_database':
+            boundaries = library.query_database(
+                self.parameter(query, 'configuration'))
+            result = {str(N): boundary for N, boundary in boundaries.items()}
+        elif url.path == '/retrieve':
+            result = library.retrieve(self.parameter(query, 'configuration'),
+                                      self.parameter(query, 'N', int),
+                                      self.parameter(query, 'M', int))
+        elif url.path == '/interpolate':
+            result = library.interpolate(
+                self.parameter(query, 'configuration'),
+                self.parameter(query, 'N', int),
+                self.parameter(query, 'M', int),
+                self.parameter(query, 'B_over_H', float),
+                kind=query.get('kind', 'default'))
+        else:
+            raise KeyError('The path ' + url.path + ' is not an endpoint.')
+        return 200, json.dumps(result).encode('utf-8'), 'application/json'
+
+    def post(self):
+        library = self.server.library
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length))
+        if self.path == '/retrieve/batch':
+            arrays, meta = library.retrieve_batch(
+                self.parameter(request, 'configuration'),
+                self.parameter(request, 'fields', list))
+        elif self.path == '/interpolate/batch':
+            arrays, meta = library.interpolate_batch(
+                self.parameter(request, 'configuration'),
+                self.parameter(request, 'requests', list),
+                kind=request.get('kind', 'default'))
+        else:
+            raise KeyError('The path ' + self.path + ' is not an endpoint.')
+        return 200, pack_arrays(arrays, meta), 'application/octet-stream'
+
+
+class Server(http.server.ThreadingHTTPServer):
+    """
+    A threaded HTTP server of a :class:`LibraryServer`.
+
+    Parameters
+    ----------
+    library : LibraryServer
+        The configurations served
+    host : str (optional)
+        The address to listen on
+    port : int (optional)
+        The port to listen on, 0 selects a free port
+
+    Examples
+    ---------
+    >>> from gFunctionDatabase import server
+    >>> library = server.LibraryServer(['L'])
+    >>> with server.Server(library, port=0) as httpd:
+    ...     thread = httpd.start()
+    ...     client = server.Client(port=httpd.server_address[1])
+    ...     field = client.retrieve('L', 5, 8)
+    ...     httpd.shutdown()
+    """
+    daemon_threads = True
+
+    def __init__(self, library: LibraryServer, host: str = '127.0.0.1',
+                 port: int = DEFAULT_PORT):
+        super().__init__((host, port), RequestHandler)
+        self.library = library
+
+    def start(self) -> threading.Thread:
+        """
+        Serve requests in a background thread, until :func:`shutdown`.
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class Client:
+    """
+    A client of a :class:`Server`. The client keeps one connection open, so
+    each thread should use its own client.
+
+    Parameters
+    ----------
+    host : str (optional)
+        The address of the server
+    port : int (optional)
+        The port of the server
+    timeout : float (optional)
+        The timeout of a request in seconds
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                 timeout: float = 60.):
+        self.connection = http.client.HTTPConnection(host, port,
+                                                     timeout=timeout)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def request(self, method: str, path: str, body: bytes = None) -> bytes:
+        headers = {}
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        payload = response.read()
+        if response.status == 404:
+            raise KeyError(json.loads(payload)['error'])
+        elif response.status == 500:
+            raise RuntimeError(json.loads(payload)['error'])
+        elif response.status != 200:
+            raise ValueError(json.loads(payload)['error'])
+        return payload
+
+    def get(self, endpoint: str, **parameters):
+        path = '/' + endpoint
+        if len(parameters) > 0:
+            path += '?' + urllib.parse.urlencode(parameters)
+        return json.loads(self.request('GET', path))
+
+    def post(self, endpoint: str, request: dict):
+        return unpack_arrays(self.request(
+            'POST', '/' + endpoint, json.dumps(request).encode('utf-8')))
+
+    def configurations(self) -> list:
+        return self.get('configurations')
+
+    def query_database(self, configuration: str) -> dict:
+        """
+        See :func:`gFunctionDatabase.Management.retrieval.Retrieve.
+        query_database`.
+        """
+        boundaries = self.get('query_database', configuration=configuration)
+        return {int(N): [tuple(start), tuple(stop)]
+                for N, (start, stop) in boundaries.items()}
+
+    def retrieve(self, configuration: str, N: int, M: int) -> dict:
+        """
+        See :func:`gFunctionDatabase.Management.retrieval.Retrieve.retrieve`.
+        """
+        return self.get('retrieve', configuration=configuration, N=N, M=M)
+
+    def interpolate(self, configuration: str, N: int, M: int,
+                    B_over_H: float, kind: str = 'default') -> dict:
+        """
+        See :func:`LibraryServer.interpolate`.
+        """
+        return self.get('interpolate', configuration=configuration, N=N, M=M,
+                        B_over_H=B_over_H, kind=kind)
+
+    def retrieve_batch(self, configuration: str, fields: list):
+        """
+        See :func:`LibraryServer.retrieve_batch`.
+        """
+        return self.post('retrieve/batch', {'configuration': configuration,
+                                            'fields': fields})
+
+    def interpolate_batch(self, configuration: str, requests: list,
+                          kind: str = 'default'):
+        """
+        See :func:`LibraryServer.interpolate_batch`.
+        """
+        return self.post('interpolate/batch',
+                         {'configuration': configuration, 'kind': kind,
+                          'requests': requests})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m gFunctionDatabase.server',
+        description='Serve the g-function database configurations from '
+                    'memory.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--configurations', nargs='*',
+                        help='the configurations to load, defaults to all')
+    parser.add_argument('--storage', default='json',
+                        choices=['json', 'binary', 'lazy', 'sqlite'])
+    args = parser.parse_args(argv)
+
+    library = LibraryServer(args.configurations, storage=args.storage)
+    with Server(library, host=args.host, port=args.port) as httpd:
+        print('Serving {} on http://{}:{}'.format(
+            ', '.join(library.retrievals), *httpd.server_address[:2]))
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    main()
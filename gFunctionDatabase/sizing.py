@@ -0,0 +1,249 @@
+"""
+**sizing.py**
+
+Size the borehole depth of many candidate fields at once.
+
+The ground loads are given as a sequence of load pulses that end at the design
+time, i.e. the annual average load over 10 years, the peak monthly load and
+the peak hourly load over 6 hours. The mean fluid temperature at the end of
+the last pulse is
+
+.. math::
+    T_f = T_g - \\dfrac{1}{2 \\pi k_s n_{bh} H} \\sum_{i} (Q_i - Q_{i-1})
+    g\\left(\\dfrac{t_{end} - t_i}{t_s}\\right) -
+    \\dfrac{Q_{last} R_b}{n_{bh} H}
+
+where the loads Q are the ground loads of the whole field (W, positive for
+heat extraction). The depth H of a field is the smallest depth for which the
+fluid temperature of every design case is within the limits.
+
+The fields are first pruned with the table g-function of their deepest
+height, which does not require fitting an interpolant, as a field that fails
+at the deepest height of the library fails at every height. The remaining
+fields are evaluated on a grid of depths with
+:func:`gFunctionDatabase.Management.application.GFunction.g_function_interpolation_batch`,
+the depth is bracketed between the last failing and the first passing depth
+of the grid, and the bracket is refined with a second grid. The temperatures
+of all of the fields are evaluated together as arrays.
+"""
+
+import math
+
+import numpy as np
+
+from .Management import application
+
+
+def _g_function(field) -> application.GFunction:
+    # a field from the database, either a GFunction or its retrieved data
+    if isinstance(field, application.GFunction):
+        return field
+    return application.GFunction(
+        **application.GFunction.configure_database_file_for_usage(field))
+
+
+def _g_rows(g_function: application.GFunction, H_eq, kind: str) -> tuple:
+    # the g-functions at equivalent heights and their r_b/H, the rows of the
+    # table are used as they are when every height is in the table
+    if all(h in g_function.g_lts for h in H_eq):
+        return (np.array([g_function.g_lts[h] for h in H_eq], dtype=float),
+                np.array([g_function.r_b_values[h] / h for h in H_eq],
+                         dtype=float))
+    g, r_b, _, H_eq, _ = g_function.g_function_interpolation_batch(
+        g_function.B / np.asarray(H_eq), kind=kind)
+    return g, r_b / H_eq
+
+
+def _evaluate_rows(log_times: list, rows: np.ndarray, r_b_over_H: np.ndarray,
+                   log_time: np.ndarray) -> np.ndarray:
+    # evaluate each row of g-functions at its own ln(t/ts) values, with one
+    # interpolant for the rows that share the same library ln(t/ts) values
+    groups = {}
+    for i, values in enumerate(log_times):
+        key = np.asarray(values, dtype=float).tobytes()
+        groups.setdefault(key, (values, []))[1].append(i)
+    g = np.empty(log_time.shape)
+    for values, indices in groups.values():
+        interpolant = application.LogTimeInterpolant(
+            values, rows[indices], r_b_over_H=r_b_over_H[indices])
+        g[indices] = interpolant.evaluate_rows(log_time[indices])
+    return g
+
+
+def _fluid_temperatures(g, H, nbh, loads, k_s: float, T_g: float,
+                        R_b: float) -> np.ndarray:
+    # g has the shape (n_fields, n_depths, n_pulses) and H has the shape
+    # (n_fields, n_depths), returns (n_fields, n_depths, n_cases)
+    steps = np.diff(loads, axis=1, prepend=0.)
+    length = (nbh[:, np.newaxis] * H)[..., np.newaxis]
+    delta_T_b = np.einsum('fhp,cp->fhc', g, steps) / (2 * math.pi * k_s)
+    return T_g - (delta_T_b + loads[:, -1] * R_b) / length
+
+
+def size_fields(fields: dict, loads, durations, k_s: float, alpha: float,
+                T_g: float, R_b: float, T_min: float, T_max: float,
+                B: float = None, H_min: float = None, H_max: float = None,
+                kind: str = 'default', n_grid: int = 16,
+                n_refine: int = 16) -> dict:
+    """
+    Find the smallest borehole depth of each candidate field for which the
+    mean fluid temperature is within the limits.
+
+    Parameters
+    ----------
+    fields: dict
+        The candidate fields keyed by name. Each is a
+        :class:`gFunctionDatabase.Management.application.GFunction` or a field
+        as retrieved from the database (either format), i.e. the dictionary
+        returned by :func:`gFunctionDatabase.Management.retrieval.Retrieve.retrieve`
+        or by load_data for a configuration with one level.
+    loads: array_like
+        The ground loads of the whole field (W), positive for heat extraction,
+        as one sequence of load pulses or as an (n_cases, n_pulses) array of
+        design cases (i.e. a heating and a cooling case)
+    durations: array_like
+        The duration of each load pulse (s)
+    k_s: float
+        The ground thermal conductivity (W/m.K)
+    alpha: float
+        The ground thermal diffusivity (m2/s)
+    T_g: float
+        The undisturbed ground temperature (degC)
+    R_b: float
+        The effective borehole thermal resistance (m.K/W)
+    T_min: float
+        The minimum mean fluid temperature (degC)
+    T_max: float
+        The maximum mean fluid temperature (degC)
+    B: float (optional)
+        The borehole spacing (m), defaults to the spacing of each field
+    H_min: float (optional)
+        The minimum depth (m), defaults to the shortest height of each field
+    H_max: float (optional)
+        The maximum depth (m), defaults to the tallest height of each field
+    kind: str (optional)
+        The interpolation kind over B/H
+    n_grid: int (optional)
+        The number of depths that bracket the depth of each field
+    n_refine: int (optional)
+        The number of depths that refine each bracket
+
+    Returns
+    -------
+    sizes: dict
+        The 'keys' of the fields and the arrays 'H' (the depth, nan if the
+        field is infeasible), 'nbh', 'total_length' (nbh H), 'feasible' and
+        'pruned' (infeasible at the maximum depth, so the field was not fully
+        evaluated). A field that is feasible at its minimum depth is given
+        the minimum depth.
+    """
+    loads = np.atleast_2d(np.asarray(loads, dtype=float))
+    durations = np.asarray(durations, dtype=float)
+    if loads.shape[1] != len(durations):
+        raise ValueError('A duration is required for each load pulse.')
+    if T_min >= T_max:
+        raise ValueError('The minimum fluid temperature must be less than '
+                         'the maximum fluid temperature.')
+    # the time from the start of each pulse to the end of the last pulse
+    elapsed = np.cumsum(durations[::-1])[::-1]
+
+    keys = list(fields.keys())
+    g_functions = [_g_function(fields[key]) for key in keys]
+    log_times = [g_function.log_time for g_function in g_functions]
+    nbh = np.array([len(g_function.bore_locations)
+                    for g_function in g_functions], dtype=float)
+    spacing = np.array([g_function.B for g_function in g_functions],
+                       dtype=float)
+    if B is None:
+        scale = np.ones(len(keys))
+    else:
+        scale = B / spacing
+    # H = H_eq B / B_field, where H_eq is the height in the library
+    lower = np.array([min(g_function.g_lts) for g_function in g_functions],
+                     dtype=float) * scale
+    upper = np.array([max(g_function.g_lts) for g_function in g_functions],
+                     dtype=float) * scale
+    if H_min is not None:
+        lower = np.maximum(lower, H_min)
+    if H_max is not None:
+        upper = np.minimum(upper, H_max)
+
+    def excess(indices, H):
+        # the largest violation of the temperature limits (K) of the fields
+        # at the depths H, of the shape (len(indices), n_depths)
+        H_eq = H / scale[indices, np.newaxis]
+        rows, r_b_over_H = zip(*[_g_rows(g_functions[i], H_eq[j], kind)
+                                 for j, i in enumerate(indices)])
+        n_depths = H.shape[1]
+        log_time = np.log(elapsed / (H.reshape(-1, 1) ** 2 / (9 * alpha)))
+        g = _evaluate_rows([log_times[i] for i in indices
+                            for _ in range(n_depths)], np.concatenate(rows),
+                           np.concatenate(r_b_over_H), log_time)
+        T_f = _fluid_temperatures(g.reshape(H.shape + (-1, )), H,
+                                  nbh[indices], loads, k_s, T_g, R_b)
+        return np.maximum(T_min - T_f, T_f - T_max).max(axis=-1)
+
+    H = np.full(len(keys), np.nan)
+    # a field that fails at its maximum depth fails at every depth
+    pruned = lower > upper
+    candidates = np.flatnonzero(~pruned)
+    if len(candidates) > 0:
+        pruned[candidates] = excess(candidates,
+                                    upper[candidates, np.newaxis])[:, 0] > 0
+
+    indices = np.flatnonzero(~pruned)
+    for refine, n_depths in [(False, n_grid), (True, n_refine)]:
+        if len(indices) == 0:
+            break
+        fractions = np.linspace(0., 1., n_depths)
+        depths = lower[indices, np.newaxis] * \
+            (upper[indices] / lower[indices])[:, np.newaxis] ** fractions
+        violation = excess(indices, depths)
+        # the first passing depth, the last depth passes unless the
+        # interpolation differs from the table by rounding
+        violation[:, -1] = np.minimum(violation[:, -1], 0.)
+        first = np.argmax(violation <= 0., axis=1)
+        rows = np.arange(len(indices))
+        H[indices] = depths[rows, first]
+        if refine:
+            # interpolate the depth at which the violation is zero
+            bracketed = first > 0
+            before = violation[rows, first - 1]
+            after = violation[rows, first]
+            weight = np.where(bracketed, before / (before - after), 1.)
+            H[indices] = np.where(
+                bracketed,
+                depths[rows, first - 1] +
+                weight * (depths[rows, first] - depths[rows, first - 1]),
+                H[indices])
+        else:
+            # refine the brackets of the fields that do not pass at the
+            # minimum depth
+            bracketed = first > 0
+            lower[indices[bracketed]] = depths[rows, first - 1][bracketed]
+            upper[indices[bracketed]] = depths[rows, first][bracketed]
+            indices = indices[bracketed]
+
+    return {'keys': keys, 'H': H, 'nbh': nbh, 'total_length': nbh * H,
+            'feasible': ~np.isnan(H), 'pruned': pruned}
+
+
+def fluid_temperature(field, H: float, loads, durations, k_s: float,
+                      alpha: float, T_g: float, R_b: float,
+                      B: float = None, kind: str = 'default') -> np.ndarray:
+    """
+    Compute the mean fluid temperature of a field at the end of the design
+    load pulses, see :func:`size_fields`.
+
+    Returns
+    -------
+    T_f: numpy.ndarray
+        The mean fluid temperature (degC) of each design case
+    """
+    g_function = _g_function(field)
+    loads = np.atleast_2d(np.asarray(loads, dtype=float))
+    elapsed = np.cumsum(np.asarray(durations, dtype=float)[::-1])[::-1]
+    g = g_function.g_function_at(H, alpha, time=elapsed, B=B, kind=kind)
+    nbh = np.array([len(g_function.bore_locations)], dtype=float)
+    return _fluid_temperatures(g.reshape(1, 1, -1), np.array([[H]]), nbh,
+                               loads, k_s, T_g, R_b)[0, 0]
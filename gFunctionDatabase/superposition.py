@@ -0,0 +1,250 @@
+"""
+**superposition.py**
+
+Temporal superposition of ground loads with the g-functions of the database,
+giving the borehole wall temperature of a field through time.
+
+The borehole wall temperature after n load steps is
+
+.. math::
+    T_b(t_n) = T_g - \\dfrac{1}{2 \\pi k_s} \\sum_{i=1}^{n} (q_i - q_{i-1})
+    g\\left(\\dfrac{t_n - t_{i-1}}{t_s}\\right)
+
+where the loads q are the heat extraction rates per unit length of borehole
+(W/m, positive for heat extraction, as in pygfunction). Evaluated directly,
+the sum is O(n^2). For uniform time steps the sum is a convolution, which is
+computed with an FFT in O(n log n). For variable time steps the past loads are
+aggregated into cells that grow with their age, so that each step sums over
+O(log n) cells.
+"""
+
+import math
+
+import numpy as np
+from scipy.signal import fftconvolve
+
+from .Management import application
+
+
+def step_response(g_function, H: float, alpha: float, B: float = None,
+                  kind: str = 'default'):
+    """
+    Create a function that returns the g-function at times in seconds.
+
+    Parameters
+    ----------
+    g_function: GFunction, LogTimeInterpolant or callable
+        A field from the database
+        (:class:`gFunctionDatabase.Management.application.GFunction`), a
+        g-function curve interpolated in ln(t/ts)
+        (:class:`gFunctionDatabase.Management.application.LogTimeInterpolant`)
+        or a function of the time in seconds
+    H: float
+        The borehole height (m)
+    alpha: float
+        The ground thermal diffusivity (m2/s)
+    B: float (optional)
+        The borehole spacing (m) of a GFunction, defaults to its spacing
+    kind: str (optional)
+        The interpolation kind over B/H of a GFunction
+
+    Returns
+    -------
+    response: callable
+        A function of an array of times (s) that returns the g-function, which
+        is zero for times that are not positive.
+    """
+    if isinstance(g_function, application.GFunction):
+        def g(time):
+            return g_function.g_function_at(H, alpha, time=time, B=B,
+                                            kind=kind)
+    elif isinstance(g_function, application.LogTimeInterpolant):
+        t_s = H ** 2 / (9 * alpha)
+
+        def g(time):
+            return g_function(np.log(time / t_s))
+    elif callable(g_function):
+        g = g_function
+    else:
+        raise ValueError('The g-function must be a GFunction, a '
+                         'LogTimeInterpolant or a function of time.')
+
+    def response(time):
+        time = np.asarray(time, dtype=float)
+        values = np.zeros(time.shape)
+        positive = time > 0.
+        values[positive] = g(time[positive])
+        return values
+
+    return response
+
+
+def uniform_superposition(loads, g_values, k_s: float) -> np.ndarray:
+    """
+    Superpose loads of uniform time steps with an FFT convolution.
+
+    Parameters
+    ----------
+    loads: array_like
+        The load of each time step (W/m), positive for heat extraction
+    g_values: array_like
+        The g-function at the end of each time step, g(dt), g(2 dt), ...
+    k_s: float
+        The ground thermal conductivity (W/m.K)
+
+    Returns
+    -------
+    delta_T: numpy.ndarray
+        The drop of the borehole wall temperature at the end of each step (K)
+    """
+    loads = np.asarray(loads, dtype=float)
+    n = len(loads)
+    # the response to a load pulse of one time step
+    pulse = np.diff(np.asarray(g_values, dtype=float)[:n], prepend=0.)
+    return fftconvolve(loads, pulse)[:n] / (2 * math.pi * k_s)
+
+
+def naive_superposition(loads, g_values, k_s: float) -> np.ndarray:
+    """
+    Superpose loads of uniform time steps with the direct O(n^2) sum, see
+    :func:`uniform_superposition`. This is the reference the FFT convolution
+    is compared to.
+    """
+    loads = np.asarray(loads, dtype=float).tolist()
+    g_values = np.asarray(g_values, dtype=float).tolist()
+    n = len(loads)
+    delta_T = np.zeros(n)
+    for j in range(n):
+        total = 0.
+        previous = 0.
+        for i in range(j + 1):
+            total += (loads[i] - previous) * g_values[j - i]
+            previous = loads[i]
+        delta_T[j] = total / (2 * math.pi * k_s)
+    return delta_T
+
+
+def aggregated_superposition(loads, times, response, k_s: float,
+                             cells_per_level: int = 10) -> np.ndarray:
+    """
+    Superpose loads of variable time steps with load aggregation.
+
+    The loads are held in cells, which start at level 0. When a level holds
+    more than cells_per_level cells, its two oldest cells are merged into one
+    cell of the next level with their time weighted mean load, so that the
+    width of a cell grows with its age. The temperature at the end of each
+    step sums the response of O(cells_per_level log n) cells.
+
+    Parameters
+    ----------
+    loads: array_like
+        The load of each time step (W/m), positive for heat extraction
+    times: array_like
+        The time at the end of each time step (s), increasing from a start at
+        zero
+    response: callable
+        The g-function as a function of time, see :func:`step_response`
+    k_s: float
+        The ground thermal conductivity (W/m.K)
+    cells_per_level: int (optional)
+        The number of cells kept at each level, more cells are more accurate
+
+    Returns
+    -------
+    delta_T: numpy.ndarray
+        The drop of the borehole wall temperature at the end of each step (K)
+    """
+    loads = np.asarray(loads, dtype=float)
+    times = np.asarray(times, dtype=float)
+    if len(loads) != len(times):
+        raise ValueError('A time is required for the end of each load.')
+    if np.any(np.diff(times) <= 0.) or times[0] <= 0.:
+        raise ValueError('The times must be positive and increasing.')
+
+    # the cells, oldest first, which tile the time from zero to the end of
+    # the last step: the cells of a level follow those of the higher levels,
+    # so the two oldest cells of a level are neighbours of the cells of the
+    # next level and are merged in place
+    n_steps = len(loads)
+    capacity = min(n_steps, (cells_per_level + 1) *
+                   (int(np.log2(n_steps)) + 2))
+    edges = np.zeros(capacity + 1)
+    cell_loads = np.zeros(capacity)
+    # the number of cells of each level
+    counts = [0]
+    n_cells = 0
+    delta_T = np.zeros(n_steps)
+    for n in range(n_steps):
+        edges[n_cells + 1] = times[n]
+        cell_loads[n_cells] = loads[n]
+        n_cells += 1
+        counts[0] += 1
+        for level in range(len(counts)):
+            if counts[level] <= cells_per_level:
+                break
+            i = sum(counts[level + 1:])
+            a, b, c = edges[i:i + 3]
+            cell_loads[i] = (cell_loads[i] * (b - a) +
+                             cell_loads[i + 1] * (c - b)) / (c - a)
+            edges[i + 1:n_cells] = edges[i + 2:n_cells + 1]
+            cell_loads[i + 1:n_cells - 1] = cell_loads[i + 2:n_cells]
+            n_cells -= 1
+            counts[level] -= 2
+            if level + 1 == len(counts):
+                counts.append(0)
+            counts[level + 1] += 1
+
+        # the response at each edge, shared by the neighbouring cells
+        g = response(times[n] - edges[:n_cells + 1])
+        delta_T[n] = np.dot(cell_loads[:n_cells], g[:-1] - g[1:]) / \
+            (2 * math.pi * k_s)
+    return delta_T
+
+
+def borehole_wall_temperature(g_function, loads, k_s: float, alpha: float,
+                              H: float, T_g: float, dt: float = 3600.,
+                              times=None, B: float = None,
+                              kind: str = 'default',
+                              cells_per_level: int = 10) -> np.ndarray:
+    """
+    Compute the borehole wall temperature of a field through time.
+
+    Parameters
+    ----------
+    g_function: GFunction, LogTimeInterpolant or callable
+        The g-function of the field, see :func:`step_response`
+    loads: array_like
+        The load of each time step (W/m), positive for heat extraction
+    k_s: float
+        The ground thermal conductivity (W/m.K)
+    alpha: float
+        The ground thermal diffusivity (m2/s)
+    H: float
+        The borehole height (m)
+    T_g: float
+        The undisturbed ground temperature (degC)
+    dt: float (optional)
+        The uniform time step (s), superposed with an FFT convolution
+    times: array_like (optional)
+        The time at the end of each load (s) for variable time steps, which
+        are superposed with load aggregation. If given, dt is ignored.
+    B: float (optional)
+        The borehole spacing (m) of a GFunction, defaults to its spacing
+    kind: str (optional)
+        The interpolation kind over B/H of a GFunction
+    cells_per_level: int (optional)
+        The number of cells at each level of the load aggregation
+
+    Returns
+    -------
+    T_b: numpy.ndarray
+        The borehole wall temperature at the end of each step (degC)
+    """
+    response = step_response(g_function, H, alpha, B=B, kind=kind)
+    if times is None:
+        times = dt * np.arange(1, len(loads) + 1)
+        delta_T = uniform_superposition(loads, response(times), k_s)
+    else:
+        delta_T = aggregated_superposition(loads, times, response, k_s,
+                                           cells_per_level=cells_per_level)
+    return T_g - delta_T
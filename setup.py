@@ -61,6 +61,12 @@ setup(name='gFunctionDatabase',
       long_description_content_type='text/markdown',
       version='0.3',
       packages=find_packages(),
+      entry_points={
+          'console_scripts': [
+              'gfdb-convert=gFunctionDatabase.Management.convert:main',
+              'gfdb-build=gFunctionDatabase.Management.build:main',
+              'gfdb-ingest=gFunctionDatabase.Management.ingest:main',
+              'gfdb-server=gFunctionDatabase.server:main']},
       include_package_data=True,
       author='Jack C. Cook',
       author_email='jack.cook@okstate.edu',
@@ -0,0 +1,363 @@
+import unittest
+import warnings
+
+import numpy as np
+from scipy.interpolate import PchipInterpolator, interp1d, lagrange
+from scipy.special import exp1
+
+import gFunctionDatabase as gfdb
+
+
+class TestGFunctionInterpolation(unittest.TestCase):
+
+    def setUp(self):
+        retrieval = gfdb.Management.retrieval.Retrieve('L')
+        self.GFunction_input = gfdb.Management.application.GFunction.\
+            configure_database_file_for_usage(
+                retrieval.retrieve(5, 8)['L_5_8'])
+
+    def reference(self, B_over_H, kind):
+        # interpolate one ln(t/ts) at a time
+        H_eq = self.GFunction_input['B'] / B_over_H
+        g_lts = self.GFunction_input['g_lts']
+        x = list(g_lts.keys())
+        g_function = []
+        for i in range(len(self.GFunction_input['log_time'])):
+            y = [g_lts[key][i] for key in g_lts]
+            if kind == 'lagrange':
+                f = lagrange(x, y)
+            elif kind == 'pchip':
+                f = PchipInterpolator(x, y)
+            else:
+                f = interp1d(x, y, kind=kind, fill_value='extrapolate')
+            g_function.append(float(f(H_eq)))
+        return g_function
+
+    def test_vectorized_interpolation(self):
+        for kind in ['linear', 'quadratic', 'cubic', 'lagrange', 'pchip']:
+            for B_over_H in [0.05, 0.1, 0.3]:
+                g_function = gfdb.Management.application.GFunction(
+                    **self.GFunction_input)
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    g, rb, D, H_eq = g_function.\
+                        g_function_interpolation_array(B_over_H, kind=kind)
+                    g_list, _, _, _ = g_function.g_function_interpolation(
+                        B_over_H, kind=kind)
+                self.assertIsInstance(g, np.ndarray)
+                self.assertIsInstance(g_list, list)
+                self.assertEqual(g.tolist(), g_list)
+                np.testing.assert_allclose(
+                    g, self.reference(B_over_H, kind), rtol=1e-10)
+        # the Lagrange polynomial is evaluated in its barycentric form, which
+        # is not a kind of its own
+        with self.assertRaises(ValueError):
+            g_function.g_function_interpolation_array(0.05,
+                                                      kind='barycentric')
+
+    def test_batch_interpolation(self):
+        B_over_H_values = np.linspace(0.01, 0.3, 30)
+        g_function = gfdb.Management.application.GFunction(
+            **self.GFunction_input)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            g, rb, D, H_eq, extrapolated = g_function.\
+                g_function_interpolation_batch(B_over_H_values, kind='cubic')
+        self.assertEqual(len(caught), 0)
+        self.assertEqual(g.shape, (30, 27))
+        heights = list(self.GFunction_input['g_lts'].keys())
+        np.testing.assert_array_equal(
+            extrapolated, (H_eq < min(heights)) | (H_eq > max(heights)))
+        self.assertTrue(extrapolated.any() and not extrapolated.all())
+
+        for i, B_over_H in enumerate(B_over_H_values):
+            _g_function = gfdb.Management.application.GFunction(
+                **self.GFunction_input)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                _g, _rb, _D, _H_eq = _g_function.\
+                    g_function_interpolation_array(B_over_H, kind='cubic')
+            np.testing.assert_allclose(g[i], _g, rtol=1e-12)
+            self.assertAlmostEqual(rb[i], float(_rb), places=12)
+            self.assertAlmostEqual(D[i], float(_D), places=12)
+            self.assertEqual(H_eq[i], _H_eq)
+
+    def test_interpolant_cache(self):
+        g_function = gfdb.Management.application.GFunction(
+            **self.GFunction_input)
+        results = {}
+        for kind in ['linear', 'cubic', 'lagrange']:
+            results[kind] = g_function.g_function_interpolation_array(
+                0.05, kind=kind)[0]
+        self.assertEqual(set(g_function.interpolants.keys()),
+                         {('linear', False), ('cubic', False),
+                          ('lagrange', False)})
+        # a cached table is reused, and each kind has its own table
+        table = g_function.interpolation_table_for('cubic', False)
+        self.assertIs(table, g_function.interpolation_table_for('cubic',
+                                                                False))
+        self.assertFalse(np.array_equal(results['linear'], results['cubic']))
+        np.testing.assert_array_equal(
+            g_function.g_function_interpolation_array(0.05, kind='linear')[0],
+            results['linear'])
+
+        # removing a height invalidates the tables
+        height = max(g_function.g_lts.keys())
+        del g_function.g_lts[height]
+        del g_function.r_b_values[height]
+        del g_function.D_values[height]
+        self.assertIsNot(table, g_function.interpolation_table_for('cubic',
+                                                                   False))
+        reduced_input = dict(self.GFunction_input)
+        for name in ['g_lts', 'r_b_values', 'D_values']:
+            reduced_input[name] = {k: v for k, v in
+                                   self.GFunction_input[name].items()
+                                   if k != height}
+        expected = gfdb.Management.application.GFunction(**reduced_input)
+        np.testing.assert_array_equal(
+            g_function.g_function_interpolation_array(0.05, kind='cubic')[0],
+            expected.g_function_interpolation_array(0.05, kind='cubic')[0])
+
+        # so does assigning new data
+        g_function.g_lts = self.GFunction_input['g_lts']
+        self.assertEqual(g_function.interpolants, {})
+
+    def test_interpolation_coefficients(self):
+        g_function = gfdb.Management.application.GFunction(
+            **self.GFunction_input)
+        coefficients = g_function.interpolation_coefficients()
+
+        def fit_interpolation_table(kind, fill_value):
+            raise AssertionError('The interpolation table was fit.')
+
+        loaded = gfdb.Management.application.GFunction(
+            coefficients=coefficients, **self.GFunction_input)
+        loaded.fit_interpolation_table = fit_interpolation_table
+        for B_over_H in [0.01, 0.05, 0.2]:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                expected = g_function.g_function_interpolation_array(
+                    B_over_H)
+                result = loaded.g_function_interpolation_array(B_over_H)
+            np.testing.assert_allclose(result[0], expected[0], rtol=1e-12)
+            self.assertAlmostEqual(float(result[1]), float(expected[1]))
+            self.assertAlmostEqual(float(result[2]), float(expected[2]))
+
+        # the PCHIP kind is a piecewise polynomial as well
+        coefficients = g_function.interpolation_coefficients(kind='pchip')
+        loaded = gfdb.Management.application.GFunction(
+            coefficients=coefficients, **self.GFunction_input)
+        loaded.fit_interpolation_table = fit_interpolation_table
+        np.testing.assert_allclose(
+            loaded.g_function_interpolation_array(0.05, kind='pchip')[0],
+            g_function.g_function_interpolation_array(0.05, kind='pchip')[0],
+            rtol=1e-12)
+
+        coefficients['H'] = coefficients['H'][1:]
+        with self.assertRaises(ValueError):
+            gfdb.Management.application.GFunction(
+                coefficients=coefficients, **self.GFunction_input)
+
+    def test_g_function_at(self):
+        g_function = gfdb.Management.application.GFunction(
+            **self.GFunction_input)
+        H, alpha = 96., 1.0e-06
+        log_time = np.array(self.GFunction_input['log_time'])
+        # the library g-function is returned at the library ln(t/ts) values
+        g = g_function.g_function_at(H, alpha, log_time=log_time)
+        np.testing.assert_allclose(g, g_function.g_lts[96.], rtol=1e-12)
+
+        t_s = H ** 2 / (9 * alpha)
+        time = np.exp(np.linspace(-12., 5., 500)) * t_s
+        g = g_function.g_function_at(H, alpha, time=time)
+        self.assertEqual(g.shape, (500,))
+        self.assertTrue(np.all(np.diff(g) >= 0.))
+        self.assertTrue(np.all(g >= 0.))
+
+        # the interpolant of a B/H ratio is cached, and fit again when the
+        # data changes
+        interpolant = g_function.log_time_interpolant(g_function.B / H)
+        self.assertIs(interpolant,
+                      g_function.log_time_interpolant(g_function.B / H))
+        g_function.g_lts[96.] = [2 * value for value in g_function.g_lts[96.]]
+        self.assertIsNot(interpolant,
+                         g_function.log_time_interpolant(g_function.B / H))
+
+        with self.assertRaises(ValueError):
+            g_function.g_function_at(H, alpha)
+
+    def test_short_times(self):
+        # before the first ln(t/ts) value the g-function follows the infinite
+        # line source, 0.5 E1(r_b^2 / (4 alpha t))
+        g_function = gfdb.Management.application.GFunction(
+            **self.GFunction_input)
+        H, alpha = 96., 1.0e-06
+        _, rb, _, _ = g_function.g_function_interpolation(g_function.B / H)
+        time = np.array([600., 3600., 6 * 3600.])
+        g = g_function.g_function_at(H, alpha, time=time)
+        line_source = 0.5 * exp1(rb ** 2 / (4 * alpha * time))
+        np.testing.assert_allclose(g, line_source, rtol=2.0e-03)
+
+        log_time = np.linspace(-20., -8.5, 200)
+        g = g_function.g_function_at(H, alpha, log_time=log_time)
+        self.assertTrue(np.all(g > 0.))
+        self.assertTrue(np.all(np.diff(g) > 0.))
+        # continuous at the first library point
+        self.assertAlmostEqual(g[-1], g_function.g_lts[96.][0], places=12)
+
+        # the rows of an interpolant agree with the interpolant of each row
+        heights = [48., 96.]
+        rows = np.array([g_function.g_lts[h] for h in heights])
+        r_b_over_H = np.array([g_function.r_b_values[h] / h for h in heights])
+        interpolant = gfdb.Management.application.LogTimeInterpolant(
+            g_function.log_time, rows, r_b_over_H=r_b_over_H)
+        log_time = np.array([[-15., -9.], [-11., -1.]])
+        for i, h in enumerate(heights):
+            np.testing.assert_allclose(
+                interpolant.evaluate_rows(log_time)[i],
+                gfdb.Management.application.LogTimeInterpolant(
+                    g_function.log_time, rows[i],
+                    r_b_over_H=r_b_over_H[i])(log_time[i]), rtol=1e-12)
+
+        # without the borehole radius, the extension is flagged
+        interpolant = gfdb.Management.application.LogTimeInterpolant(
+            g_function.log_time, rows[0])
+        with self.assertWarns(UserWarning):
+            interpolant([-10.])
+
+    def grid_field(self, axis, ratios):
+        # a field with a g-function for each ratio at each height, in which
+        # g is linear in ln(r_b/H) or in D/H
+        retrieval = gfdb.Management.retrieval.Retrieve('L')
+        data = retrieval.retrieve(5, 8)['L_5_8']
+        field = {'bore_locations': data['bore_locations'],
+                 'logtime': data['logtime'], 'g': {}}
+        for key, g in data['g'].items():
+            B, H, r_b, D = gfdb.General.fileio.split_g_key(key)
+            D = 2. if D is None else D
+            for ratio in ratios:
+                if axis == 'r_b':
+                    values = [value - np.log(ratio * H / r_b) for value in g]
+                    key = '{}_{}_{}_{}'.format(B, H, ratio * H, D)
+                else:
+                    values = [value + 10. * ratio for value in g]
+                    key = '{}_{}_{}_{}'.format(B, H, r_b, ratio * H)
+                field['g'][key] = values
+        return gfdb.Management.application.GFunction(
+            **gfdb.Management.application.GFunction.
+            configure_database_file_for_usage(field))
+
+    def test_grid_interpolation(self):
+        B_over_H = np.array([0.03, 0.05, 0.1])
+        no_grid = gfdb.Management.application.GFunction(
+            **self.GFunction_input)
+        self.assertIsNone(no_grid.variations)
+        g, rb, _, H_eq, _ = no_grid.g_function_interpolation_batch(B_over_H)
+
+        # the radius grid gives the g-functions that are corrected to the
+        # r_b/H ratio at each height, both within and outside of the grid
+        field = self.grid_field('r_b', [0.0005, 0.001, 0.002])
+        self.assertEqual(field.variations['axis'], 'r_b')
+        self.assertEqual(field.variations['g'].shape, (5, 3, 27))
+        for r_b_over_H in [0.0008, 0.0015, 0.003]:
+            result = field.g_function_interpolation_grid(
+                B_over_H, r_b_over_H=r_b_over_H)
+            corrected_input = dict(self.GFunction_input)
+            corrected_input['g_lts'] = {
+                h: no_grid.borehole_radius_correction(
+                    values, no_grid.r_b_values[h], r_b_over_H * h)
+                for h, values in no_grid.g_lts.items()}
+            expected = gfdb.Management.application.GFunction(
+                **corrected_input).g_function_interpolation_batch(B_over_H)
+            np.testing.assert_allclose(result[0], expected[0], rtol=1e-9)
+            np.testing.assert_allclose(result[1], r_b_over_H * H_eq)
+
+            # without a grid, the interpolated g-function is corrected
+            grid_free = no_grid.g_function_interpolation_grid(
+                B_over_H, r_b_over_H=r_b_over_H)
+            corrected = [no_grid.borehole_radius_correction(
+                g[i], rb[i], r_b_over_H * H_eq[i]) for i in range(3)]
+            np.testing.assert_allclose(grid_free[0], corrected, rtol=1e-12)
+
+        # the burial depth grid is interpolated in D/H
+        field = self.grid_field('D', [0.01, 0.02, 0.04])
+        self.assertEqual(field.variations['axis'], 'D')
+        result = field.g_function_interpolation_grid(
+            B_over_H, D_over_H=[0.015, 0.03, 0.05])
+        np.testing.assert_allclose(
+            result[0], g + 10. * np.array([[0.015], [0.03], [0.04]]),
+            rtol=1e-9)
+        np.testing.assert_array_equal(result[4], [False, False, True])
+        with self.assertRaises(ValueError):
+            no_grid.g_function_interpolation_grid(B_over_H, D_over_H=0.02)
+
+    def test_grid_nominal_rows(self):
+        # the interpolation by B/H uses the g-function of each height that is
+        # nearest the library radius, or the burial depth of 2 m
+        application = gfdb.Management.application
+        field = self.grid_field('r_b', [0.0005, 0.001, 0.002])
+        nominal = np.interp(field.variations['heights'],
+                            application.LIBRARY_HEIGHTS,
+                            application.LIBRARY_RADII)
+        for i, h in enumerate(field.variations['heights']):
+            ratios = field.variations['ratios']
+            j = np.argmin(np.abs(np.log(ratios * h / nominal[i])))
+            self.assertAlmostEqual(field.r_b_values[h], ratios[j] * h)
+            np.testing.assert_array_equal(field.g_lts[h],
+                                          field.variations['g'][i, j])
+        # the radius of 384 m is not the last of the grid
+        self.assertAlmostEqual(field.r_b_values[384.], 0.192)
+
+        field = self.grid_field('D', [0.01, 0.02, 0.04])
+        self.assertAlmostEqual(field.D_values[24.], 0.96)
+        self.assertAlmostEqual(field.D_values[384.], 3.84)
+        np.testing.assert_array_equal(field.g_lts[384.],
+                                      field.variations['g'][4, 0])
+
+        # the array format uses the same rows
+        data = {'B': 5., 'logtime': field.log_time,
+                'bore_locations': field.bore_locations,
+                'H': np.repeat(field.variations['heights'], 3),
+                'r_b': np.full(15, 0.075),
+                'D': np.outer(field.variations['heights'],
+                              field.variations['ratios']).ravel(),
+                'g': field.variations['g'].reshape(15, -1)}
+        arrays = application.GFunction.configure_database_file_for_usage(data)
+        self.assertEqual(arrays['D_values'], dict(field.D_values))
+        for h in field.g_lts:
+            np.testing.assert_array_equal(arrays['g_lts'][h], field.g_lts[h])
+
+    def test_interpolation_kind(self):
+        kind = gfdb.Management.application.GFunction.interpolation_kind
+        self.assertEqual(kind('default', 5), 'cubic')
+        self.assertEqual(kind('default', 3), 'quadratic')
+        self.assertEqual(kind('cubic', 3), 'quadratic')
+        self.assertEqual(kind('pchip', 2), 'pchip')
+        with self.assertRaises(ValueError):
+            kind('linear', 1)
+        with self.assertRaises(ValueError):
+            kind('spline', 5)
+
+
+class TestUniformTemperature(unittest.TestCase):
+
+    def test_parallel_heights(self):
+        coordinates = gfdb.coordinates.rectangle(2, 2, 5., 5.)
+        log_time = gfdb.utilities.Eskilson_log_times()[::4]
+        args = ([2., 2., 2.], [24., 48., 96.], [0.075, 0.075, 0.1], 5.,
+                log_time, 1.0e-06, coordinates, [4, 4, 6])
+        application = gfdb.Management.application
+        serial = application.uniform_temperature_uniform_segment_lengths(
+            *args)
+        parallel = application.uniform_temperature_uniform_segment_lengths(
+            *args, workers=2)
+        self.assertEqual(list(parallel['g']), list(serial['g']))
+        for key in serial['g']:
+            np.testing.assert_allclose(parallel['g'][key], serial['g'][key])
+        self.assertEqual(parallel['logtime'], serial['logtime'])
+        with self.assertRaises(ValueError):
+            application.uniform_temperature_uniform_segment_lengths(
+                *args, workers=0)
+
+if __name__ == '__main__':
+    unittest.main()
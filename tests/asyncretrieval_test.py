@@ -0,0 +1,117 @@
+import asyncio
+import concurrent.futures
+import time
+import unittest
+
+import gFunctionDatabase as gfdb
+
+
+class TestAsyncRetrieve(unittest.TestCase):
+
+    def test_retrieve(self):
+        fields = [(2, 3), (7, 10), (10, 7), (32, 32)]
+
+        async def main():
+            async with gfdb.Management.asyncretrieval.AsyncRetrieve(
+                    'L', max_workers=2) as async_retrieval:
+                results = await asyncio.gather(
+                    *[async_retrieval.retrieve(N, M) for N, M in fields])
+                return results, async_retrieval.loads
+
+        results, loads = asyncio.run(main())
+        # the concurrent requests share one load of the library
+        self.assertEqual(loads, 1)
+        retrieval = gfdb.Management.retrieval.Retrieve('L', storage='binary')
+        for (N, M), result in zip(fields, results):
+            self.assertEqual(result, retrieval.retrieve(N, M))
+
+    def test_interpolate(self):
+        async def main():
+            async with gfdb.Management.asyncretrieval.AsyncRetrieve() as \
+                    async_retrieval:
+                with self.assertRaises(ValueError):
+                    await async_retrieval.retrieve(5, 5)
+                return await asyncio.gather(
+                    async_retrieval.interpolate('L', 5, 5, 0.05),
+                    async_retrieval.interpolate('L', 5, 8, 0.1))
+
+        results = asyncio.run(main())
+        retrieval = gfdb.Management.retrieval.Retrieve('L')
+        for (N, M, B_over_H), result in zip([(5, 5, 0.05), (5, 8, 0.1)],
+                                            results):
+            expected = gfdb.Management.asyncretrieval.interpolate_fields(
+                retrieval.retrieve(N, M), B_over_H)
+            self.assertEqual(list(result.keys()), list(expected.keys()))
+            for key in expected:
+                self.assertEqual(result[key][0], expected[key][0])
+                self.assertEqual(result[key][3], expected[key][3])
+
+    def test_worker_interpolants(self):
+        # the worker keeps the GFunction of each field it has interpolated
+        asyncretrieval = gfdb.Management.asyncretrieval
+        asyncretrieval._worker_g_functions.clear()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+
+        async def main():
+            async with asyncretrieval.AsyncRetrieve(
+                    interpolation_executor=executor,
+                    max_interpolants=2) as async_retrieval:
+                first = await async_retrieval.interpolate('L', 5, 8, 0.05)
+                g_functions = list(asyncretrieval._worker_g_functions.values())
+                second = await async_retrieval.interpolate('L', 5, 8, 0.1)
+                self.assertEqual(
+                    list(asyncretrieval._worker_g_functions.values()),
+                    g_functions)
+                await async_retrieval.interpolate('L', 3, 3, 0.1)
+                await async_retrieval.interpolate('L', 3, 4, 0.1)
+                return first, second
+
+        first, second = asyncio.run(main())
+        self.assertEqual(len(asyncretrieval._worker_g_functions), 2)
+        expected = asyncretrieval.interpolate_fields(
+            gfdb.Management.retrieval.Retrieve('L').retrieve(5, 8), 0.1)
+        self.assertEqual(second['L_5_8'][0], expected['L_5_8'][0])
+
+    def test_close_off_loop(self):
+        # the worker processes are waited for in a thread, so the event loop
+        # keeps running while they exit
+        class SlowExecutor(concurrent.futures.ThreadPoolExecutor):
+            def shutdown(self, wait=True, **kwargs):
+                time.sleep(0.2)
+                super().shutdown(wait=wait, **kwargs)
+
+        async def main():
+            ticks = []
+
+            async def tick():
+                while True:
+                    ticks.append(time.perf_counter())
+                    await asyncio.sleep(0.01)
+
+            ticker = asyncio.ensure_future(tick())
+            async with gfdb.Management.asyncretrieval.AsyncRetrieve() as \
+                    async_retrieval:
+                async_retrieval.interpolation_executor = SlowExecutor()
+                await asyncio.sleep(0.02)
+                start = len(ticks)
+            ticker.cancel()
+            return ticks[start:], async_retrieval.interpolation_executor
+
+        ticks, interpolation_executor = asyncio.run(main())
+        self.assertIsNone(interpolation_executor)
+        self.assertGreater(len(ticks), 5)
+
+    def test_missing_configuration(self):
+        async def main():
+            async with gfdb.Management.asyncretrieval.AsyncRetrieve() as \
+                    async_retrieval:
+                with self.assertRaises(KeyError):
+                    await async_retrieval.retrieve(5, 5, configuration='X')
+                self.assertEqual(async_retrieval._loading, {})
+
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+
+import gFunctionDatabase as gfdb
+
+
+def get_field(B, nbh):
+    bore_locations = [[B * i, 0.] for i in range(nbh)]
+    g = {'{}._{}._0.075'.format(B, H): [0.1 * H + i for i in range(27)]
+         for H in [24, 48, 96, 192, 384]}
+    logtime = gfdb.utilities.Eskilson_log_times()
+    return {'bore_locations': bore_locations, 'g': g, 'logtime': logtime}
+
+
+class TestBinaryIO(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'library.gfdb')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_one_level_round_trip(self):
+        library = {'1_2': get_field(5., 2), '2_3': get_field(5., 6)}
+        gfdb.General.binaryio.bin_dump(library, self.file_path)
+        binary_library = gfdb.General.binaryio.bin_r(self.file_path)
+        self.assertEqual(list(binary_library.keys()), ['1_2', '2_3'])
+        self.assertEqual(dict(binary_library), library)
+
+    def test_two_level_round_trip(self):
+        library = {'3_3': {'1': get_field(5., 8)},
+                   '3_4': {'1': get_field(5., 10), '2': get_field(5., 3)}}
+        gfdb.General.binaryio.bin_dump(library, self.file_path)
+        binary_library = gfdb.General.binaryio.bin_r(self.file_path)
+        self.assertIn('3_4', binary_library)
+        self.assertEqual(list(binary_library['3_4'].keys()), ['1', '2'])
+        self.assertEqual(binary_library['3_4']['2'], library['3_4']['2'])
+
+    def test_coefficients(self):
+        library = {'1_2': get_field(5, 2), '2_3': get_field(5, 6)}
+        gfdb.General.binaryio.bin_dump(
+            library, self.file_path,
+            coefficients=gfdb.Management.application.field_coefficients)
+        binary_library = gfdb.General.binaryio.bin_r(self.file_path)
+        field = binary_library['2_3']
+        self.assertEqual(field['g'], library['2_3']['g'])
+        expected = gfdb.Management.application.field_coefficients(
+            library['2_3'])
+        self.assertEqual(field['coefficients']['kind'], 'cubic')
+        for name in ['H', 'breakpoints', 'g', 'r_b', 'D']:
+            self.assertEqual(field['coefficients'][name],
+                             expected[name].tolist())
+
+        binary_library = gfdb.General.binaryio.bin_r(self.file_path,
+                                                     arrays=True)
+        self.assertEqual(binary_library['1_2']['coefficients']['g'].shape,
+                         (4, 2, 27))
+
+    def test_not_a_library(self):
+        with open(self.file_path, 'wb') as f:
+            f.write(b'\x00' * 64)
+        with self.assertRaises(ValueError):
+            gfdb.General.binaryio.bin_r(self.file_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import gFunctionDatabase as gfdb
+from gFunctionDatabase.Management import build
+
+
+class TestBuildLibrary(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.checkpoint = os.path.join(self.directory.name, 'L.jsonl')
+        self.output = os.path.join(self.directory.name, 'L_5m.json')
+        # a small and fast build
+        self.settings = {'N_max': 3, 'heights': [24., 48.],
+                         'r_b': [0.075, 0.075], 'nSegments': 2,
+                         'log_time': gfdb.utilities.Eskilson_log_times()[::6]}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def build(self, configuration='L', **kwargs):
+        settings = dict(self.settings)
+        settings.update(kwargs)
+        return build.build_library(
+            configuration, self.checkpoint, **settings)
+
+    def test_entries(self):
+        entries = build.configuration_entries
+        self.assertEqual([entry[:2] for entry in entries('L', 3)],
+                         [('2_2', None), ('2_3', None), ('3_3', None)])
+        self.assertEqual([entry[:2] for entry in entries('U', 4)],
+                         [('3_3', '1'), ('3_4', '1'), ('4_3', '1'),
+                          ('4_4', '1')])
+        self.assertEqual(len(entries('U', 4)[1][2]), 9)
+        # the interior of a zoned rectangle is smaller than a full rectangle
+        zoned = [entry[:2] for entry in entries('zoned', 5)]
+        self.assertIn(('5_5', '3_2'), zoned)
+        self.assertIn(('5_5', '1_1'), zoned)
+        self.assertNotIn(('5_5', '3_3'), zoned)
+        with self.assertRaises(ValueError):
+            entries('C', 3)
+
+    def test_resume(self):
+        # interrupt the build after the first field
+        run = self.build(workers=1)
+        first = next(run)
+        run.close()
+        self.assertEqual(first['completed'], 1)
+        self.assertEqual(first['key'], '3_3')  # the largest field first
+        # a field that was being written when the build was interrupted
+        with open(self.checkpoint, 'a') as file:
+            file.write('{"key": "2_3", "secondary_key": null, "fie')
+
+        progress = list(self.build(workers=1, path_to_output=self.output))
+        self.assertEqual([value['key'] for value in progress],
+                         ['2_3', '2_2', None])
+        self.assertEqual(progress[0]['resumed'], 1)
+        self.assertEqual(progress[1]['eta'], 0.)
+        self.assertTrue(progress[-1]['final'])
+
+        settings, records = build.read_checkpoint(self.checkpoint)
+        self.assertEqual(len(records), 3)
+        library = gfdb.General.fileio.js_r(self.output)
+        self.assertEqual(list(library.keys()), ['2_2', '2_3', '3_3'])
+
+        # the library fields are those computed directly
+        coordinates = gfdb.coordinates.L_shape(2, 3, 5., 5.)
+        expected = gfdb.Management.application.\
+            uniform_temperature_uniform_segment_lengths(
+                [2., 2.], [24., 48.], [0.075, 0.075], 5.,
+                self.settings['log_time'], 1.0e-06, coordinates, [2, 2])
+        self.assertEqual(library['2_3']['g'], expected['g'])
+        np.testing.assert_array_equal(library['2_3']['bore_locations'],
+                                      coordinates)
+        g_function = gfdb.Management.application.GFunction(
+            **gfdb.Management.application.GFunction.
+            configure_database_file_for_usage(library['3_3']))
+        self.assertEqual(list(g_function.g_lts.keys()), [24., 48.])
+
+        # a finished build is only assembled again
+        self.assertEqual(len(list(self.build(path_to_output=self.output))),
+                         1)
+        with self.assertRaises(ValueError):
+            next(self.build(nSegments=4))
+
+    def test_parallel(self):
+        serial = os.path.join(self.directory.name, 'serial.json')
+        list(self.build('zoned', N_max=4, workers=2,
+                        path_to_output=self.output))
+        self.checkpoint = os.path.join(self.directory.name, 'serial.jsonl')
+        list(self.build('zoned', N_max=4, workers=1, path_to_output=serial))
+        with open(self.output) as file:
+            parallel_library = json.load(file)
+        self.assertEqual(parallel_library, gfdb.General.fileio.js_r(serial))
+        self.assertEqual(list(parallel_library['4_4'].keys()),
+                         ['1_1', '1_2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import gFunctionDatabase as gfdb
+from gFunctionDatabase.Management import convert
+
+
+class TestConvert(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        registry = gfdb.Management.data_definition.BaseDefinition().registry
+        self.source = os.path.join(self.tmp_dir.name,
+                                   'L_configurations_5m.json')
+        shutil.copyfile(registry['L'], self.source)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        for target in convert.TARGETS:
+            path_to_output = os.path.join(self.tmp_dir.name,
+                                          'converted.' + target)
+            report = convert.convert(
+                source=self.source, levels=1, target=target,
+                path_to_output=path_to_output, workers=2)
+            self.assertEqual(report['mismatches'], [])
+            self.assertTrue(
+                gfdb.Management.data_definition.verify_manifest(
+                    path_to_output))
+
+    def test_mismatch(self):
+        path_to_output = os.path.join(self.tmp_dir.name, 'L.gfdb')
+        convert.convert(
+            source=self.source, levels=1, target='binary',
+            path_to_output=path_to_output, check=False)
+        library = gfdb.General.fileio.js_r(self.source)
+        key = list(library['7_10']['g'].keys())[0]
+        library['7_10']['g'][key][0] += 1.0e-15
+        gfdb.General.binaryio.bin_dump(library, path_to_output)
+        mismatches = convert.verify(
+            self.source, 1, 'binary', path_to_output, 'L', workers=1)
+        self.assertEqual(mismatches, ['7_10'])
+
+    def test_manifest_folder(self):
+        data_definition = gfdb.Management.data_definition
+        registry = data_definition.BaseDefinition().registry
+        path_to_data = os.path.dirname(registry['L'])
+        data_manifest = os.path.join(path_to_data, data_definition.MANIFEST)
+        before = os.stat(data_manifest).st_mtime_ns \
+            if os.path.isfile(data_manifest) else None
+        with mock.patch.dict(os.environ, {
+                'GFDB_LIBRARY_CACHE_DIR': self.tmp_dir.name}):
+            report = convert.convert('L', target='sqlite', workers=1)
+        # the manifest is written beside the converted library
+        folder = os.path.dirname(report['output'])
+        self.assertTrue(folder.startswith(self.tmp_dir.name))
+        self.assertTrue(data_definition.verify_manifest(report['output']))
+        self.assertTrue(data_definition.verify_manifest(
+            registry['L'], path_to_folder=folder))
+        data_definition.BaseDefinition.register_database(
+            verify=True, manifest_folder=folder)
+        after = os.stat(data_manifest).st_mtime_ns \
+            if os.path.isfile(data_manifest) else None
+        self.assertEqual(before, after)
+
+    def test_manifest(self):
+        gfdb.Management.data_definition.update_manifest([self.source])
+        self.assertTrue(
+            gfdb.Management.data_definition.verify_manifest(self.source))
+        with open(self.source, 'r+') as f:
+            f.seek(10)
+            character = f.read(1)
+            f.seek(10)
+            f.write('9' if character != '9' else '8')
+        with self.assertRaises(ValueError):
+            gfdb.Management.data_definition.verify_manifest(self.source)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+
+import gFunctionDatabase as gfdb
+
+
+class TestCoordinates(unittest.TestCase):
+
+    def test_U_shape(self):
+        U = gfdb.coordinates.U_shape(4, 3, 5., 5.)
+        self.assertEqual(sorted(U),
+                         [(0., 0.), (0., 5.), (0., 10.), (5., 0.), (10., 0.),
+                          (15., 0.), (15., 5.), (15., 10.)])
+        # the sides of a U are the same length
+        left = [(x, y) for x, y in U if x == 0.]
+        right = [(x, y) for x, y in U if x == 15.]
+        self.assertEqual([y for _, y in left], [y for _, y in right])
+        # a U without sides is a rectangle
+        self.assertEqual(gfdb.coordinates.U_shape(4, 1, 5., 5.),
+                         gfdb.coordinates.rectangle(4, 1, 5., 5.))
+
+
+if __name__ == '__main__':
+    unittest.main()
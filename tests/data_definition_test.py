@@ -1,4 +1,5 @@
 import unittest
+from unittest import mock
 
 import gFunctionDatabase as gfdb
 
@@ -18,3 +19,16 @@ class TestDataDefinition(unittest.TestCase):
     def test_registry_keys(self):
         available_registry_keys = list(get_current_registry().keys())
         self.assertEqual(available_registry_keys, self.registry_keys)
+
+    def test_cached_registry(self):
+        data_definition = gfdb.Management.data_definition
+        data_definition.clear_registry()
+        with mock.patch.object(gfdb.Data.available, 'find_data_files',
+                               wraps=gfdb.Data.available.find_data_files) \
+                as find_data_files:
+            first = get_current_registry()
+            first['L'] = 'L_configurations_5m.json'
+            second = get_current_registry()
+        self.assertEqual(find_data_files.call_count, 1)
+        self.assertEqual(second,
+                         data_definition.BaseDefinition.register_database())
@@ -0,0 +1,45 @@
+import os
+import tempfile
+import unittest
+
+import gFunctionDatabase as gfdb
+
+
+class TestCompressedJson(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.d = {'3_3': {'bore_locations': [[0.0, 0.0], [5.0, 0.0]],
+                          'g': {'5._24._0.075': [2.835159810088887, 3.5]},
+                          'logtime': [-8.5, 3.003]}}
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        for file_ext in ['json', 'json.gz', 'json.xz']:
+            file_path = os.path.join(self.tmp_dir.name, 'library.' + file_ext)
+            gfdb.General.fileio.js_dump(self.d, file_path)
+            self.assertEqual(gfdb.General.fileio.js_r(file_path), self.d)
+
+    def test_list_directory_files(self):
+        for file_name in ['a.json', 'b.json.gz', 'c.json.xz', 'a.json.idx']:
+            gfdb.General.fileio.js_dump(
+                self.d, os.path.join(self.tmp_dir.name, file_name))
+        files = gfdb.General.fileio.list_directory_files(self.tmp_dir.name,
+                                                         file_ext='json.gz')
+        self.assertEqual(files, ['b.json.gz'])
+        files = gfdb.General.fileio.list_directory_files(self.tmp_dir.name,
+                                                         file_ext='json')
+        self.assertEqual(files, ['a.json'])
+
+    def test_unknown_extension(self):
+        file_path = os.path.join(self.tmp_dir.name, 'library.json.bz2')
+        with open(file_path, 'w') as f:
+            f.write('{}')
+        with self.assertRaises(ValueError):
+            gfdb.General.fileio.js_r(file_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
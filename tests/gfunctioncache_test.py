@@ -0,0 +1,101 @@
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+import pygfunction as gt
+
+import gFunctionDatabase as gfdb
+
+
+class TestGFunctionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = gfdb.Management.gfunctioncache.GFunctionCache(
+            directory=os.path.join(self.directory.name, 'gfunctions'))
+        self.coordinates = gfdb.coordinates.rectangle(2, 2, 5., 5.)
+        self.log_time = gfdb.utilities.Eskilson_log_times()[::4]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def compute(self, **kwargs):
+        return gfdb.Management.application.\
+            uniform_temperature_uniform_segment_lengths(
+                [2., 2.], [24., 48.], [0.075, 0.075], 5., self.log_time,
+                1.0e-06, self.coordinates, [4, 4], **kwargs)
+
+    def test_solve_key(self):
+        key = gfdb.Management.gfunctioncache.solve_key
+        field = gt.boreholes.rectangle_field(2, 2, 5., 5., 96., 2., 0.075)
+        time_values = [1.0e6, 1.0e8]
+        reference = key(field, 1.0e-06, time_values, 'UBWT',
+                        options={'nSegments': 4})
+        self.assertEqual(len(reference), 64)
+        # equal inputs described differently have the same key
+        self.assertEqual(
+            reference,
+            key(gt.boreholes.rectangle_field(2, 2, 5., 5., 96., 2., 0.075),
+                1.0e-06, np.array(time_values), 'ubwt',
+                options={'disp': True, 'nSegments': 4}))
+        # each input is part of the key
+        for other in [
+                key(field, 1.0e-06, time_values, 'UBWT',
+                    options={'nSegments': 8}),
+                key(field, 1.0e-06, [1.0e6, 2.0e8], 'UBWT',
+                    options={'nSegments': 4}),
+                key(field, 2.0e-06, time_values, 'UBWT',
+                    options={'nSegments': 4}),
+                key(field, 1.0e-06, time_values, 'UHTR',
+                    options={'nSegments': 4}),
+                key(field[:-1], 1.0e-06, time_values, 'UBWT',
+                    options={'nSegments': 4}),
+                key(gt.boreholes.rectangle_field(2, 2, 5., 5., 96., 2., 0.1),
+                    1.0e-06, time_values, 'UBWT', options={'nSegments': 4})]:
+            self.assertNotEqual(other, reference)
+        with self.assertRaises(ValueError):
+            key([(96., 2., 0.075, 0., 0.)], 1.0e-06, time_values, 'UBWT')
+
+    def test_cached_computation(self):
+        expected = self.compute()
+        first = self.compute(cache=self.cache)
+        self.assertEqual(self.cache.statistics()['misses'], 2)
+        self.assertEqual(self.cache.statistics()['files'], 2)
+        second = self.compute(cache=self.cache)
+        self.assertEqual(self.cache.statistics()['hits'], 2)
+        self.assertEqual(second, first)
+        self.assertEqual(second, expected)
+
+        field = [gt.boreholes.Borehole(48., 2., 0.075, x, y)
+                 for x, y in self.coordinates]
+        t_s = 48. ** 2 / (9 * 1.0e-06)
+        time_values = np.exp(np.array(self.log_time)) * t_s
+        g = self.cache.g_function(field, 1.0e-06, time_values,
+                                  options={'nSegments': 4, 'disp': False})
+        np.testing.assert_array_equal(g, expected['g']['5.0_48.0_0.075_2.0'])
+        self.assertEqual(self.cache.statistics()['hits'], 3)
+
+        with self.assertRaises(ValueError):
+            self.compute(cache='cache')
+
+    def test_eviction(self):
+        self.compute(cache=self.cache)
+        files = self.cache.files()
+        self.assertEqual(len(files), 2)
+        # use the oldest file, so that the other file is least recently used
+        oldest = files[0][2]
+        time.sleep(0.01)
+        key = os.path.basename(oldest)[:-len('.json')]
+        self.assertIsNotNone(self.cache.get(key))
+        self.cache.resize(files[0][1] + 1)
+        self.assertEqual([file[2] for file in self.cache.files()], [oldest])
+        self.assertEqual(self.cache.statistics()['evictions'], 1)
+
+        self.cache.clear()
+        self.assertEqual(self.cache.statistics()['files'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
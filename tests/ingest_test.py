@@ -0,0 +1,88 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+import gFunctionDatabase as gfdb
+from gFunctionDatabase.Management import ingest
+
+
+PARTIAL_LIBRARIES = os.path.join(
+    os.path.dirname(gfdb.__file__), 'Data', 'examples', 'Partial_Libraries')
+
+
+class TestIngest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self.directory.name, 'zoned')
+        shutil.copytree(os.path.join(PARTIAL_LIBRARIES,
+                                     'Zoned_Rectangle_Output_Partial'),
+                        self.folder)
+        # a file that does not follow the cpgfunction naming
+        os.rename(os.path.join(self.folder, 'ZRect_4_x_6_1_x_3.json'),
+                  os.path.join(self.folder, 'field_17.json'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_keys(self):
+        key = ingest.key_from_file_name
+        self.assertEqual(key('a/ZRect_4_x_9_1_x_6.json', 'zoned'),
+                         ('4_9', '1_6'))
+        self.assertEqual(key('U_7_x_12_3.json.xz', 'U'), ('7_12', '3'))
+        self.assertEqual(key('ORect_5_x_24_2.json', 'Open'), ('5_24', '2'))
+        self.assertEqual(key('Rect_4_x_3.json', 'rectangle'), ('3_4', None))
+        self.assertEqual(key('Line_44.json', 'rectangle'), ('1_44', None))
+        self.assertIsNone(key('field_17.json', 'zoned'))
+        with self.assertRaises(ValueError):
+            key('C_3_x_3.json', 'C')
+
+        field = gfdb.General.fileio.js_r(
+            os.path.join(PARTIAL_LIBRARIES, 'U_Output_Partial',
+                         'U_5_x_19_2.json'))
+        self.assertEqual(ingest.key_from_features(field, 'U'),
+                         ('5_19', '2'))
+
+    def test_ingest_folder(self):
+        outputs = []
+        for workers in [1, 2]:
+            output = os.path.join(self.directory.name,
+                                  'zoned_{}.json'.format(workers))
+            report_path = os.path.join(self.directory.name, 'report.csv')
+            report = ingest.ingest_folder(self.folder, 'zoned', output,
+                                          path_to_report=report_path,
+                                          workers=workers)
+            outputs.append(gfdb.General.fileio.js_r(output))
+        library = outputs[0]
+        self.assertEqual(outputs[1], library)
+        self.assertEqual(report['fields'], 27)
+        self.assertEqual(report['inconsistent'], [])
+        self.assertEqual(list(library.keys())[:3], ['4_4', '4_5', '4_6'])
+        self.assertEqual(list(library['4_6'].keys()),
+                         ['1_1', '1_2', '1_3', '2_3'])
+        self.assertEqual(
+            library['4_9']['1_6'],
+            gfdb.General.fileio.js_r(
+                os.path.join(self.folder, 'ZRect_4_x_9_1_x_6.json')))
+
+        with open(report_path, newline='') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(list(rows[0].keys()), ingest.REPORT_COLUMNS)
+        recognized = [row for row in rows
+                      if row['recognized_by'] == 'features']
+        self.assertEqual(len(recognized), 1)
+        self.assertEqual((recognized[0]['key'],
+                          recognized[0]['secondary_key']), ('4_6', '1_3'))
+        self.assertEqual(recognized[0]['heights'], '24 48 96 192 384')
+
+        # two files of the same field
+        shutil.copy(os.path.join(self.folder, 'field_17.json'),
+                    os.path.join(self.folder, 'field_18.json'))
+        with self.assertRaises(ValueError):
+            ingest.ingest_folder(self.folder, 'zoned', output, workers=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
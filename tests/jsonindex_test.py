@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+import unittest
+
+import gFunctionDatabase as gfdb
+
+
+class TestJsonIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'library.json')
+        self.library = {
+            '3_3': {'1': {'bore_locations': [[0.0, 0.0]], 'g': {},
+                          'logtime': [-8.5]}},
+            '3_4': {'1': {'bore_locations': [[0.0, 0.0], [5.0, 0.0]],
+                          'g': {'5._24._0.075': [1.5, 2.5]},
+                          'logtime': [-8.5, 3.003]},
+                    '2': {'bore_locations': [[1.0, 2.0]],
+                          'g': {'5._48._0.075': [3.5, 4.5]},
+                          'logtime': [-8.5, 3.003]}}}
+        # pretty print so that the scanner has to handle whitespace
+        with open(self.file_path, 'w') as f:
+            json.dump(self.library, f, indent=2)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_two_level_index(self):
+        index = gfdb.General.jsonindex.js_index(self.file_path, 2)
+        lazy_library = gfdb.General.jsonindex.IndexedJsonLibrary(
+            self.file_path, index)
+        self.assertEqual(list(lazy_library.keys()), ['3_3', '3_4'])
+        self.assertEqual(lazy_library['3_4']['2'], self.library['3_4']['2'])
+        self.assertEqual(
+            gfdb.General.jsonindex.read_range(self.file_path,
+                                              index['entries']['3_4']),
+            self.library['3_4'])
+
+    def test_one_level_index(self):
+        index = gfdb.General.jsonindex.js_index(self.file_path, 1)
+        lazy_library = gfdb.General.jsonindex.IndexedJsonLibrary(
+            self.file_path, index)
+        self.assertEqual(dict(lazy_library), self.library)
+
+    def test_stale_index(self):
+        index = gfdb.General.jsonindex.js_index(self.file_path, 2)
+        with open(self.file_path, 'a') as f:
+            f.write('\n')
+        with self.assertRaises(ValueError):
+            gfdb.General.jsonindex.IndexedJsonLibrary(self.file_path, index)
+
+    def test_source_stamp(self):
+        index = gfdb.General.jsonindex.js_index(self.file_path, 2)
+        self.assertEqual(index['source'],
+                         gfdb.General.fileio.source_stamp(self.file_path))
+        # an index is stale when the modification time differs, even if the
+        # library is older than the index
+        mtime_ns = index['source']['mtime_ns'] - 10 ** 9
+        os.utime(self.file_path, ns=(mtime_ns, mtime_ns))
+        self.assertNotEqual(index['source'],
+                            gfdb.General.fileio.source_stamp(self.file_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,11 @@
+import os
+import sqlite3
+import tempfile
 import unittest
+from unittest import mock
 
 import gFunctionDatabase as gfdb
+from gFunctionDatabase.Management import build
 
 
 class TestRetrieval(unittest.TestCase):
@@ -23,3 +28,307 @@ class TestRetrieval(unittest.TestCase):
             current_configuration_count[key] = count
             del configuration
         self.assertEqual(current_configuration_count, self.configuration_count)
+
+
+class TestRetrievalStorage(unittest.TestCase):
+
+    def test_binary_storage(self):
+        json_retrieval = gfdb.Management.retrieval.Retrieve('L')
+        binary_retrieval = \
+            gfdb.Management.retrieval.Retrieve('L', storage='binary')
+        self.assertEqual(json_retrieval.query_database(),
+                         binary_retrieval.query_database())
+        for N, M in [(2, 3), (7, 10), (10, 7), (32, 32)]:
+            self.assertEqual(json_retrieval.retrieve(N, M),
+                             binary_retrieval.retrieve(N, M))
+
+    def test_field_not_in_library(self):
+        retrieval = gfdb.Management.retrieval.Retrieve('L')
+        library_boundaries = retrieval.query_database()
+        self.assertEqual(library_boundaries, retrieval.scan_boundaries())
+        N = max(library_boundaries)
+        M = library_boundaries[N][1][1]
+        retrieval.retrieve(N, M)
+        for N_out, M_out in [(N, M + 1), (1, 1), (0, M)]:
+            with self.assertRaises(ValueError):
+                retrieval.retrieve(N_out, M_out)
+
+    def test_lazy_storage(self):
+        json_retrieval = gfdb.Management.retrieval.Retrieve('L')
+        lazy_retrieval = \
+            gfdb.Management.retrieval.Retrieve('L', storage='lazy')
+        self.assertEqual(list(json_retrieval.data.keys()),
+                         list(lazy_retrieval.data.keys()))
+        for N, M in [(2, 3), (7, 10), (10, 7), (32, 32)]:
+            self.assertEqual(json_retrieval.retrieve(N, M),
+                             lazy_retrieval.retrieve(N, M))
+
+
+class TestDerivedFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_directory = os.path.join(self.tmp_dir.name, 'cache')
+        self.base_retrieval = gfdb.Management.retrieval.BaseRetrieval(
+            cache_directory=self.cache_directory)
+        library = gfdb.General.fileio.js_r(
+            self.base_retrieval.registry['L'])
+        self.library = {key: library[key] for key in ['2_3', '3_3']}
+        self.source = os.path.join(self.tmp_dir.name,
+                                   'L_configurations_5m.json')
+        gfdb.General.fileio.js_dump(self.library, self.source)
+        self.base_retrieval.registry['L'] = self.source
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def replace_source(self, library, older_than: str):
+        # a package upgrade installs a library with an older modification
+        # time than the files derived from the previous library
+        gfdb.General.fileio.js_dump(library, self.source)
+        mtime_ns = os.stat(older_than).st_mtime_ns - 10 ** 9
+        os.utime(self.source, ns=(mtime_ns, mtime_ns))
+
+    def test_cache_directory(self):
+        for path in [self.base_retrieval.binary_path('L'),
+                     self.base_retrieval.index_path('L'),
+                     self.base_retrieval.database_path()]:
+            self.assertEqual(os.path.dirname(os.path.dirname(path)),
+                             self.cache_directory)
+        self.base_retrieval.read_data('L', 'binary')
+        self.assertTrue(os.path.isfile(self.base_retrieval.binary_path('L')))
+
+    def test_stale_binary(self):
+        binary = self.base_retrieval.read_data('L', 'binary')
+        self.assertEqual(list(binary.keys()), ['2_3', '3_3'])
+        del binary
+        self.replace_source({'2_3': self.library['2_3']},
+                            self.base_retrieval.binary_path('L'))
+        binary = self.base_retrieval.read_data('L', 'binary')
+        self.assertEqual(list(binary.keys()), ['2_3'])
+        self.assertEqual(binary.source,
+                         gfdb.General.fileio.source_stamp(self.source))
+
+    def test_stale_index(self):
+        lazy = self.base_retrieval.read_data('L', 'lazy')
+        self.assertEqual(list(lazy.keys()), ['2_3', '3_3'])
+        self.replace_source({'3_3': self.library['3_3']},
+                            self.base_retrieval.index_path('L'))
+        lazy = self.base_retrieval.read_data('L', 'lazy')
+        self.assertEqual(dict(lazy), {'3_3': self.library['3_3']})
+
+
+class TestOrientedRetrieval(unittest.TestCase):
+
+    def setUp(self):
+        # a U library, in which a field and its transpose differ
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path_to_file = os.path.join(self.tmp_dir.name,
+                                         'U_configurations_5m.json')
+        self.library = {}
+        for key, secondary_key, coordinates in \
+                build.configuration_entries('U', 4):
+            self.library.setdefault(key, {})[secondary_key] = {
+                'bore_locations': [list(xy) for xy in coordinates],
+                'g': {'5._96._0.075': [1., 2.]}, 'logtime': [-1., 0.]}
+        patcher = mock.patch.object(
+            gfdb.Management.data_definition, 'cached_registry',
+            lambda: {'U': self.path_to_file})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache_directory = os.path.join(self.tmp_dir.name, 'cache')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_retrieve_transpose(self):
+        # a library built by orientation holds the N > M fields
+        gfdb.General.fileio.js_dump(self.library, self.path_to_file)
+        retrieval = gfdb.Management.retrieval.Retrieve(
+            'U', cache_directory=self.cache_directory)
+        self.assertTrue(retrieval.oriented())
+        self.assertEqual(retrieval.query_database(),
+                         {3: [(3, 3), (3, 4)], 4: [(4, 3), (4, 4)]})
+        wide = retrieval.retrieve(4, 3)
+        self.assertEqual(list(wide.keys()), ['U_4_3_t_1'])
+        self.assertEqual(
+            [tuple(xy) for xy in wide['U_4_3_t_1']['bore_locations']],
+            gfdb.coordinates.U_shape(4, 3, 5., 5.))
+        tall = retrieval.retrieve(3, 4)
+        self.assertEqual(list(tall.keys()), ['U_3_4_t_1'])
+        self.assertNotEqual(tall['U_3_4_t_1']['bore_locations'],
+                            wide['U_4_3_t_1']['bore_locations'])
+
+        base_retrieval = gfdb.Management.retrieval.BaseRetrieval(
+            cache_directory=self.cache_directory)
+        fields = base_retrieval.query_fields(N=4, M=3)
+        self.assertEqual([field['key'] for field in fields], ['4_3'])
+
+    def test_retrieve_layout(self):
+        # the cpgfunction libraries are keyed with N <= M
+        library = {key: content for key, content in self.library.items()
+                   if int(key.split('_')[0]) <= int(key.split('_')[1])}
+        gfdb.General.fileio.js_dump(library, self.path_to_file)
+        retrieval = gfdb.Management.retrieval.Retrieve(
+            'U', cache_directory=self.cache_directory)
+        self.assertFalse(retrieval.oriented())
+        self.assertEqual(retrieval.query_database(),
+                         {3: [(3, 3), (3, 4)], 4: [(4, 4), (4, 4)]})
+        self.assertEqual(retrieval.retrieve(4, 3), retrieval.retrieve(3, 4))
+        self.assertEqual(list(retrieval.retrieve(4, 3).keys()),
+                         ['U_3_4_t_1'])
+
+        base_retrieval = gfdb.Management.retrieval.BaseRetrieval(
+            cache_directory=self.cache_directory)
+        fields = base_retrieval.query_fields(N=4, M=3)
+        self.assertEqual([field['key'] for field in fields], ['3_4'])
+
+
+class TestLibraryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.paths = {}
+        for name in ['a', 'b', 'c']:
+            self.paths[name] = os.path.join(self.tmp_dir.name, name + '.json')
+            with open(self.paths[name], 'w') as f:
+                f.write('{}')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def get(self, cache, name):
+        return cache.get(name, 'json', self.paths[name],
+                         lambda: {'data': [float(i) for i in range(1000)]})
+
+    def test_hits_and_eviction(self):
+        size = gfdb.Management.retrieval.deep_getsizeof(
+            {'data': [float(i) for i in range(1000)]})
+        cache = gfdb.Management.retrieval.LibraryCache(max_bytes=2 * size)
+        first = self.get(cache, 'a')
+        self.assertIs(self.get(cache, 'a'), first)
+        self.get(cache, 'b')
+        self.get(cache, 'a')  # b is now the least recently used
+        self.get(cache, 'c')
+        statistics = cache.statistics()
+        self.assertEqual(statistics['hits'], 2)
+        self.assertEqual(statistics['misses'], 3)
+        self.assertEqual(statistics['evictions'], 1)
+        self.assertEqual(statistics['resident_bytes'], 2 * size)
+        self.assertEqual(statistics['libraries'],
+                         [('a', 'json', False), ('c', 'json', False)])
+
+    def test_modified_file(self):
+        cache = gfdb.Management.retrieval.LibraryCache()
+        first = self.get(cache, 'a')
+        with open(self.paths['a'], 'w') as f:
+            f.write('{ }')
+        self.assertIsNot(self.get(cache, 'a'), first)
+        self.assertEqual(cache.statistics()['misses'], 2)
+
+    def test_index(self):
+        cache = gfdb.Management.retrieval.LibraryCache()
+        library = self.get(cache, 'a')
+        cache.index(library)['boundaries'] = {}
+        self.assertIs(cache.index(self.get(cache, 'a')),
+                      cache.index(library))
+        with open(self.paths['a'], 'w') as f:
+            f.write('{ }')
+        self.assertEqual(cache.index(self.get(cache, 'a')), {})
+
+    def test_retrieve_shares_index(self):
+        gfdb.Management.retrieval.library_cache.clear()
+        Retrieve = gfdb.Management.retrieval.Retrieve
+        first = Retrieve('L', cache=True)
+        first.retrieve(7, 10)
+        with mock.patch.object(Retrieve, 'scan_boundaries') as scan:
+            second = Retrieve('L', cache=True)
+            self.assertEqual(second.retrieve(7, 10), first.retrieve(7, 10))
+        scan.assert_not_called()
+
+    def test_read_only(self):
+        cache = gfdb.Management.retrieval.LibraryCache()
+        library = self.get(cache, 'a')
+        with self.assertRaises(TypeError):
+            library['data'] = []
+        self.assertIs(self.get(cache, 'a'), library)
+
+    def test_entries_unmodified(self):
+        # the cached entries are shared, retrieving and using a field must
+        # leave them as they were decoded
+        gfdb.Management.retrieval.library_cache.clear()
+        retrieval = gfdb.Management.retrieval.Retrieve('L', cache=True)
+        expected = gfdb.General.fileio.js_r(retrieval.registry['L'])['7_10']
+        g_function = gfdb.Management.application.GFunction(
+            **gfdb.Management.application.GFunction.
+            configure_database_file_for_usage(
+                retrieval.retrieve(7, 10)['L_7_10']))
+        g_function.g_function_interpolation(5. / 150.)
+        self.assertEqual(retrieval.data['7_10'], expected)
+
+    def test_retrieve_shares_library(self):
+        gfdb.Management.retrieval.library_cache.clear()
+        first = gfdb.Management.retrieval.Retrieve('L', cache=True)
+        second = gfdb.Management.retrieval.Retrieve('L', cache=True)
+        self.assertIs(first.data, second.data)
+        self.assertEqual(
+            gfdb.Management.retrieval.library_cache.statistics()['hits'], 1)
+
+
+class TestSQLiteStorage(unittest.TestCase):
+
+    def test_sqlite_storage(self):
+        json_retrieval = gfdb.Management.retrieval.Retrieve('L')
+        sqlite_retrieval = \
+            gfdb.Management.retrieval.Retrieve('L', storage='sqlite')
+        self.assertEqual(list(json_retrieval.data.keys()),
+                         list(sqlite_retrieval.data.keys()))
+        for N, M in [(2, 3), (7, 10), (10, 7), (32, 32)]:
+            self.assertEqual(json_retrieval.retrieve(N, M),
+                             sqlite_retrieval.retrieve(N, M))
+
+    def test_close(self):
+        with gfdb.Management.retrieval.Retrieve(
+                'L', storage='sqlite') as retrieval:
+            retrieval.retrieve(2, 3)
+            connection = retrieval.data.database.connection
+        with self.assertRaises(sqlite3.ProgrammingError):
+            connection.execute('SELECT 1')
+
+    def test_query_fields(self):
+        base_retrieval = gfdb.Management.retrieval.BaseRetrieval()
+        fields = base_retrieval.query_fields(configurations=['L'],
+                                             nbh_min=60, nbh_max=80)
+        library = base_retrieval.load_data('L')
+        expected = [key for key in library
+                    if 60 <= len(library[key]['bore_locations']) <= 80]
+        self.assertEqual([field['key'] for field in fields], expected)
+        fields = base_retrieval.query_fields(configurations=['L'], N=10, M=7)
+        self.assertEqual([(field['N'], field['M']) for field in fields],
+                         [(7, 10)])
+
+
+class TestRetrievalArrays(unittest.TestCase):
+
+    def test_arrays(self):
+        GFunction = gfdb.Management.application.GFunction
+        retrieval = gfdb.Management.retrieval.Retrieve('L')
+        lists = retrieval.retrieve(7, 10)['L_7_10']
+        expected = GFunction.configure_database_file_for_usage(lists)
+        for storage in ['json', 'binary', 'lazy', 'sqlite']:
+            array_retrieval = gfdb.Management.retrieval.Retrieve(
+                'L', storage=storage, arrays=True)
+            field = array_retrieval.retrieve(7, 10)['L_7_10']
+            self.assertEqual(field['g'].shape, (5, 27))
+            self.assertEqual(field['bore_locations'].shape, (16, 2))
+            self.assertEqual(field['H'].tolist(), [24., 48., 96., 192., 384.])
+            configured = GFunction.configure_database_file_for_usage(field)
+            self.assertEqual(configured['B'], expected['B'])
+            self.assertEqual(configured['r_b_values'],
+                             expected['r_b_values'])
+            self.assertEqual(configured['D_values'], expected['D_values'])
+            for H in expected['g_lts']:
+                self.assertEqual(configured['g_lts'][H].tolist(),
+                                 expected['g_lts'][H])
+            self.assertEqual(configured['bore_locations'].tolist(),
+                             expected['bore_locations'])
@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+
+import gFunctionDatabase as gfdb
+
+
+class TestSelection(unittest.TestCase):
+
+    def setUp(self):
+        self.loads = [[40.0e3, 80.0e3, 160.0e3],
+                      [-30.0e3, -90.0e3, -180.0e3]]
+        self.durations = [10 * 365 * 86400., 30 * 86400., 6 * 3600.]
+        self.settings = {'k_s': 2.0, 'alpha': 1.0e-06, 'T_g': 12.,
+                         'R_b': 0.15, 'T_min': 0., 'T_max': 35.}
+
+    def select(self, **kwargs):
+        rankings = list(gfdb.selection.select_fields(
+            'L', self.loads, self.durations, **self.settings, **kwargs))
+        return rankings[-1], len(rankings)
+
+    def test_fits_lot(self):
+        bore_locations = [[0., 0.], [0., 50.], [20., 50.]]
+        self.assertTrue(gfdb.selection.fits_lot(bore_locations, (20., 50.)))
+        self.assertTrue(gfdb.selection.fits_lot(bore_locations, (50., 20.)))
+        self.assertFalse(gfdb.selection.fits_lot(bore_locations, (19., 60.)))
+
+    def test_select_fields(self):
+        lot = (60., 100.)
+        ranking, _ = self.select(lot=lot, top_k=5, workers=1)
+        self.assertTrue(ranking['final'])
+        self.assertEqual(ranking['completed'], ranking['total'])
+
+        # the reference: size every field that fits on the lot
+        base_retrieval = gfdb.Management.retrieval.BaseRetrieval()
+        library = base_retrieval.load_data('L', arrays=True)
+        fields = {key: field for key, field in library.items()
+                  if gfdb.selection.fits_lot(field['bore_locations'], lot)}
+        self.assertEqual(ranking['evaluated'], len(fields))
+        sizes = gfdb.sizing.size_fields(fields, self.loads, self.durations,
+                                        **self.settings)
+        order = np.argsort(sizes['total_length'])[:5]
+        self.assertEqual([result['key'] for result in ranking['ranked']],
+                         [sizes['keys'][i] for i in order])
+        np.testing.assert_allclose(
+            [result['total_length'] for result in ranking['ranked']],
+            sizes['total_length'][order])
+
+        # the worker processes rank the same fields
+        parallel, n_rankings = self.select(lot=lot, top_k=5, workers=2,
+                                           chunk_size=50)
+        self.assertEqual(n_rankings, 10)
+        self.assertEqual(parallel['ranked'], ranking['ranked'])
+
+    def test_patience(self):
+        ranking, n_rankings = self.select(top_k=3, patience=2, workers=1,
+                                          chunk_size=25)
+        self.assertTrue(ranking['final'])
+        self.assertLess(ranking['completed'], ranking['total'])
+        self.assertEqual(len(ranking['ranked']), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
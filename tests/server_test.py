@@ -0,0 +1,99 @@
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import gFunctionDatabase as gfdb
+from gFunctionDatabase import server
+
+
+class TestServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.httpd = server.Server(server.LibraryServer(['L']), port=0)
+        cls.httpd.start()
+        cls.client = server.Client(port=cls.httpd.server_address[1])
+        cls.retrieval = gfdb.Management.retrieval.Retrieve('L')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.close()
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+
+    def test_retrieve(self):
+        self.assertEqual(self.client.configurations(), ['L'])
+        self.assertEqual(self.client.query_database('L'),
+                         self.retrieval.query_database())
+        for N, M in [(2, 3), (10, 7)]:
+            self.assertEqual(self.client.retrieve('L', N, M),
+                             self.retrieval.retrieve(N, M))
+
+    def test_interpolate(self):
+        for B_over_H in [0.05, 0.2, 0.05]:
+            result = self.client.interpolate('L', 5, 8, B_over_H)
+            expected = gfdb.Management.asyncretrieval.interpolate_fields(
+                self.retrieval.retrieve(5, 8), B_over_H)
+            for key in expected:
+                self.assertEqual(result[key]['g'], expected[key][0])
+                self.assertEqual(result[key]['H_eq'], expected[key][3])
+                self.assertFalse(result[key]['extrapolated'])
+
+    def test_batch(self):
+        requests = [[5, 8, 0.05], [3, 4, 0.1]]
+        arrays, meta = self.client.interpolate_batch('L', requests)
+        self.assertEqual(meta['keys'], ['L_5_8', 'L_3_4'])
+        self.assertEqual(arrays['g'].shape, (2, 27))
+        self.assertEqual(arrays['request'].tolist(), [0., 1.])
+        for i, (N, M, B_over_H) in enumerate(requests):
+            expected = self.client.interpolate('L', N, M, B_over_H)
+            key = meta['keys'][i]
+            self.assertEqual(arrays['g'][i].tolist(), expected[key]['g'])
+
+        arrays, meta = self.client.retrieve_batch('L', [[5, 8]])
+        field = gfdb.General.fileio.content_to_arrays(
+            self.retrieval.retrieve(5, 8)['L_5_8'])
+        for name in ['g', 'logtime', 'bore_locations', 'H']:
+            np.testing.assert_array_equal(arrays['L_5_8/' + name],
+                                          field[name])
+
+    def test_errors(self):
+        with self.assertRaises(KeyError):
+            self.client.retrieve('U', 5, 8)
+        with self.assertRaises(ValueError):
+            self.client.retrieve('L', 1, 1)
+        with self.assertRaises(ValueError):
+            self.client.get('retrieve', configuration='L')
+
+    def test_server_error(self):
+        with mock.patch.object(server.LibraryServer, 'retrieve',
+                               side_effect=ZeroDivisionError('division')):
+            with self.assertRaises(RuntimeError):
+                self.client.retrieve('L', 5, 8)
+        # the connection is still answered after the error
+        self.assertEqual(self.client.configurations(), ['L'])
+
+    def test_concurrent_interpolate(self):
+        library = server.LibraryServer(['L'])
+        results = [None] * 8
+
+        def interpolate(i):
+            results[i] = library.interpolate('L', 6, 9, 0.05 + 0.01 * i)
+
+        threads = [threading.Thread(target=interpolate, args=(i, ))
+                   for i in range(len(results))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(list(library.interpolants.keys()), ['L_6_9'])
+        for i, result in enumerate(results):
+            expected = gfdb.Management.asyncretrieval.interpolate_fields(
+                self.retrieval.retrieve(6, 9), 0.05 + 0.01 * i)
+            self.assertEqual(result['L_6_9']['g'], expected['L_6_9'][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
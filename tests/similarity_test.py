@@ -0,0 +1,165 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import gFunctionDatabase as gfdb
+from gFunctionDatabase.Management import build
+
+
+class TestSimilarityCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.log_time = gfdb.utilities.Eskilson_log_times()
+        self.similarity = gfdb.Management.similarity
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def cache(self, **kwargs):
+        return self.similarity.SimilarityCache(
+            directory=os.path.join(self.directory.name, 'gfunctions'),
+            **kwargs)
+
+    def parameters(self, coordinates, H, D, r_b, alpha, nSegments=4):
+        boreField, alpha, t, options = \
+            gfdb.Management.application.uniform_temperature_tasks(
+                [D], [H], [r_b], self.log_time, alpha, coordinates,
+                [nSegments])[0]
+        return self.similarity.dimensionless_parameters(
+            boreField, alpha, t, 'UBWT', options=options)
+
+    def test_dimensionless_parameters(self):
+        reference = self.parameters(gfdb.coordinates.rectangle(3, 4, 5., 5.),
+                                    96., 2., 0.075, 1.0e-06)
+        # the same field at twice the scale, transposed and translated
+        coordinates = [(x + 100., y) for x, y in
+                       gfdb.coordinates.rectangle(4, 3, 10., 10.)]
+        self.assertEqual(
+            self.parameters(coordinates, 192., 4., 0.15, 2.0e-06), reference)
+        self.assertEqual(reference['log_time'], self.log_time)
+        # a mirrored L
+        self.assertEqual(
+            self.parameters([(-x, y) for x, y in
+                             gfdb.coordinates.L_shape(3, 4, 5., 5.)],
+                            96., 2., 0.075, 1.0e-06),
+            self.parameters(gfdb.coordinates.L_shape(3, 4, 5., 5.),
+                            96., 2., 0.075, 1.0e-06))
+        for other in [
+                self.parameters(gfdb.coordinates.rectangle(3, 4, 5., 5.),
+                                96., 3., 0.075, 1.0e-06),
+                self.parameters(gfdb.coordinates.rectangle(3, 4, 5., 5.),
+                                96., 2., 0.075, 1.0e-06, nSegments=8),
+                self.parameters(gfdb.coordinates.rectangle(3, 4, 6., 5.),
+                                96., 2., 0.075, 1.0e-06)]:
+            self.assertNotEqual(other, reference)
+
+    def test_similar_solves(self):
+        cache = self.cache()
+        compute = gfdb.Management.application.\
+            uniform_temperature_uniform_segment_lengths
+        first = compute([2.], [30.], [0.075], 5., self.log_time, 1.0e-06,
+                        gfdb.coordinates.rectangle(2, 3, 5., 5.), [4],
+                        cache=cache)
+        second = compute([4.], [60.], [0.15], 10., self.log_time, 3.0e-06,
+                         gfdb.coordinates.rectangle(3, 2, 10., 10.), [4],
+                         cache=cache)
+        self.assertEqual(cache.statistics()['hits'], 1)
+        self.assertEqual(cache.statistics()['files'], 1)
+        self.assertEqual(list(second['g'].keys()), ['10.0_60.0_0.15_4.0'])
+        self.assertEqual(list(second['g'].values()),
+                         list(first['g'].values()))
+        # the solve at the second spacing agrees with the first
+        expected = compute([4.], [60.], [0.15], 10., self.log_time, 3.0e-06,
+                           gfdb.coordinates.rectangle(3, 2, 10., 10.), [4])
+        np.testing.assert_allclose(list(second['g'].values())[0],
+                                   list(expected['g'].values())[0],
+                                   rtol=1e-10)
+
+    def test_tolerance(self):
+        cache = self.cache()
+
+        def parameters(B):
+            return self.parameters(gfdb.coordinates.rectangle(2, 3, B, B),
+                                   100., 2., 0.075, 1.0e-06)
+
+        # B/H = 0.0500000004 and 0.0500000006 round to either side of the
+        # ninth decimal, but are within the tolerance
+        first, second = parameters(5.00000004), parameters(5.00000006)
+        self.assertNotEqual(first['boreholes'], second['boreholes'])
+        self.assertNotEqual(cache.key(first), cache.key(second))
+        g = [float(i) for i in range(len(self.log_time))]
+        cache.store(first, g)
+        self.assertEqual(cache.lookup(second), g)
+        self.assertIsNone(cache.lookup(parameters(5.0001)))
+        self.assertEqual(cache.statistics()['hits'], 1)
+        self.assertEqual(cache.statistics()['misses'], 1)
+        # without a tolerance the values only match exactly
+        exact = self.cache(rtol=0., atol=0.)
+        exact.store(first, g)
+        self.assertIsNone(exact.lookup(second))
+        self.assertEqual(exact.lookup(first), g)
+
+    def test_library_match(self):
+        library = gfdb.Management.retrieval.BaseRetrieval().load_data('L')
+        cache = self.cache(libraries=['L'], any_discretization=True)
+        # the 3_4 field of the 5m library at a spacing of 7.5 m, transposed
+        g_data = gfdb.Management.application.\
+            uniform_temperature_uniform_segment_lengths(
+                [3.], [36.], [0.1125], 7.5, self.log_time, 1.0e-06,
+                gfdb.coordinates.L_shape(4, 3, 7.5, 7.5), [12], cache=cache)
+        self.assertEqual(list(g_data['g'].values())[0],
+                         library['3_4']['g']['5._24._0.075'])
+        self.assertEqual(cache.statistics()['library_hits'], 1)
+        self.assertEqual(cache.statistics()['files'], 0)
+
+        # the library fields are only served for the UBWT boundary condition
+        boreField, alpha, t, options = \
+            gfdb.Management.application.uniform_temperature_tasks(
+                [3.], [36.], [0.1125], self.log_time, 1.0e-06,
+                gfdb.coordinates.L_shape(4, 3, 7.5, 7.5), [2])[0]
+        cache.g_function(boreField, alpha, t, boundary_condition='UHTR',
+                         options=options)
+        self.assertEqual(cache.statistics()['library_hits'], 1)
+        self.assertEqual(cache.statistics()['files'], 1)
+
+        # the libraries are only used by a caller that opts in
+        with self.assertRaises(ValueError):
+            self.cache(libraries=['L'])
+        parameters = self.parameters(gfdb.coordinates.L_shape(4, 3, 7.5, 7.5),
+                                     36., 3., 0.1125, 1.0e-06, nSegments=12)
+        index = cache.library_index
+        self.assertIsNone(index.match(parameters))
+        self.assertEqual(index.match(parameters, any_discretization=True)['g'],
+                         library['3_4']['g']['5._24._0.075'])
+        # a field within the tolerance of the library field
+        parameters = self.parameters(
+            gfdb.coordinates.L_shape(4, 3, 7.5 * (1. + 1e-9), 7.5), 36., 3.,
+            0.1125, 1.0e-06, nSegments=12)
+        self.assertEqual(index.match(parameters, any_discretization=True)['g'],
+                         library['3_4']['g']['5._24._0.075'])
+
+    def test_library_build(self):
+        # a library at a spacing of 10 m is served from the 5m library,
+        # except for the 2_2 field that it does not hold
+        cache = self.cache(libraries=['L'], any_discretization=True)
+        checkpoint = os.path.join(self.directory.name, 'L.jsonl')
+        list(build.build_library(
+            'L', checkpoint, N_max=3, B=10.,
+            heights=[2 * H for H in build.HEIGHTS],
+            r_b=[2 * r_b for r_b in build.RADII], D=4., nSegments=2,
+            workers=1, cache=cache))
+        with open(checkpoint) as file:
+            records = [json.loads(line) for line in file][1:]
+        seconds = {record['key']: record['seconds'] for record in records}
+        self.assertGreater(seconds['2_2'], 0.)
+        self.assertEqual(seconds['2_3'], 0.)
+        self.assertEqual(seconds['3_3'], 0.)
+        self.assertEqual(cache.statistics()['library_hits'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
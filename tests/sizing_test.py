@@ -0,0 +1,75 @@
+import unittest
+
+import numpy as np
+from scipy.optimize import brentq
+
+import gFunctionDatabase as gfdb
+
+
+class TestSizing(unittest.TestCase):
+
+    def setUp(self):
+        base_retrieval = gfdb.Management.retrieval.BaseRetrieval()
+        library = base_retrieval.load_data('L', arrays=True)
+        self.fields = {key: library[key] for key in list(library)[::25]}
+        # a heating and a cooling case of 10 years, 1 month and 6 hours
+        self.loads = [[40.0e3, 80.0e3, 160.0e3],
+                      [-30.0e3, -90.0e3, -180.0e3]]
+        self.durations = [10 * 365 * 86400., 30 * 86400., 6 * 3600.]
+        self.properties = {'k_s': 2.0, 'alpha': 1.0e-06, 'T_g': 12.,
+                           'R_b': 0.15}
+
+    def reference(self, field, T_min, T_max):
+        # a scalar root find on the fluid temperature of one field
+        def excess(H):
+            T_f = gfdb.sizing.fluid_temperature(
+                field, H, self.loads, self.durations, **self.properties)
+            return max(np.max(T_min - T_f), np.max(T_f - T_max))
+        heights = list(field['H'])
+        if excess(heights[0]) <= 0:
+            return heights[0]
+        if excess(heights[-1]) > 0:
+            return np.nan
+        return brentq(excess, heights[0], heights[-1], xtol=1.0e-08)
+
+    def test_size_fields(self):
+        sizes = gfdb.sizing.size_fields(self.fields, self.loads,
+                                        self.durations, T_min=0., T_max=35.,
+                                        **self.properties)
+        self.assertEqual(sizes['keys'], list(self.fields))
+        self.assertTrue(np.any(sizes['feasible']))
+        self.assertTrue(np.any(sizes['pruned']))
+        for i, key in enumerate(sizes['keys']):
+            H = self.reference(self.fields[key], 0., 35.)
+            if np.isnan(H):
+                self.assertTrue(sizes['pruned'][i])
+                self.assertTrue(np.isnan(sizes['H'][i]))
+            else:
+                self.assertAlmostEqual(sizes['H'][i] / H, 1., delta=1.0e-3)
+        np.testing.assert_allclose(sizes['total_length'],
+                                   sizes['nbh'] * sizes['H'])
+
+    def test_bounds(self):
+        # small loads are met at the minimum depth
+        sizes = gfdb.sizing.size_fields(self.fields,
+                                        np.array(self.loads) / 1000.,
+                                        self.durations, T_min=0.,
+                                        T_max=35., H_min=50.,
+                                        **self.properties)
+        np.testing.assert_allclose(sizes['H'], 50.)
+
+        # no depth is allowed
+        sizes = gfdb.sizing.size_fields(self.fields, self.loads,
+                                        self.durations, T_min=0., T_max=35.,
+                                        H_min=200., H_max=100.,
+                                        **self.properties)
+        self.assertTrue(np.all(sizes['pruned']))
+
+        with self.assertRaises(ValueError):
+            gfdb.sizing.size_fields(self.fields, self.loads,
+                                    self.durations[:2], T_min=0., T_max=35.,
+                                    **self.properties)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import math
+import unittest
+
+import numpy as np
+
+import gFunctionDatabase as gfdb
+
+
+class TestSuperposition(unittest.TestCase):
+
+    def setUp(self):
+        retrieval = gfdb.Management.retrieval.Retrieve('L')
+        self.g_function = gfdb.Management.application.GFunction(
+            **gfdb.Management.application.GFunction.
+            configure_database_file_for_usage(
+                retrieval.retrieve(5, 8)['L_5_8']))
+        self.H = 100.
+        self.alpha = 1.0e-6
+        self.k_s = 2.0
+        self.response = gfdb.superposition.step_response(
+            self.g_function, self.H, self.alpha)
+        rng = np.random.default_rng(0)
+        hours = np.arange(2000)
+        self.loads = 30. * np.cos(2 * math.pi * hours / 8760.) + \
+            rng.normal(0., 10., len(hours))
+
+    def test_fft_matches_naive(self):
+        times = 3600. * np.arange(1, len(self.loads) + 1)
+        g_values = self.response(times)
+        fft = gfdb.superposition.uniform_superposition(
+            self.loads, g_values, self.k_s)
+        naive = gfdb.superposition.naive_superposition(
+            self.loads, g_values, self.k_s)
+        np.testing.assert_allclose(fft, naive, rtol=1e-9, atol=1e-10)
+
+    def test_aggregation(self):
+        # variable time steps, compared to the exact sum over every step
+        rng = np.random.default_rng(1)
+        times = np.cumsum(rng.uniform(1800., 7200., len(self.loads)))
+        aggregated = gfdb.superposition.aggregated_superposition(
+            self.loads, times, self.response, self.k_s)
+        starts = np.concatenate(([0.], times[:-1]))
+        exact = np.array(
+            [np.dot(self.loads[:n + 1],
+                    self.response(times[n] - starts[:n + 1]) -
+                    self.response(times[n] - times[:n + 1]))
+             for n in range(len(times))]) / (2 * math.pi * self.k_s)
+        self.assertLess(np.max(np.abs(aggregated - exact)), 0.05)
+
+        # without merges the aggregation is the exact sum, and the response
+        # is evaluated once at each cell edge
+        evaluations = []
+
+        def response(t):
+            evaluations.append(len(t))
+            return self.response(t)
+
+        unmerged = gfdb.superposition.aggregated_superposition(
+            self.loads[:50], times[:50], response, self.k_s,
+            cells_per_level=50)
+        np.testing.assert_allclose(unmerged, exact[:50], rtol=1e-12)
+        self.assertEqual(evaluations, list(range(2, 52)))
+
+        # one cell at each level
+        merged = gfdb.superposition.aggregated_superposition(
+            self.loads, times, self.response, self.k_s, cells_per_level=1)
+        self.assertTrue(np.all(np.isfinite(merged)))
+
+        with self.assertRaises(ValueError):
+            gfdb.superposition.aggregated_superposition(
+                self.loads, times[::-1], self.response, self.k_s)
+
+    def test_borehole_wall_temperature(self):
+        T_b = gfdb.superposition.borehole_wall_temperature(
+            self.g_function, self.loads, self.k_s, self.alpha, self.H, 10.)
+        self.assertEqual(T_b.shape, self.loads.shape)
+
+        # an interpolated curve gives the same temperatures
+        B_over_H = self.g_function.B / self.H
+        curve = self.g_function.log_time_interpolant(B_over_H)
+        T_b_curve = gfdb.superposition.borehole_wall_temperature(
+            curve, self.loads, self.k_s, self.alpha, self.H, 10.)
+        np.testing.assert_allclose(T_b, T_b_curve, rtol=1e-12)
+
+        # a constant extraction rate cools the borehole wall by q g / 2 pi k
+        q = np.full(100, 40.)
+        T_b = gfdb.superposition.borehole_wall_temperature(
+            self.g_function, q, self.k_s, self.alpha, self.H, 10.)
+        g = self.response(3600. * np.arange(1, 101))
+        np.testing.assert_allclose(
+            T_b, 10. - q * g / (2 * math.pi * self.k_s), rtol=1e-9)
+
+        T_b_variable = gfdb.superposition.borehole_wall_temperature(
+            self.g_function, q, self.k_s, self.alpha, self.H, 10.,
+            times=3600. * np.arange(1, 101))
+        np.testing.assert_allclose(T_b_variable, T_b, rtol=1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()